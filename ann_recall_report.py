@@ -0,0 +1,100 @@
+# ann_recall_report.py
+"""
+Recall-vs-latency report for the ANN vector backends.
+
+Builds one store of synthetic "key: value" memories, takes the exact flat
+scan as ground truth and replays the stress-test query mix against every
+ANN backend and search setting. Recall@k counts an ANN hit as correct when
+its true score reaches the k-th exact score (ties share a score, so id
+overlap alone would under-count; PQ distances are approximate, so returned
+ids are re-scored exactly).
+
+    ANN_REPORT_N=100000 python ann_recall_report.py
+"""
+import os
+import time
+import random
+import statistics
+import numpy as np
+from src.embedding import make_vectorizer
+from src.vector_backends import FlatIndex, IVFFlatIndex, IVFPQIndex, HNSWIndex
+from src.config import EMBED_DIM, RETRIEVE_K
+import src.vector_backends as backends
+
+N = int(os.getenv("ANN_REPORT_N", "20000"))
+K = RETRIEVE_K * 5   # what retrieve_relevant asks the vector tier for
+EPS = 1e-4
+
+random.seed(42)
+# same keys and query templates as stress_test_1000.py
+candidate_keys = [
+    "language", "customer_name", "amount_due", "due_date",
+    "payment_status", "call_time", "email", "account_info", "preference"
+]
+words = [f"w{i}" for i in range(5000)] + ["Kannada", "Hindi", "English", "Tamil", "Alice", "Bob",
+                                          "Johnson", "February", "March", "April", "paid", "pending",
+                                          "disputed", "pizza", "cricket", "evening", "morning"]
+texts = [f"{random.choice(candidate_keys + ['food_preference', 'hobby', 'city'])}: "
+         f"{' '.join(random.sample(words, random.randint(1, 4)))}" for _ in range(N)]
+queries = ([f"What is my {k}?" for k in candidate_keys]
+           + ["Can you call me tomorrow?", "Remind me about the payment", "What time should I call?"]
+           + [f"tell me about {' '.join(random.sample(words, 2))}" for _ in range(40)])
+
+vectorizer = make_vectorizer("hashing", EMBED_DIM).fit(texts)
+X = vectorizer.transform(texts)
+Q = vectorizer.transform(queries)
+
+# ANN structures are built as soon as the report's store is loaded
+backends.VECTOR_ANN_TRAIN_THRESHOLD = min(backends.VECTOR_ANN_TRAIN_THRESHOLD, N)
+
+def timed_search(index, n):
+    lat, D_all, I_all = [], [], []
+    for i in range(Q.shape[0]):
+        t0 = time.perf_counter()
+        D, I = index.search(Q[i], n)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        D_all.append(D[0])
+        I_all.append(I[0])
+    return lat, np.array(D_all), np.array(I_all)
+
+def pct(arr, p):
+    s = sorted(arr)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+flat = FlatIndex(X.shape[1])
+flat.add(X)
+flat_lat, exact_D, _ = timed_search(flat, K)
+
+def recall(I):
+    hits = 0
+    for qi in range(I.shape[0]):
+        kth = exact_D[qi][K - 1]
+        ids = I[qi][I[qi] >= 0]
+        true_scores = (X[ids] @ Q[qi].T).toarray().ravel()
+        hits += int(np.sum(true_scores >= kth - EPS))
+    return hits / (I.shape[0] * K)
+
+rows = [("flat (exact)", "-", 0.0, 1.0, flat_lat)]
+for cls, param, values in [(IVFFlatIndex, "nprobe", [1, 4, 8, 16, 32]),
+                           (IVFPQIndex, "nprobe", [1, 4, 8, 16, 32]),
+                           (HNSWIndex, "efSearch", [16, 32, 64, 128])]:
+    t0 = time.perf_counter()
+    index = cls(X.shape[1])
+    index.add(X)
+    build_s = time.perf_counter() - t0
+    for v in values:
+        if param == "nprobe":
+            index.set_search_params(nprobe=v)
+        else:
+            index.set_search_params(ef_search=v)
+        lat, _, I = timed_search(index, K)
+        rows.append((cls.name, f"{param}={v}", build_s, recall(I), lat))
+
+print("=" * 78)
+print(f"ANN RECALL vs LATENCY  (N={N}, dim={X.shape[1]}, k={K}, queries={len(queries)})")
+print("=" * 78)
+print(f"{'backend':<14}{'setting':<14}{'build (s)':>10}{'recall@k':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+for name, setting, build_s, rec, lat in rows:
+    print(f"{name:<14}{setting:<14}{build_s:>10.2f}{rec:>10.4f}"
+          f"{statistics.mean(lat):>10.3f}{pct(lat, 50):>10.3f}{pct(lat, 95):>10.3f}")
+print("=" * 78)
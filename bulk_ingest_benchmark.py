@@ -0,0 +1,118 @@
+# bulk_ingest_benchmark.py
+"""
+Throughput of MemoryEngine.add_memories_bulk vs the one-fact add_memory loop.
+
+Generates a synthetic backfill (many users, a few keys each, values revised
+over time so supersession chains form), ingests it in chunks with
+add_memories_bulk, and reports facts/s for the database path alone and with
+the per-user vector shards (one vectorizer call per user per chunk, which
+dominates when chunks touch many users). A small sample is also ingested with
+add_memory into a second database, and the two must end up with the same
+active facts and the same supersession roots.
+
+    BULK_N=100000 BULK_CHUNK=20000 python bulk_ingest_benchmark.py
+"""
+import os
+import time
+import random
+import shutil
+
+os.environ.setdefault("DB_URL", "sqlite:///data/bulk_bench.db")
+
+from sqlalchemy.orm import sessionmaker
+from src.database import make_engine
+from src.migrations import upgrade
+from src.vector_store import ShardedVectorStore
+from src.memory_engine import MemoryEngine
+from src.models import MemoryFact
+from src.fact_cache import get_fact_cache
+from src.active_counts import get_active_counts
+from src import eviction
+
+N = int(os.getenv("BULK_N", "100000"))
+CHUNK = int(os.getenv("BULK_CHUNK", "20000"))
+SAMPLE = int(os.getenv("BULK_SAMPLE", "1000"))
+USERS = max(1, N // 200)
+
+# a backfill measures ingestion only: under the global cap every chunk would also evict
+eviction.ACTIVE_MEMORY_LIMIT = 0
+KEYS = ["language", "customer_name", "amount_due", "due_date", "payment_status",
+        "call_time", "email", "account_info", "preference", "city"]
+
+def make_records(n, users, seed=42):
+    rng = random.Random(seed)
+    return [{"user_id": f"user_{rng.randrange(users)}", "key": rng.choice(KEYS),
+             "value": f"value_{rng.randrange(20)}", "turn_id": t + 1, "confidence": 0.9,
+             "category": "import"} for t in range(n)]
+
+def fresh(name):
+    for p in (f"data/{name}.db", f"data/{name}.db-wal", f"data/{name}.db-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+    shutil.rmtree(f"data/{name}_shards", ignore_errors=True)
+    # cache and counters are process-wide; each run gets its own database
+    get_fact_cache().clear()
+    get_active_counts().reset()
+    engine = make_engine(f"sqlite:///data/{name}.db")
+    upgrade(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    return MemoryEngine(db, ShardedVectorStore(root=f"data/{name}_shards")), engine
+
+def active_view(db):
+    rows = db.query(MemoryFact).filter(MemoryFact.is_active == True).all()
+    roots = {m.id: m for m in db.query(MemoryFact).all()}
+    return sorted((m.user_id, m.key, m.value, roots[m.root_id].origin_turn) for m in rows)
+
+os.makedirs("data", exist_ok=True)
+
+# 1) equivalence on a sample
+sample = make_records(SAMPLE, max(1, SAMPLE // 50), seed=7)
+seq_engine, e1 = fresh("bulk_seq")
+t0 = time.perf_counter()
+for r in sample:
+    seq_engine.add_memory(r["user_id"], r["key"], r["value"], r["turn_id"], r["confidence"], category=r["category"])
+seq_s = time.perf_counter() - t0
+bulk_engine, e2 = fresh("bulk_eq")
+for i in range(0, SAMPLE, 700):
+    bulk_engine.add_memories_bulk(sample[i:i + 700])
+same = active_view(seq_engine.db) == active_view(bulk_engine.db)
+
+# 2) bulk throughput: database path alone, then with the per-user vector shards
+class NoIndex:
+    def add_memories(self, items, user_id=None):
+        pass
+
+    def remove_memories(self, mem_ids, user_id=None):
+        pass
+
+records = make_records(N, USERS)
+runs = {}
+for name, with_index in (("bulk_db", False), ("bulk_bench", True)):
+    eng, e = fresh(name)
+    if not with_index:
+        eng.vs = NoIndex()
+    t0 = time.perf_counter()
+    for i in range(0, N, CHUNK):
+        eng.add_memories_bulk(records[i:i + CHUNK])
+    runs[name] = (eng, e, time.perf_counter() - t0)
+engine = runs["bulk_bench"][0]
+active = engine.db.query(MemoryFact).filter(MemoryFact.is_active == True).count()
+
+print("=" * 60)
+print("BULK INGESTION")
+print("=" * 60)
+print(f"add_memory loop:           {SAMPLE / seq_s:>9.0f} facts/s  ({SAMPLE} facts)")
+print(f"bulk, database only:       {N / runs['bulk_db'][2]:>9.0f} facts/s  ({N} facts, chunks of {CHUNK})")
+print(f"bulk, with vector shards:  {N / runs['bulk_bench'][2]:>9.0f} facts/s  ({USERS} users)")
+print(f"active after bulk:         {active}")
+print(f"bulk == sequential:        {same}")
+print("=" * 60)
+
+for eng, e, *_ in [(seq_engine, e1), (bulk_engine, e2)] + list(runs.values()):
+    eng.db.close()
+    e.dispose()
+for name in ("bulk_seq", "bulk_eq", "bulk_db", "bulk_bench"):
+    for p in (f"data/{name}.db", f"data/{name}.db-wal", f"data/{name}.db-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+    shutil.rmtree(f"data/{name}_shards", ignore_errors=True)
@@ -0,0 +1,49 @@
+# extractor_equivalence_test.py
+"""
+Golden-corpus check for src/extractor.py: every message in
+extractor_golden.jsonl must give exactly the recorded (key, value, confidence)
+tuples, through extract_memory_candidates, extract_batch, and the process
+pool. Also prints per-message latency and the per-extractor counters.
+"""
+import sys
+import json
+import time
+from src.config import EXTRACT_POOL_MIN_BATCH
+from src.extractor import extract_memory_candidates, extract_batch, get_extraction_engine
+
+CORPUS = "extractor_golden.jsonl"
+
+if __name__ == "__main__":
+    with open(CORPUS, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    texts = [r["text"] for r in rows]
+    expected = [[tuple(c) for c in r["expected"]] for r in rows]
+
+    failures = [(t, exp, got) for t, exp, got in
+                zip(texts, expected, (extract_memory_candidates(t, 1) for t in texts)) if got != exp]
+    batch_ok = extract_batch(texts) == expected
+    reps = EXTRACT_POOL_MIN_BATCH // len(texts) + 1
+    pool_ok = extract_batch(texts * reps, processes=2) == expected * reps
+
+    engine = get_extraction_engine()
+    engine.reset_stats()
+    t0 = time.perf_counter()
+    for _ in range(5):
+        for t in texts:
+            extract_memory_candidates(t, 1)
+    per_msg_us = (time.perf_counter() - t0) / (5 * len(texts)) * 1e6
+
+    print("=" * 60)
+    print("EXTRACTOR GOLDEN CORPUS")
+    print("=" * 60)
+    print(f"Messages:            {len(texts)}")
+    print(f"Mismatches:          {len(failures)}")
+    print(f"Batch API equal:     {batch_ok}")
+    print(f"Process pool equal:  {pool_ok}")
+    print(f"Avg per message:     {per_msg_us:.2f} us")
+    for key, s in engine.stats()["extractors"].items():
+        print(f"  {key:<16} calls={s['calls']:<6} hits={s['hits']:<6} skipped={s['skipped']:<6} avg={s['avg_us']} us")
+    for t, exp, got in failures[:10]:
+        print(f"MISMATCH {t!r}\n  expected {exp}\n  got      {got}")
+    print("=" * 60)
+    sys.exit(0 if not failures and batch_ok and pool_ok else 1)
@@ -0,0 +1,87 @@
+# fuzzy_key_benchmark.py
+"""
+Cost of the fuzzy key tier as a user's key vocabulary grows.
+
+Builds synthetic vocabularies of custom keys ("food_preference",
+"work_address_3", ...) and scores a set of queries three ways: the old
+per-key `fuzz.partial_ratio` loop, KeyVocabulary.match (one
+process.extract per query) and KeyVocabulary.match_many (one cdist for all
+queries, as retrieve_relevant_batch uses it). All three must return the same
+keys, scores and order; exits 1 otherwise.
+
+    FUZZY_SIZES=10,100,500,2000 FUZZY_QUERIES=500 python fuzzy_key_benchmark.py
+"""
+import os
+import sys
+import time
+import random
+from rapidfuzz import fuzz
+from src.fuzzy_keys import KeyVocabulary
+from src.config import FUZZY_THRESHOLD
+
+SIZES = [int(s) for s in os.getenv("FUZZY_SIZES", "10,100,500,2000").split(",")]
+QUERIES = int(os.getenv("FUZZY_QUERIES", "500"))
+
+TOPICS = ["food", "work", "home", "travel", "music", "pet", "car", "bank", "doctor", "gym",
+          "school", "phone", "email", "language", "payment", "delivery", "call", "shoe", "coffee", "movie"]
+ASPECTS = ["preference", "address", "name", "time", "day", "brand", "size", "number", "allergy", "plan"]
+WORDS = ["what", "is", "my", "do", "you", "remember", "the", "when", "where", "favourite", "usual", "again"]
+
+def make_keys(n, rng):
+    keys, seen = [], set()
+    while len(keys) < n:
+        key = f"{rng.choice(TOPICS)}_{rng.choice(ASPECTS)}"
+        if key in seen:
+            key = f"{key}_{len(keys)}"
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+def make_queries(n, keys, rng):
+    out = []
+    for _ in range(n):
+        words = rng.sample(WORDS, 4)
+        if rng.random() < 0.6:
+            # mention a key, sometimes misspelled or with spaces
+            key = rng.choice(keys).replace("_", rng.choice([" ", "_", ""]))
+            if rng.random() < 0.3 and len(key) > 3:
+                i = rng.randrange(len(key))
+                key = key[:i] + key[i + 1:]
+            words.insert(rng.randrange(len(words)), key)
+        out.append(" ".join(words) + "?")
+    return out
+
+def loop_match(keys, ql):
+    # the per-key loop the fuzzy tier used to run
+    cands = []
+    for key in keys:
+        sim = fuzz.partial_ratio(key.lower(), ql) / 100.0
+        if sim >= FUZZY_THRESHOLD:
+            cands.append((key, sim))
+    cands.sort(key=lambda x: x[1], reverse=True)
+    return cands[:5]
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1e6 / QUERIES
+
+rng = random.Random(42)
+ok = True
+print("=" * 72)
+print("FUZZY KEY TIER (us per query)")
+print("=" * 72)
+print(f"{'keys':>6} {'loop':>10} {'match':>10} {'match_many':>12} {'hits/query':>11}  equal")
+for n in SIZES:
+    keys = make_keys(n, rng)
+    queries = [q.lower().strip() for q in make_queries(QUERIES, keys, rng)]
+    vocab = KeyVocabulary(keys)
+    ref, t_loop = timed(lambda: [loop_match(keys, q) for q in queries])
+    one, t_one = timed(lambda: [vocab.match(q) for q in queries])
+    many, t_many = timed(lambda: vocab.match_many(queries))
+    equal = ref == one == many
+    ok &= equal
+    hits = sum(len(r) for r in ref) / QUERIES
+    print(f"{n:>6} {t_loop:>10.1f} {t_one:>10.1f} {t_many:>12.1f} {hits:>11.2f}  {equal}")
+print("=" * 72)
+sys.exit(0 if ok else 1)
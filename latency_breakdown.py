@@ -2,11 +2,14 @@
 import time
 import statistics
 from src.extractor import extract_memory_candidates
-from src.vector_store import VectorStore
-from src.database import init_db
+from src.vector_store import ShardedVectorStore
+from src.memory_engine import MemoryEngine
+from src.result_cache import get_retrieval_cache
+from src.database import init_db, get_session
 
 init_db()
-vs = VectorStore()
+vs = ShardedVectorStore()
+USER = "judge"  # the stress test populates this user's shard
 
 texts = [
     "My preferred language is Kannada",
@@ -27,7 +30,24 @@ def measure(func, n=50):
 # Extraction latency
 ext_times = measure(lambda: [extract_memory_candidates(t, 1) for t in texts], n=20)
 # Search latency (includes vectorization)
-search_times = measure(lambda: [vs.search(t, k=5) for t in texts], n=20)
+search_times = measure(lambda: [vs.search(t, k=5, user_id=USER) for t in texts], n=20)
+# Batched search: one transform + one index search for all texts
+batch_times = measure(lambda: vs.search_batch(texts, k=5, user_id=USER), n=20)
+
+# Full retrieval, cold (memoized plans and query vectors dropped) vs repeated queries
+engine = MemoryEngine(get_session(), vs)
+questions = ["What is my language?", "Remind me about the payment", "When should you call me?",
+             "what is my account number", "anything else I told you?"] * 10
+
+def cold():
+    get_retrieval_cache().clear()
+    shard = vs.shards.get(USER)
+    if shard is not None:
+        shard.clear_query_cache()
+    return [engine.retrieve_relevant(USER, q, 1000) for q in questions]
+
+cold_times = measure(cold, n=20)
+warm_times = measure(lambda: [engine.retrieve_relevant(USER, q, 1000) for q in questions], n=20)
 
 def stats(arr):
     s = sorted(arr)
@@ -39,4 +59,8 @@ def stats(arr):
     }
 
 print("Extraction (ms):", stats(ext_times))
-print("Search (ms):", stats(search_times))
\ No newline at end of file
+print("Search (ms):", stats(search_times))
+print("Search batch of", len(texts), "(ms):", stats(batch_times))
+print("Search throughput (qps): single =", round(len(texts) / (statistics.mean(search_times) / 1000.0)),
+      " batch =", round(len(texts) / (statistics.mean(batch_times) / 1000.0)))
+print("Retrieval of", len(questions), "queries (ms): cold =", stats(cold_times), " repeated =", stats(warm_times))
\ No newline at end of file
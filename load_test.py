@@ -0,0 +1,252 @@
+# load_test.py
+"""
+Concurrent multi-user load against the /chat API.
+
+Runs a users x turns matrix: LOAD_USERS conversations of LOAD_TURNS turns
+each, interleaved, with messages drawn from a mix of fact statements,
+questions and chit-chat (LOAD_MIX). A user's turns go out in order, one at a
+time, as in a real conversation; different users run concurrently.
+
+    closed loop (LOAD_RATE=0): LOAD_CONCURRENCY clients, each sends its next
+        turn as soon as the previous answer is back.
+    open loop (LOAD_RATE>0): turns arrive as a Poisson process at LOAD_RATE
+        per second whether or not the server keeps up, with at most
+        LOAD_CONCURRENCY in flight. Latency is counted from the scheduled
+        arrival, so time spent waiting behind a slow server is not hidden.
+
+By default the app is driven in-process through httpx's ASGI transport (no
+server needed); set LOAD_URL to load a running server instead. Latencies go
+into HDR-style histograms and are reported end to end and per server phase
+(the `timing_ms` breakdown /chat returns), plus per message kind.
+
+    LOAD_USERS=50 LOAD_TURNS=20 LOAD_CONCURRENCY=16 python load_test.py
+    LOAD_RATE=100 LOAD_URL=http://127.0.0.1:8000 python load_test.py
+"""
+import os
+import sys
+import math
+import time
+import random
+import asyncio
+import httpx
+
+URL = os.getenv("LOAD_URL", "")  # empty: in-process ASGI
+USERS = int(os.getenv("LOAD_USERS", "50"))
+TURNS = int(os.getenv("LOAD_TURNS", "20"))
+CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "16"))
+RATE = float(os.getenv("LOAD_RATE", "0"))  # arrivals per second; 0 = closed loop
+MIX = os.getenv("LOAD_MIX", "fact=0.4,question=0.45,chat=0.15")
+TIMEOUT = float(os.getenv("LOAD_TIMEOUT", "10"))
+SEED = int(os.getenv("LOAD_SEED", "42"))
+# user ids are unique per run, so runs against the same store don't see each other's facts
+RUN = os.getenv("LOAD_RUN", str(int(time.time())))
+
+PHASES = ["extract", "pool", "barrier", "state", "retrieve", "context", "gen", "enqueue", "total"]
+NAMES = ["Johnson", "Sarah", "Priya", "Ahmed", "Chen", "Maria"]
+LANGUAGES = ["Hindi", "Kannada", "Tamil", "Telugu", "English"]
+MONTHS = ["January", "February", "March", "April", "May", "June"]
+MESSAGES = {
+    "fact": [
+        lambda r: f"My preferred language is {r.choice(LANGUAGES)}",
+        lambda r: f"From now on, please use {r.choice(LANGUAGES)}",
+        lambda r: f"Call me after {r.randint(8, 11)} AM tomorrow",
+        lambda r: f"Call me at {r.randint(1, 8)}:30 pm",
+        lambda r: f"I owe {r.randint(50, 2000)} dollars",
+        lambda r: f"Your payment of ${r.randint(50, 900)} was due on {r.choice(MONTHS)} {r.randint(1, 28)}th.",
+        lambda r: f"Please extend due date to {r.choice(MONTHS)} {r.randint(1, 28)}",
+        lambda r: f"My name is {r.choice(NAMES)} and account ending in {r.randint(1000, 9999)}",
+        lambda r: "I already paid this bill.",
+        lambda r: "Yes, I need more time – can I pay next week?",
+    ],
+    "question": [
+        lambda r: "What is my language?",
+        lambda r: "What is my name?",
+        lambda r: "Can you call me tomorrow?",
+        lambda r: "What time should I call?",
+        lambda r: "Remind me about the payment",
+        lambda r: "How much do I owe?",
+        lambda r: "When is my payment due?",
+    ],
+    "chat": [
+        lambda r: "Okay, thanks.",
+        lambda r: "Hello, how are you?",
+        lambda r: "It hasn't been processed yet.",
+        lambda r: "Sounds good, talk soon.",
+    ],
+}
+
+
+class Histogram:
+    """HDR-style latency histogram over integer microseconds.
+
+    Values below 128 us get their own bucket; above that a bucket spans the
+    lowest bits past the 7 most significant ones, so any recorded value is
+    reported within 1/128 (under 0.8%) of itself at constant memory per
+    order of magnitude. Percentiles return the top of the bucket, as HDR does.
+    """
+
+    SUB_BITS = 7
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        us = max(0, int(ms * 1000))
+        shift = max(0, us.bit_length() - self.SUB_BITS)
+        key = (us >> shift) << shift
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                top = key + (1 << max(0, key.bit_length() - self.SUB_BITS)) - 1
+                return min(top / 1000.0, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in MESSAGES:
+            raise ValueError(f"unknown message kind in LOAD_MIX: {kind!r} (expected {list(MESSAGES)})")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+def make_jobs(rng, mix):
+    """(user, turn, kind, message) for every cell of the matrix, turn-major so users interleave."""
+    users = [f"load{RUN}_{i}" for i in range(USERS)]
+    kinds, weights = list(mix), list(mix.values())
+    jobs = []
+    for turn in range(1, TURNS + 1):
+        rng.shuffle(users)
+        for user in users:
+            kind = rng.choices(kinds, weights)[0]
+            jobs.append((user, turn, kind, rng.choice(MESSAGES[kind])(rng)))
+    return jobs
+
+def make_client():
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    if URL:
+        return httpx.AsyncClient(base_url=URL, timeout=TIMEOUT, limits=limits), None
+    os.environ.setdefault("LOG_TURNS", "0")
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=TIMEOUT, limits=limits), main
+
+async def run(jobs, rng):
+    client, app_module = make_client()
+    hists = {"e2e": Histogram(), "wait": Histogram()}
+    hists.update({p: Histogram() for p in PHASES})
+    by_kind = {kind: Histogram() for kind in MESSAGES}
+    statuses = {}
+    user_locks = {}
+    slots = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(job, scheduled):
+        user, turn, kind, message = job
+        lock = user_locks.setdefault(user, asyncio.Lock())
+        async with lock, slots:
+            sent = time.perf_counter()
+            try:
+                r = await client.post("/chat", json={"user_id": user, "message": message, "turn_id": turn})
+                status = r.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+        statuses[status] = statuses.get(status, 0) + 1
+        if status != 200:
+            return
+        e2e = (done - scheduled) * 1000.0
+        hists["e2e"].record(e2e)
+        hists["wait"].record((sent - scheduled) * 1000.0)
+        by_kind[kind].record(e2e)
+        timing = r.json().get("timing_ms", {})
+        for phase in PHASES:
+            if phase in timing:
+                hists[phase].record(timing[phase])
+
+    start = time.perf_counter()
+    if RATE > 0:
+        tasks, arrival = [], start
+        for job in jobs:
+            arrival += rng.expovariate(RATE)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(job, arrival)))
+        await asyncio.gather(*tasks)
+    else:
+        pending = iter(jobs)
+
+        async def client_loop():
+            for job in pending:
+                await send(job, time.perf_counter())
+
+        await asyncio.gather(*(client_loop() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+
+    try:
+        ingest = (await client.get("/debug/ingest")).json()["ingest_queue"]
+        cache = (await client.get("/debug/cache")).json()["retrieval_cache"]
+    except Exception:
+        ingest, cache = {}, {}
+    await client.aclose()
+    if app_module is not None:
+        app_module.flush_vector_store()  # what shutdown would do: drain queued writes
+    return hists, by_kind, statuses, elapsed, ingest, cache
+
+def row(label, h):
+    return (f"{label:<24} {h.count:>7} {h.mean():>8.2f} {h.percentile(50):>8.2f} {h.percentile(90):>8.2f} "
+            f"{h.percentile(99):>8.2f} {h.percentile(99.9):>8.2f} {h.max:>9.2f}")
+
+if __name__ == "__main__":
+    rng = random.Random(SEED)
+    mix = parse_mix(MIX)
+    jobs = make_jobs(rng, mix)
+    hists, by_kind, statuses, elapsed, ingest, cache = asyncio.run(run(jobs, rng))
+    ok = statuses.get(200, 0)
+    share = sum(mix.values())
+
+    print("=" * 88)
+    print(f"LOAD TEST ({URL or 'in-process ASGI'})")
+    print("=" * 88)
+    print(f"Users x turns:     {USERS} x {TURNS} = {len(jobs)} requests")
+    if RATE > 0:
+        print(f"Arrivals:          open loop, Poisson {RATE:g} req/s, at most {CONCURRENCY} in flight")
+    else:
+        print(f"Arrivals:          closed loop, {CONCURRENCY} concurrent clients")
+    print(f"Message mix:       " + ", ".join(f"{k} {w / share:.0%}" for k, w in mix.items()))
+    print(f"Duration (s):      {elapsed:.2f}")
+    print(f"Throughput:        {ok / elapsed:.1f} req/s ok")
+    print(f"Status counts:     " + ", ".join(f"{s}: {n}" for s, n in sorted(statuses.items(), key=str)))
+    if ingest:
+        print(f"Ingest queue:      processed {ingest['processed']}, max lag {ingest['max_lag_ms']} ms, rejected {ingest['rejected']}")
+    if cache:
+        print(f"Retrieval cache:   hit rate {cache['hit_rate']:.1%}")
+    print("-" * 88)
+    print(f"{'POST /chat (ms)':<24} {'count':>7} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>9}")
+    print(row("end to end", hists["e2e"]))
+    if RATE > 0:
+        print(row("  client wait", hists["wait"]))
+    for phase in PHASES:
+        print(row(f"  server {phase}", hists[phase]))
+    for kind, h in by_kind.items():
+        if h.count:
+            print(row(f"  e2e {kind}", h))
+    print("=" * 88)
+    sys.exit(0 if ok == len(jobs) else 1)
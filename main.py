@@ -1,27 +1,59 @@
 # main.py
 import os
 import time
-import traceback
-from fastapi import FastAPI, BackgroundTasks, Depends
+import queue
+import threading
+from fastapi import FastAPI, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from src.database import init_db, get_db, get_session
-from src.vector_store import VectorStore
+from src.vector_store import ShardedVectorStore
 from src.memory_engine import MemoryEngine
-from src.extractor import extract_memory_candidates
-from src.state import load_state_for_user, save_state_for_user
+from src.access_stats import get_access_stats
+from src.fact_cache import get_fact_cache
+from src.result_cache import get_retrieval_cache
+from src.eviction import EvictionWorker
+from src.ingest import IngestionQueue, PendingFact, overlay_pending
+from src.extractor import extract_memory_candidates, get_extraction_engine
+from src.rule_packs import get_rule_packs
+from src.interprocess import try_exclusive
+from src.state import load_state_for_user, save_state_for_user, get_state_store
 from src.utils import mask_sensitive, estimate_tokens, trunc_to_budget, format_ms
-from src.config import TOKEN_BUDGET, RETRIEVE_K
+from src.config import TOKEN_BUDGET, RETRIEVE_K, LOG_TURNS
 from src.models import MemoryFact
 
 init_db()
-VECTOR_STORE = VectorStore()
+VECTOR_STORE = ShardedVectorStore()
+EVICTOR = EvictionWorker(VECTOR_STORE)
+INGEST = IngestionQueue(VECTOR_STORE, evictor=EVICTOR)
+# compile the rule packs now (a broken pack fails startup), then pick up edits without a restart
+RULE_PACKS = get_rule_packs()
+get_extraction_engine()
+RULE_PACKS.watch()
+
+# the vector store reopens its mmap snapshots + journal; rebuilding from the DB
+# is only needed to recover a missing store (or when forced via env). It runs in the
+# background: shards swap in their rebuilt index when done, requests are served meanwhile.
+# With several workers (VECTOR_SHARED=1) only the first one rebuilds; the others follow
+# the shared shards as they are swapped in.
+def _rebuild_vector_store():
+    session = get_session()
+    try:
+        with try_exclusive(f"{VECTOR_STORE.root}.rebuild.lock") as owner:
+            if owner:
+                VECTOR_STORE.rebuild_from_db(session)
+    except Exception as e:
+        print(f"vector store rebuild failed: {type(e).__name__}: {e}")
+    finally:
+        session.close()
 
-# rebuild from DB once on startup
 session0 = get_session()
 try:
-    VECTOR_STORE.rebuild_from_db(session0)
+    has_facts = session0.query(MemoryFact.id).filter(MemoryFact.is_active == True).first() is not None
+    if os.getenv("REBUILD_VECTOR_STORE") == "1" or (has_facts and VECTOR_STORE.is_empty()):
+        threading.Thread(target=_rebuild_vector_store, daemon=True).start()
 finally:
     session0.close()
 
@@ -34,6 +66,15 @@ class ChatPayload(BaseModel):
     message: str
     turn_id: int
 
+@app.on_event("shutdown")
+def flush_vector_store():
+    # fold the vector journal into a snapshot so the next start replays nothing
+    INGEST.drain(timeout=30)
+    EVICTOR.drain()
+    VECTOR_STORE.flush()
+    get_access_stats().flush()
+    get_state_store().flush()
+
 @app.get("/")
 def root():
     return {"service": "Recall-1000", "status": "ready"}
@@ -43,82 +84,108 @@ def debug_memory(user_id: str = "judge", db: Session = Depends(get_db)):
     rows = db.query(MemoryFact).filter_by(user_id=user_id, is_active=True).all()
     return {"active_memories": [m.to_dict() for m in rows]}
 
-def process_background_extraction(user_id: str, message: str, turn_id: int):
-    try:
-        db = get_session()
-        engine = MemoryEngine(db, VECTOR_STORE)
-        candidates = extract_memory_candidates(message, turn_id)
-        for key, value, confidence in candidates:
-            existing = db.query(MemoryFact).filter_by(user_id=user_id, key=key, value=value, is_active=True).first()
-            if existing:
-                existing.last_accessed_turn = turn_id
-                db.add(existing)
-                continue
-            old = db.query(MemoryFact).filter_by(user_id=user_id, key=key, is_active=True).order_by(MemoryFact.last_accessed_turn.desc()).first()
-            engine.add_memory(user_id, key, value, turn_id, confidence, category="auto", old_mem=old)
-        db.commit()
-        db.close()
-    except Exception:
-        traceback.print_exc()
+@app.get("/debug/cache")
+def debug_cache():
+    return {"fact_cache": get_fact_cache().stats(), "retrieval_cache": get_retrieval_cache().stats()}
 
-@app.post("/chat")
-def chat(payload: ChatPayload, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    start_total = time.perf_counter()
-    engine = MemoryEngine(db, VECTOR_STORE)
+@app.get("/debug/ingest")
+def debug_ingest():
+    return {"ingest_queue": INGEST.stats()}
 
-    # load + update state
-    state = load_state_for_user(db, payload.user_id)
-    state.update_from_message(payload.message)
+@app.get("/debug/extractors")
+def debug_extractors():
+    return {"extraction": get_extraction_engine().stats(), "rule_packs": RULE_PACKS.stats()}
 
-    # immediate extraction: batch add then commit once
-    immediate = extract_memory_candidates(payload.message, payload.turn_id)
-    new_added = []
-    for key, value, confidence in immediate:
-        old = db.query(MemoryFact).filter_by(user_id=payload.user_id, key=key, is_active=True).order_by(MemoryFact.last_accessed_turn.desc()).first()
-        # use engine.add_memory which commits, but avoid repeated refreshes by letting engine handle it
-        mem = engine.add_memory(payload.user_id, key, value, payload.turn_id, confidence, category="extracted", old_mem=old)
-        new_added.append(mem)
-    # no extra commits here
-
-    # retrieval
-    retrieved = engine.retrieve_relevant(user_id=payload.user_id, query=payload.message, turn_id=payload.turn_id, k=RETRIEVE_K, state=state)
-
-    # prepare context with token budget
-    context_items = []
-    for r in retrieved:
-        mem = r["memory"]
-        text = f"{mem.key}: {mem.value}"
-        context_items.append((text, r["score"]))
-    context_items.sort(key=lambda x: x[1], reverse=True)
-    truncated = trunc_to_budget(context_items, TOKEN_BUDGET, estimate_tokens)
-    context_texts = [t for t, _ in truncated]
-
-    # update access stats (already done in retrieve_relevant) — but ensure persisted
-    for r in retrieved:
-        db.add(r["memory"])
-    db.commit()
-
-    # save conversation state
-    save_state_for_user(db, payload.user_id, state, payload.turn_id)
+@app.post("/admin/rules/reload")
+def reload_rules():
+    # compiled off to the side and swapped in; on error the current rules stay
+    if not RULE_PACKS.reload():
+        raise HTTPException(status_code=422, detail=RULE_PACKS.last_error)
+    return {"rule_packs": RULE_PACKS.stats()}
+
+def answer_turn(payload: ChatPayload, immediate, timing, submitted):
+    """Read side of a turn (runs on the threadpool): state, retrieval, context, response.
+
+    Adds each phase's milliseconds to `timing` (pool wait, barrier, state, retrieve, context, gen).
+    """
+    t = time.perf_counter()
+    timing["pool"] = format_ms((t - submitted) * 1000.0)
+
+    def lap(phase):
+        nonlocal t
+        now = time.perf_counter()
+        timing[phase] = format_ms((now - t) * 1000.0)
+        t = now
+
+    db = get_session()
+    try:
+        # read-your-writes: this user's earlier turns must be in the DB first
+        INGEST.wait_for_user(payload.user_id)
+        lap("barrier")
+        engine = MemoryEngine(db, VECTOR_STORE, evictor=EVICTOR)
+
+        state = load_state_for_user(db, payload.user_id)
+        state.update_from_message(payload.message)
+        lap("state")
+
+        retrieved = engine.retrieve_relevant(user_id=payload.user_id, query=payload.message, turn_id=payload.turn_id, k=RETRIEVE_K, state=state)
+        lap("retrieve")
+        # this turn's facts are still queued: answer with them anyway
+        pending = [PendingFact(payload.user_id, key, value, confidence, payload.turn_id) for key, value, confidence in immediate]
+        retrieved = overlay_pending(retrieved, pending, RETRIEVE_K)
+        # snapshot now: access stats are write-behind, a later commit would reload stale values
+        active_memories = [r["memory"].to_dict() for r in retrieved]
+
+        # prepare context with token budget
+        context_items = []
+        for r in retrieved:
+            mem = r["memory"]
+            text = f"{mem.key}: {mem.value}"
+            context_items.append((text, r["score"]))
+        context_items.sort(key=lambda x: x[1], reverse=True)
+        truncated = trunc_to_budget(context_items, TOKEN_BUDGET, estimate_tokens)
+        context_texts = [t for t, _ in truncated]
+
+        # save conversation state (write-behind)
+        save_state_for_user(db, payload.user_id, state, payload.turn_id)
+    finally:
+        db.close()
+    lap("context")
 
     # response creation (template)
-    gen_start = time.perf_counter()
     resp = f"Based on your data: {', '.join(context_texts)}" if context_texts else "Okay. Noted."
-    timing_gen = format_ms((time.perf_counter() - gen_start) * 1000.0)
+    lap("gen")
 
     resp = mask_sensitive(resp)
     adherence = any(v.lower() in resp.lower() for (_k, v, _c) in immediate)
+    return active_memories, retrieved, resp, adherence
+
+@app.post("/chat")
+async def chat(payload: ChatPayload):
+    start_total = time.perf_counter()
+    immediate = extract_memory_candidates(payload.message, payload.turn_id)
+    submitted = time.perf_counter()
+    timing = {"extract": format_ms((submitted - start_total) * 1000.0)}
+
+    active_memories, retrieved, resp, adherence = await run_in_threadpool(answer_turn, payload, immediate, timing, submitted)
 
-    # background extraction for any remaining facts
-    background_tasks.add_task(process_background_extraction, payload.user_id, payload.message, payload.turn_id)
+    # writes are queued, never applied on the request path; a full queue pushes back
+    submit_start = time.perf_counter()
+    if not INGEST.try_submit(payload.user_id, payload.turn_id, immediate):
+        try:
+            await run_in_threadpool(INGEST.submit, payload.user_id, payload.turn_id, immediate)
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="ingestion queue full, retry later")
+    timing["enqueue"] = format_ms((time.perf_counter() - submit_start) * 1000.0)
 
-    timing_total = format_ms((time.perf_counter() - start_total) * 1000.0)
-    print(f"⏱ Turn {payload.turn_id}: total={timing_total}ms  gen={timing_gen}ms  retrieved={len(retrieved)}")
+    timing["total"] = format_ms((time.perf_counter() - start_total) * 1000.0)
+    if LOG_TURNS:
+        print(f"⏱ Turn {payload.turn_id}: total={timing['total']}ms  gen={timing['gen']}ms  retrieved={len(retrieved)}")
 
     return {
-        "active_memories": [r["memory"].to_dict() for r in retrieved],
+        "active_memories": active_memories,
         "response_generated": True,
         "response": resp,
-        "timing_ms": {"total": timing_total, "gen": timing_gen},
+        "timing_ms": timing,
         "adherence": adherence
     }
@@ -1,33 +1,51 @@
 # persistence_test.py
 from src.database import init_db, get_session
-from src.vector_store import VectorStore
+from src.vector_store import ShardedVectorStore
 from src.models import MemoryFact
 
+USER = "judge"
+FACTS = [("language", "Kannada"), ("call_time", "after 10 AM"), ("amount_due", "$450")]
+
 init_db()
 db = get_session()
-vs = VectorStore()
+vs = ShardedVectorStore()
 
-# Create a sample memory if DB empty
-if not db.query(MemoryFact).filter_by(key="language").first():
-    mem = MemoryFact(
-        user_id="judge",
-        key="language",
-        value="Kannada",
-        origin_turn=1,
-        last_accessed_turn=1,
-        confidence=0.95,
-        is_active=True
-    )
-    db.add(mem)
+# Create sample memories for the user if they have none yet
+if not db.query(MemoryFact).filter_by(user_id=USER, is_active=True).first():
+    mems = [MemoryFact(user_id=USER, key=key, value=value, origin_turn=1, last_accessed_turn=1,
+                       confidence=0.95, is_active=True) for key, value in FACTS]
+    db.add_all(mems)
     db.commit()
-    vs.add_memory(mem.id, f"{mem.key}: {mem.value}")
-    print("Saved sample memory.")
+    vs.add_memories([(m.id, f"{m.key}: {m.value}") for m in mems], user_id=USER)
+    print("Saved sample memories.")
+vs.flush()
+language = db.query(MemoryFact).filter_by(user_id=USER, key="language", is_active=True).first()
+
+print("Simulating restart (reopening the user's shard)...")
+vs2 = ShardedVectorStore()
+res = vs2.search("language", k=3, user_id=USER)
+assert res and res[0][0] == language.id and res[0][1] > 0, res
+assert vs2.search("language", k=3, user_id=USER + "_other") == []
+
+# a fact added to the reopened shard, with terms its vocabulary has never seen (a rerun replaces it)
+old = db.query(MemoryFact).filter_by(user_id=USER, key="food_preference", is_active=True).all()
+for m in old:
+    m.is_active = False
+vs2.remove_memories([m.id for m in old], user_id=USER)
+mem = MemoryFact(user_id=USER, key="food_preference", value="spicy ramen", origin_turn=2,
+                 last_accessed_turn=2, confidence=0.9, is_active=True)
+db.add(mem)
+db.commit()
+vs2.add_memory(mem.id, f"{mem.key}: {mem.value}", user_id=USER)
+hits = vs2.search("spicy ramen", k=1, user_id=USER)
+assert hits and hits[0][0] == mem.id and hits[0][1] > 0, hits
+vs2.flush()
 
-print("Simulating restart (reloading vector store)...")
-vs2 = VectorStore()
-session2 = get_session()
-vs2.rebuild_from_db(session2)
-res = vs2.search("language", k=3)
+print("Simulating second restart...")
+vs3 = ShardedVectorStore()
+hits = vs3.search("spicy ramen", k=1, user_id=USER)
+assert hits and hits[0][0] == mem.id and hits[0][1] > 0, hits
+res = vs3.search("language", k=3, user_id=USER)
+assert res and res[0][0] == language.id, res
 print("Search results after reload:", res[:3])
-session2.close()
 db.close()
\ No newline at end of file
@@ -0,0 +1,175 @@
+# query_plan_benchmark.py
+"""
+EXPLAIN QUERY PLAN + latency for every query the engine sends to the database.
+
+For each table size a synthetic SQLite database is built (several hundred
+rows per user, most of them superseded/inactive) and each query is run
+twice: with only the original single-column indexes ("baseline") and after
+src/migrations.py ("migrated"). A migrated plan that falls back to a full
+table scan or a temp B-tree sort is flagged as a regression and the script
+exits non-zero. The full report is written to data/query_plan_report.json.
+
+    QPB_SIZES=10000,100000,1000000 python query_plan_benchmark.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import statistics
+from sqlalchemy import func, select
+from src.database import make_engine
+from src.migrations import upgrade, LEGACY_INDEXES
+from src.models import MemoryFact, ConversationStateRow
+from src.state import _UPSERT as STATE_UPSERT
+from src.active_counts import _UPSERT as COUNTER_UPSERT
+
+SIZES = [int(s) for s in os.getenv("QPB_SIZES", "10000,100000,1000000").split(",")]
+REPS = int(os.getenv("QPB_REPS", "200"))
+ROWS_PER_USER = 400
+KEYS = [f"key_{i}" for i in range(40)] + ["language", "amount_due", "due_date", "call_time"]
+OUT = "data/query_plan_report.json"
+M = MemoryFact
+active = M.is_active == True
+
+# name -> (statement builder, where it comes from)
+QUERIES = {
+    "first_by_key": (lambda u, k: select(M).where(M.user_id == u, M.key == k, active).limit(1),
+                     "MemoryEngine.add_memory"),
+    "chain_heads": (lambda u, k: select(M.id, M.user_id, M.key, M.value, M.root_id)
+                    .where(active, M.user_id.in_([u] + [f"user_{i}" for i in range(63)]),
+                           M.key.in_([k, "language", "amount_due", "due_date"]))
+                    .order_by(M.last_accessed_turn.asc(), M.id.asc()),
+                    "MemoryEngine.add_memories_bulk (ingestion batches)"),
+    "user_facts": (lambda u, k: select(M).where(M.user_id == u, active)
+                   .order_by(M.last_accessed_turn.desc(), M.id.asc()),
+                   "HotFactCache (UserFacts load)"),
+    "debug_memory": (lambda u, k: select(M).where(M.user_id == u, active),
+                     "main.debug_memory"),
+    "state_read": (lambda u, k: select(ConversationStateRow).where(ConversationStateRow.user_id == u),
+                   "StateStore._read"),
+    "state_upsert": (lambda u, k: STATE_UPSERT.bindparams(user_id=u, data="{}", turn_id=1, updated_at=0.0),
+                     "StateStore.flush"),
+    "counter_upsert": (lambda u, k: COUNTER_UPSERT.bindparams(scope=u, delta=1),
+                       "ActiveCounts.adjust"),
+    "count_user": (lambda u, k: select(func.count(M.id)).where(active, M.user_id == u),
+                   "eviction.evict (user recount)"),
+    "count_all": (lambda u, k: select(func.count(M.id)).where(active),
+                  "eviction.evict (global recount)"),
+    "max_turn": (lambda u, k: select(func.max(M.last_accessed_turn)).where(active),
+                 "eviction.evict (policy clock)"),
+    "fair_share": (lambda u, k: select(M.user_id, func.count(M.id)).where(active).group_by(M.user_id),
+                   "eviction.evict (EVICTION_FAIR_SHARE)"),
+    "victims_lru_user": (lambda u, k: select(M).where(active, M.user_id == u)
+                         .order_by(M.last_accessed_turn.asc(), M.id.asc()).limit(50),
+                         "eviction.select_victims (lru, per user)"),
+    "victims_lru_all": (lambda u, k: select(M).where(active)
+                        .order_by(M.last_accessed_turn.asc(), M.id.asc()).limit(50),
+                        "eviction.select_victims (lru, global)"),
+    "victims_scan_user": (lambda u, k: select(M).where(active, M.user_id == u),
+                          "eviction.select_victims (scored policies, per user)"),
+}
+
+# sorts that are expected: they order rows an index lookup already narrowed down (the heads of
+# one batch's chains; one user's facts tied on last_accessed_turn), never the whole table
+BOUNDED_SORTS = {"chain_heads", "victims_lru_user"}
+
+def is_regression(name, plan):
+    # full table scans and sorts; scanning a (partial) index in order is fine
+    return any((line.startswith("SCAN ") and "INDEX" not in line)
+               or ("TEMP B-TREE" in line and name not in BOUNDED_SORTS)
+               for line in plan)
+
+def build(path, n):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = make_engine(f"sqlite:///{path}")
+    upgrade(engine)
+    rng = random.Random(n)
+    n_users = max(1, n // ROWS_PER_USER)
+    rows, turn = [], 0
+    for i in range(n):
+        turn += 1
+        rows.append({"user_id": f"user_{rng.randrange(n_users)}", "key": rng.choice(KEYS),
+                     "value": f"v{rng.randrange(50)}", "category": "fact", "origin_turn": turn,
+                     "last_accessed_turn": turn - rng.randrange(min(turn, 500)), "access_count": 0,
+                     "confidence": 0.9, "is_active": rng.random() < 0.3})
+    with engine.begin() as conn:
+        for i in range(0, n, 50000):
+            conn.execute(M.__table__.insert(), rows[i:i + 50000])
+        conn.execute(COUNTER_UPSERT, [{"scope": f"user_{u}", "delta": 1} for u in range(n_users)])
+        conn.execute(STATE_UPSERT, [{"user_id": f"user_{u}", "data": "{}", "turn_id": 1, "updated_at": 0.0}
+                                    for u in range(n_users)])
+    return engine, n_users
+
+# the partial indexes added by migration 1, and the single-column ones it drops
+NEW_INDEXES = [i for i in M.__table__.indexes if i.dialect_options["sqlite"]["where"] is not None]
+
+def set_schema(engine, migrated):
+    with engine.begin() as conn:
+        for index in NEW_INDEXES:
+            if migrated:
+                index.create(conn, checkfirst=True)
+            else:
+                index.drop(conn, checkfirst=True)
+        for name in LEGACY_INDEXES:
+            if migrated:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+            else:
+                column = name[len("ix_memory_facts_"):]
+                conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {name} ON memory_facts ("{column}")')
+
+def explain(conn, stmt):
+    compiled = stmt.compile(conn, compile_kwargs={"render_postcompile": True})  # expand IN lists
+    params = tuple(compiled.params[k] for k in compiled.positiontup)
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)]
+
+def timed(conn, build_stmt, n_users):
+    rng = random.Random(7)
+    lat = []
+    for _ in range(REPS):
+        stmt = build_stmt(f"user_{rng.randrange(n_users)}", rng.choice(KEYS))
+        t0 = time.perf_counter()
+        result = conn.execute(stmt)
+        if result.returns_rows:
+            result.fetchall()
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return lat
+
+def pct(arr, p):
+    s = sorted(arr)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+os.makedirs("data", exist_ok=True)
+report, regressions = [], []
+for n in SIZES:
+    path = f"data/qpb_{n}.db"
+    t0 = time.perf_counter()
+    engine, n_users = build(path, n)
+    print(f"\n=== {n:,} rows, {n_users:,} users (built in {time.perf_counter() - t0:.1f}s) ===")
+    print(f"{'query':<19}{'mode':<10}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}  plan")
+    for mode in ("baseline", "migrated"):
+        set_schema(engine, migrated=(mode == "migrated"))
+        with engine.connect() as conn:
+            for name, (build_stmt, origin) in QUERIES.items():
+                plan = explain(conn, build_stmt("user_0", KEYS[0]))
+                lat = timed(conn, build_stmt, n_users)
+                flagged = mode == "migrated" and is_regression(name, plan)
+                if flagged:
+                    regressions.append((n, name, plan))
+                report.append({"rows": n, "query": name, "origin": origin, "mode": mode, "plan": plan,
+                               "mean_ms": statistics.mean(lat), "p50_ms": pct(lat, 50), "p95_ms": pct(lat, 95)})
+                print(f"{name:<19}{mode:<10}{statistics.mean(lat):>9.3f}{pct(lat, 50):>9.3f}{pct(lat, 95):>9.3f}"
+                      f"  {' | '.join(plan)}{'  <-- REGRESSION' if flagged else ''}")
+    engine.dispose()
+    os.remove(path)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+with open(OUT, "w") as f:
+    json.dump(report, f, indent=2)
+print(f"\nreport written to {OUT}")
+if regressions:
+    print(f"{len(regressions)} plan regression(s)")
+    sys.exit(1)
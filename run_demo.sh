@@ -21,6 +21,14 @@ echo "3) Running persistence test (vector store reload)"
 python persistence_test.py
 
 echo
-echo "4) Starting API at http://127.0.0.1:8000/docs"
+echo "4) Running extractor golden-corpus check"
+python extractor_equivalence_test.py
+
+echo
+echo "5) Running in-process load test (50 users x 20 turns, 16 concurrent clients)"
+python load_test.py
+
+echo
+echo "6) Starting API at http://127.0.0.1:8000/docs"
 echo "   LLM disabled, sub‑2ms retrieval, 96% recall"
 uvicorn main:app --host 127.0.0.1 --port 8000
\ No newline at end of file
@@ -0,0 +1,126 @@
+# shared_store_test.py
+"""
+Several processes sharing one ShardedVectorStore (VECTOR_SHARED mode), as
+uvicorn workers do with --workers N.
+
+Each worker process adds and removes memories for a handful of shared users
+while the others do the same (journal compaction is forced often, so workers
+also fall behind snapshots written by others and reload them). At the end
+every worker, and a fresh process reading the files cold, must hold the same
+live ids per user and return the same search results. Then one worker writes
+a probe memory and the others time how long until a search finds it.
+
+    SHARED_WORKERS=4 SHARED_OPS=300 python shared_store_test.py
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import multiprocessing as mp
+
+WORKERS = int(os.getenv("SHARED_WORKERS", "4"))
+OPS = int(os.getenv("SHARED_OPS", "300"))
+USERS = [f"user_{i}" for i in range(5)]
+ROOT = "data/shared_test_shards"
+QUERIES = ["language hindi", "payment due monday", "call me in the evening", "pet dog"]
+WORDS = ["hindi", "payment", "monday", "evening", "dog", "pizza", "delhi", "invoice", "tea", "train"]
+
+def open_store():
+    from src import vector_store
+    vector_store.VECTOR_JOURNAL_COMPACT_EVERY = int(os.getenv("SHARED_COMPACT_EVERY", "25"))
+    return vector_store.ShardedVectorStore(root=ROOT, shared=True)
+
+def ops_for(worker):
+    rng = random.Random(worker)
+    ops, mine = [], []
+    for t in range(OPS):
+        user = rng.choice(USERS)
+        if mine and rng.random() < 0.2:
+            victim = mine.pop(rng.randrange(len(mine)))
+            ops.append(("del", victim[0], victim[1]))
+        else:
+            mem_id = worker * 1_000_000 + t
+            mine.append((user, mem_id))
+            ops.append(("add", user, mem_id, f"{rng.choice(WORDS)}: {rng.choice(WORDS)} {rng.choice(WORDS)}"))
+    return ops
+
+def state(vs):
+    out = {}
+    for user in USERS:
+        vs.sync(user)
+        shard = vs._shard(user, create=False)
+        if shard is None:
+            out[user] = (set(), [])
+            continue
+        s = shard.snap
+        live = {s.id_map[r] for r in range(s.n)} - s.deleted
+        # full rankings, scores to 5 places: a row scored in a worker's delta and the same row in a
+        # folded index differ in the last float32 bit, which may reorder ties at any cutoff
+        out[user] = (live, [sorted((-round(score, 5), mem_id) for mem_id, score in shard.search(q, k=len(live) + 1))
+                            for q in QUERIES])
+    return out
+
+def worker(i, start, done, probe, results):
+    vs = open_store()
+    start.wait()
+    t0 = time.perf_counter()
+    for op in ops_for(i):
+        if op[0] == "add":
+            vs.add_memory(op[2], op[3], user_id=op[1])
+        else:
+            vs.remove_memories([op[2]], user_id=op[1])
+    write_s = time.perf_counter() - t0
+    done.wait()
+    snapshot = state(vs)
+    # propagation: worker 0 writes a probe, the others poll until a search finds it
+    if i == 0:
+        probe.wait()
+        vs.add_memory(999_999_999, "probe: zebra marker", user_id="probe_user")
+        lag = 0.0
+    else:
+        probe.wait()
+        t0 = time.perf_counter()
+        while not any(m == 999_999_999 for m, _ in vs.search("zebra marker", k=3, user_id="probe_user")):
+            if time.perf_counter() - t0 > 5:
+                break
+        lag = (time.perf_counter() - t0) * 1000
+    results.put((i, snapshot, lag, write_s))
+
+if __name__ == "__main__":
+    shutil.rmtree(ROOT, ignore_errors=True)
+    os.makedirs(ROOT, exist_ok=True)
+    ctx = mp.get_context("spawn")
+    start, done, probe = ctx.Barrier(WORKERS), ctx.Barrier(WORKERS), ctx.Barrier(WORKERS)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(i, start, done, probe, results)) for i in range(WORKERS)]
+    for p in procs:
+        p.start()
+    out = sorted((results.get(timeout=300) for _ in procs), key=lambda r: r[0])
+    for p in procs:
+        p.join()
+
+    expected = {user: set() for user in USERS}
+    for i in range(WORKERS):
+        for op in ops_for(i):
+            if op[0] == "add":
+                expected[op[1]].add(op[2])
+            else:
+                expected[op[1]].discard(op[2])
+    cold = state(open_store())
+    live_ok = all(snap[u][0] == expected[u] for _, snap, _, _ in out for u in USERS)
+    same = all(snap == cold for _, snap, _, _ in out)
+    lags = [lag for i, _, lag, _ in out if i != 0]
+    write_s = max(w for *_, w in out)
+
+    print("=" * 60)
+    print("SHARED VECTOR STORE (multi-process)")
+    print("=" * 60)
+    print(f"Worker processes:          {WORKERS}")
+    print(f"Writes per worker:         {OPS}  ({WORKERS * OPS / write_s:.0f} writes/s across workers)")
+    print(f"Live ids as expected:      {live_ok}")
+    print(f"Workers == cold reload:    {same}")
+    print(f"Probe visible after (ms):  max {max(lags):.2f}" if lags else "Probe visible after (ms):  n/a")
+    print("=" * 60)
+    shutil.rmtree(ROOT, ignore_errors=True)
+    sys.exit(0 if live_ok and same else 1)
@@ -0,0 +1,99 @@
+# src/access_stats.py
+import threading
+from sqlalchemy import bindparam, func
+from src.models import MemoryFact
+from src.background import BackgroundRunner
+from src.config import ACCESS_STATS_FLUSH_INTERVAL, ACCESS_STATS_MAX_PENDING
+
+_UPDATE = (MemoryFact.__table__.update()
+           .where(MemoryFact.__table__.c.id == bindparam("b_id"))
+           .values(last_accessed_turn=bindparam("b_turn"),
+                   access_count=func.coalesce(MemoryFact.__table__.c.access_count, 0) + bindparam("b_hits")))
+
+
+class AccessStatsBuffer:
+    """Write-behind buffer for last_accessed_turn / access_count.
+
+    Retrieval records hits here instead of committing; repeated hits on the same
+    row coalesce into one pending update. A daemon thread writes everything in
+    one executemany every `interval` seconds, or sooner once `max_pending` rows
+    are waiting. Anything that orders by last_accessed_turn in SQL (eviction)
+    must call flush() first.
+    """
+
+    def __init__(self, session_factory=None, interval=ACCESS_STATS_FLUSH_INTERVAL,
+                 max_pending=ACCESS_STATS_MAX_PENDING):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.pending = {}              # mem_id -> [last_turn, hits]
+        self.flushes = 0
+        self.rows_written = 0
+        self._runner = BackgroundRunner(self.flush, interval)
+
+    def record(self, mem_id: int, turn_id: int):
+        with self.lock:
+            entry = self.pending.get(mem_id)
+            if entry is None:
+                self.pending[mem_id] = [turn_id, 1]
+            else:
+                entry[0] = turn_id
+                entry[1] += 1
+            full = len(self.pending) >= self.max_pending
+        if full:
+            self._runner.wake()
+        else:
+            self._runner.start()
+
+    def pending_for(self, mem_id: int):
+        with self.lock:
+            entry = self.pending.get(mem_id)
+            return tuple(entry) if entry else None
+
+    def snapshot(self):
+        with self.lock:
+            return {mid: tuple(e) for mid, e in self.pending.items()}
+
+    def flush(self, db=None):
+        """Write all pending updates; uses `db` if given (and commits it), else a fresh session."""
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return 0
+        params = [{"b_id": mid, "b_turn": turn, "b_hits": hits} for mid, (turn, hits) in batch.items()]
+        own = db is None
+        if own:
+            if self.session_factory is None:
+                from src.database import get_session
+                self.session_factory = get_session
+            db = self.session_factory()
+        try:
+            db.execute(_UPDATE, params)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # put the batch back (newer hits recorded meanwhile win) and retry next round
+            with self.lock:
+                for mid, (turn, hits) in batch.items():
+                    entry = self.pending.get(mid)
+                    if entry is None:
+                        self.pending[mid] = [turn, hits]
+                    else:
+                        entry[1] += hits
+            raise
+        finally:
+            if own:
+                db.close()
+        self.flushes += 1
+        self.rows_written += len(params)
+        return len(params)
+
+
+_default = None
+
+def get_access_stats():
+    global _default
+    if _default is None:
+        _default = AccessStatsBuffer()
+    return _default
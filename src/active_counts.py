@@ -0,0 +1,101 @@
+# src/active_counts.py
+import threading
+from sqlalchemy import event, text
+from src.models import MemoryCounter
+
+GLOBAL = "__all__"
+
+_UPSERT = text(
+    "INSERT INTO memory_counters (scope, active) VALUES (:scope, :delta) "
+    "ON CONFLICT (scope) DO UPDATE SET active = memory_counters.active + excluded.active"
+)
+_SET = text(
+    "INSERT INTO memory_counters (scope, active) VALUES (:scope, :active) "
+    "ON CONFLICT (scope) DO UPDATE SET active = excluded.active"
+)
+
+
+class ActiveCounts:
+    """Active-fact counts per user and globally, mirrored in memory_counters.
+
+    Writers call adjust() inside the transaction that changes is_active, so the
+    table moves with the facts; the in-memory copy lets _maybe_evict decide
+    without touching the database. adjust() reads the touched rows back after
+    its upsert and the copy takes those values only when the session commits
+    (a rollback leaves it alone), so scopes this process writes also pick up
+    other workers' changes. Counts can drift if rows are changed outside the
+    engine; eviction recounts exactly before it deactivates anything.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = None
+
+    def _ensure(self, db):
+        if self.counts is None:
+            rows = db.query(MemoryCounter.scope, MemoryCounter.active).all()
+            with self.lock:
+                if self.counts is None:
+                    self.counts = {scope: active for scope, active in rows}
+
+    def get(self, db, scope: str = GLOBAL):
+        self._ensure(db)
+        return self.counts.get(scope, 0)
+
+    def adjust(self, db, deltas):
+        """Apply {user_id: delta} (and their sum to the global count); the caller commits."""
+        deltas = {u: d for u, d in deltas.items() if d}
+        if not deltas:
+            return
+        self._ensure(db)
+        total = sum(deltas.values())
+        params = [{"scope": u, "delta": d} for u, d in deltas.items()]
+        if total:
+            params.append({"scope": GLOBAL, "delta": total})
+        db.execute(_UPSERT, params)
+        scopes = [p["scope"] for p in params]
+        rows = db.query(MemoryCounter.scope, MemoryCounter.active).filter(MemoryCounter.scope.in_(scopes)).all()
+        self._stage(db, dict(rows))
+
+    def correct(self, db, scope: str, actual: int):
+        """Reset a drifted count to an exact recount; a user's drift is applied to the global count too."""
+        self._ensure(db)
+        drift = actual - self.counts.get(scope, 0)
+        if not drift:
+            return
+        if scope == GLOBAL:
+            db.execute(_SET, {"scope": GLOBAL, "active": actual})
+            self._stage(db, {GLOBAL: actual})
+        else:
+            self.adjust(db, {scope: drift})
+
+    def _stage(self, db, values):
+        # table values as of this transaction; published to self.counts on commit, dropped on rollback
+        staged = db.info.get(self)
+        if staged is None:
+            staged = db.info[self] = {}
+            event.listen(db, "after_commit", self._publish)
+            event.listen(db, "after_rollback", lambda session: session.info[self].clear())
+        staged.update(values)
+
+    def _publish(self, db):
+        staged = db.info[self]
+        if not staged:
+            return
+        with self.lock:
+            if self.counts is not None:
+                self.counts.update(staged)
+        staged.clear()
+
+    def reset(self):
+        with self.lock:
+            self.counts = None
+
+
+_default = None
+
+def get_active_counts():
+    global _default
+    if _default is None:
+        _default = ActiveCounts()
+    return _default
@@ -0,0 +1,46 @@
+# src/background.py
+import atexit
+import threading
+import traceback
+
+
+class BackgroundRunner:
+    """Daemon thread that calls `fn` every `interval` seconds, when woken, and once at exit.
+
+    The write-behind buffers and the eviction worker share it: start() spawns
+    the thread on first use, wake() runs `fn` early (interval=None waits for a
+    wake). A failing call is printed and retried on the next round.
+    """
+
+    def __init__(self, fn, interval=None):
+        self.fn = fn
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.run_quietly)
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.run_quietly()
+
+    def run_quietly(self):
+        try:
+            self.fn()
+        except Exception:
+            traceback.print_exc()
@@ -1,10 +1,68 @@
 # src/config.py
+import os
+
 DATA_DIR = "data"
-VECTOR_STORE_PATH = f"{DATA_DIR}/vector_store.pkl"
-DB_URL = f"sqlite:///{DATA_DIR}/memory.db"
+VECTOR_STORE_PATH = f"{DATA_DIR}/vector_store"  # base name of the snapshot + journal files
+VECTOR_SHARD_DIR = f"{DATA_DIR}/vector_shards"
+VECTOR_SHARD_CACHE_SIZE = 256  # resident per-user shards before LRU unload
+VECTOR_JOURNAL_COMPACT_EVERY = 500  # journal records before a background snapshot
+VECTOR_JOURNAL_FSYNC = False
+VECTOR_TOMBSTONE_RATIO = 0.25  # compact the index once this share of rows is deleted
+VECTOR_TOMBSTONE_MIN = 64
+VECTOR_DELTA_RATIO = 0.1  # rows added since the last fold are scored exactly until they reach this share of the index
+VECTOR_DELTA_MIN = 256
+VECTOR_SEARCH_THREADS = int(os.getenv("VECTOR_SEARCH_THREADS", "0"))  # concurrent vector searches per process (0 = CPU count)
+VECTOR_SHARED = os.getenv("VECTOR_SHARED") == "1"  # worker processes share the vector store files (file lock + generation counter)
+VECTOR_BACKEND = "flat"  # "flat" (dense faiss), "sparse" (inverted index) or ANN: "ivf", "ivfpq", "hnsw"
+VECTOR_ANN_TRAIN_THRESHOLD = 10000  # ANN backends scan exactly until a store reaches this many rows
+VECTOR_IVF_NLIST = 256
+VECTOR_IVF_NPROBE = 8
+VECTOR_PQ_M = 16
+VECTOR_HNSW_M = 32
+VECTOR_HNSW_EF_SEARCH = 64
+VECTOR_HNSW_EF_CONSTRUCTION = 80
+DB_URL = os.getenv("DB_URL", f"sqlite:///{DATA_DIR}/memory.db")  # e.g. postgresql+psycopg://... for multi-process
+DB_ASYNC_URL = os.getenv("DB_ASYNC_URL")  # default: DB_URL with its async driver (aiosqlite / asyncpg)
+DB_POOL_SIZE = 8
+DB_MAX_OVERFLOW = 16
+DB_POOL_TIMEOUT = 30  # seconds to wait for a pooled connection
+SQLITE_BUSY_TIMEOUT_MS = 5000  # wait out a concurrent writer instead of failing with "database is locked"
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE_KB = 64 * 1024
 RETRIEVE_K = 3
 FUZZY_THRESHOLD = 0.82
+FUZZY_TOP_KEYS = 5  # best fuzzy key matches kept per query
+FUZZY_PREFILTER_MIN_KEYS = 64  # vocabularies this large get the character-count prefilter
 ACTIVE_MEMORY_LIMIT = 2000
+ACTIVE_MEMORY_LIMIT_PER_USER = 0  # 0 = no per-user cap, only the global ACTIVE_MEMORY_LIMIT
+ACTIVE_MEMORY_USER_LIMITS = {}  # user_id -> cap, overrides ACTIVE_MEMORY_LIMIT_PER_USER
+EVICTION_BATCH_SIZE = 500  # rows deactivated per eviction transaction
+EVICTION_POLICY = "utility"  # "lru", "lfu", "tinylfu" or "utility" (decayed utility per byte), see src/eviction.py
+EVICTION_FAIR_SHARE = True  # global evictions come from the largest users first
+ACCESS_STATS_FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes of access stats
+ACCESS_STATS_MAX_PENDING = 512  # flush early once this many rows have pending stats
+INGEST_WORKERS = 2  # ingestion worker threads; each user's writes stay on one worker
+INGEST_QUEUE_SIZE = 1024  # queued messages across workers before /chat waits
+INGEST_BATCH_SIZE = 64  # messages applied per transaction
+INGEST_SUBMIT_TIMEOUT = 2.0  # seconds /chat waits on a full queue before answering 503
+INGEST_READ_BARRIER_TIMEOUT = 1.0  # seconds a retrieval waits for the same user's queued writes
+INGEST_RETRIES = 3  # attempts per message after its batch transaction fails
+INGEST_RETRY_BACKOFF = 0.05  # seconds before the first retry, doubled each attempt (e.g. SQLite busy)
+INGEST_DEAD_LETTER_SIZE = 1000  # messages that still failed, kept for inspection/replay (oldest dropped)
+STATE_FLUSH_INTERVAL = 1.0  # seconds between write-behind upserts of conversation state
+STATE_CACHE_SIZE = 10000  # users whose conversation state stays cached in-process
+STATE_REVALIDATE = os.getenv("STATE_REVALIDATE", "1" if VECTOR_SHARED else "0") == "1"  # several workers: check the stored row on every load instead of trusting the cache
 RECENCY_HALF_LIFE = 200.0
 TOKEN_BUDGET = 512
-EMBED_DIM = 768
\ No newline at end of file
+EMBED_DIM = 768
+VECTOR_EMBEDDING = "tfidf"  # "tfidf" (fitted vocabulary) or "hashing" (fixed dim, online IDF, no refits)
+FACT_CACHE_MAX_USERS = 1024  # users whose active facts stay cached in-process (LRU)
+FACT_CACHE_MAX_FACTS = 200000  # total cached fact snapshots across users
+FACT_CACHE_TTL = 30.0  # seconds; bounds staleness from writes that bypass the engine
+RETRIEVAL_CACHE_SIZE = 20000  # cached retrieval plans, keyed by (user, normalized query, k, memory version); 0 = off
+VECTOR_QUERY_CACHE_SIZE = 256  # query vectors kept per loaded vector store, reused until its vectorizer changes
+EXTRACT_POOL_MIN_BATCH = 5000  # extract_batch(processes>0) only forks a pool for lists at least this long
+EXTRACT_POOL_CHUNK = 1000  # messages per pool task
+RULE_PACK_DIR = os.getenv("RULE_PACK_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules"))  # *.json / *.yaml rule packs, filename order; default is the repo's rules/
+RULE_PACK_RELOAD_INTERVAL = 2.0  # seconds between pack-file checks for hot reload (0 = only POST /admin/rules/reload)
+LOG_TURNS = os.getenv("LOG_TURNS", "1") != "0"  # per-turn timing line on stdout from /chat (load tests turn it off)
\ No newline at end of file
@@ -1,19 +1,71 @@
 # src/database.py
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from src.config import DB_URL
-from src.models import Base
+from src.config import (DATA_DIR, DB_URL, DB_ASYNC_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+                        SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB)
+from src.migrations import upgrade
+from src.interprocess import exclusive
 
 _engine = None
 _SessionLocal = None
+_async_engine = None
+_AsyncSessionLocal = None
+
+# sync URL driver -> async driver, for the optional async engine
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def is_sqlite(url: str = DB_URL):
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _sqlite_file(url: str):
+    db = make_url(url).database
+    return db if db and db != ":memory:" else None
+
+def _tune_sqlite(dbapi_conn, _record):
+    # per-connection profile: WAL lets readers run alongside the single writer,
+    # NORMAL sync is durable at checkpoints, busy_timeout queues writers instead of erroring
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    cur.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    cur.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+def _engine_kwargs(url: str):
+    kwargs = {"pool_pre_ping": True}
+    if is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if _sqlite_file(url) is None:
+            return kwargs   # in-memory: SQLAlchemy picks a single-connection pool
+    kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return kwargs
+
+def make_engine(url: str = DB_URL):
+    """Sync engine for `url`: pooled, with the tuned pragma profile on SQLite files."""
+    engine = create_engine(url, **_engine_kwargs(url))
+    if is_sqlite(url) and _sqlite_file(url):
+        event.listen(engine, "connect", _tune_sqlite)
+    return engine
 
 def init_db():
     global _engine, _SessionLocal
-    os.makedirs("data", exist_ok=True)
-    _engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+    path = _sqlite_file(DB_URL) if is_sqlite(DB_URL) else None
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _engine = make_engine(DB_URL)
     _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
-    Base.metadata.create_all(bind=_engine)
+    # worker processes start together: one applies the migrations, the others wait and find them done
+    with exclusive(f"{path or os.path.join(DATA_DIR, 'schema')}.migrate.lock"):
+        upgrade(_engine)
+
+def get_engine():
+    if _engine is None:
+        init_db()
+    return _engine
 
 def get_db():
     global _SessionLocal
@@ -29,4 +81,25 @@ def get_session():
     global _SessionLocal
     if _SessionLocal is None:
         init_db()
-    return _SessionLocal()
\ No newline at end of file
+    return _SessionLocal()
+
+def async_url(url: str = DB_URL):
+    u = make_url(url)
+    if "+" in u.drivername:
+        u = u.set(drivername=u.get_backend_name())
+    return u.set(drivername=_ASYNC_DRIVERS.get(u.drivername, u.drivername)).render_as_string(hide_password=False)
+
+def get_async_session():
+    """AsyncSession on DB_ASYNC_URL (or DB_URL's async driver). Needs aiosqlite / asyncpg installed."""
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        # imported lazily: the async stack is optional
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        url = DB_ASYNC_URL or async_url(DB_URL)
+        kwargs = _engine_kwargs(url)
+        kwargs.pop("connect_args", None)
+        _async_engine = create_async_engine(url, **kwargs)
+        if is_sqlite(url) and _sqlite_file(url):
+            event.listen(_async_engine.sync_engine, "connect", _tune_sqlite)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal()
@@ -0,0 +1,106 @@
+# src/embedding.py
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+class HashingTfidfVectorizer:
+    """TF-IDF over a fixed hashed feature space with online document frequencies.
+
+    There is no vocabulary to fit: every term hashes into one of `dim` buckets,
+    so any new text embeds in O(len(text)) and never triggers a refit. IDF is
+    computed from document frequencies accumulated by `partial_fit`; vectors
+    already stored keep the weights they were embedded with.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.hasher = HashingVectorizer(
+            n_features=dim,
+            stop_words='english',
+            lowercase=True,
+            analyzer='word',
+            alternate_sign=False,
+            norm=None
+        )
+        self.df = np.zeros(dim, dtype=np.int64)
+        self.n_docs = 0
+
+    def partial_fit(self, texts):
+        X = self.hasher.transform(texts)
+        # hashed rows hold each bucket at most once, so bucket counts are document frequencies
+        self.df += np.bincount(X.indices, minlength=self.dim)
+        self.n_docs += X.shape[0]
+        return self
+
+    def updated(self, texts):
+        """Copy with `texts` counted in; this one is left as it is for concurrent readers."""
+        out = HashingTfidfVectorizer.__new__(HashingTfidfVectorizer)
+        out.dim, out.hasher = self.dim, self.hasher
+        out.df, out.n_docs = self.df.copy(), self.n_docs
+        return out.partial_fit(texts)
+
+    def fit(self, texts):
+        self.df = np.zeros(self.dim, dtype=np.int64)
+        self.n_docs = 0
+        return self.partial_fit(texts)
+
+    def idf(self):
+        # same smoothing as sklearn's TfidfTransformer(smooth_idf=True)
+        return np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0
+
+    def transform(self, texts):
+        X = self.hasher.transform(texts).multiply(self.idf()).tocsr()
+        return normalize(X)
+
+
+EMBEDDINGS = ("tfidf", "hashing")
+
+
+def make_vectorizer(name: str, dim: int):
+    if name == "hashing":
+        return HashingTfidfVectorizer(dim)
+    if name == "tfidf":
+        return TfidfVectorizer(
+            max_features=dim,
+            stop_words='english',
+            lowercase=True,
+            analyzer='word'
+        )
+    raise ValueError(f"unknown embedding: {name!r} (expected one of {list(EMBEDDINGS)})")
+
+
+def unseen_terms(name: str, vectorizer, texts):
+    """Terms of `texts` a fitted vocabulary has no column for (they would embed as zeros).
+
+    Empty for hashing, and once the vocabulary is at `max_features`: a refit
+    then keeps the most frequent terms, so refitting for every rare one would not help.
+    """
+    if name == "hashing" or len(vectorizer.vocabulary_) >= (vectorizer.max_features or float("inf")):
+        return set()
+    analyze = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    return {t for text in texts for t in analyze(text) if t not in vocabulary}
+
+
+def vectorizer_state(name: str, vectorizer):
+    """JSON-serialisable state of a fitted vectorizer, for snapshot metadata."""
+    if name == "hashing":
+        return {"df": vectorizer.df.tolist(), "n_docs": vectorizer.n_docs}
+    return {
+        "vocabulary": {t: int(i) for t, i in vectorizer.vocabulary_.items()},
+        "idf": vectorizer.idf_.tolist()
+    }
+
+
+def restore_vectorizer(name: str, dim: int, state):
+    vectorizer = make_vectorizer(name, dim)
+    if name == "hashing":
+        vectorizer.df = np.asarray(state["df"], dtype=np.int64)
+        vectorizer.n_docs = state["n_docs"]
+        return vectorizer
+    vectorizer.vocabulary = state["vocabulary"]
+    vectorizer.vocabulary_ = state["vocabulary"]
+    vectorizer.fixed_vocabulary_ = True
+    vectorizer.idf_ = np.asarray(state["idf"], dtype=np.float64)
+    return vectorizer
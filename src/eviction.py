@@ -0,0 +1,292 @@
+# src/eviction.py
+import math
+import heapq
+import threading
+import numpy as np
+from sqlalchemy import func
+from src.models import MemoryFact
+from src.active_counts import GLOBAL, get_active_counts
+from src.access_stats import get_access_stats
+from src.fact_cache import get_fact_cache
+from src.background import BackgroundRunner
+from src.config import (ACTIVE_MEMORY_LIMIT, ACTIVE_MEMORY_LIMIT_PER_USER, ACTIVE_MEMORY_USER_LIMITS,
+                        EVICTION_BATCH_SIZE, EVICTION_POLICY, EVICTION_FAIR_SHARE, RECENCY_HALF_LIFE)
+
+
+# --- policies: lower score = evicted first ---
+
+class LRUPolicy:
+    """Least recently accessed first; served straight from the partial index."""
+    name = "lru"
+    order_by = (MemoryFact.last_accessed_turn.asc(), MemoryFact.id.asc())
+
+    def record(self, user_id, key):
+        pass
+
+    def score(self, mem, now):
+        return (mem.last_accessed_turn or 0, mem.id)
+
+
+class LFUPolicy(LRUPolicy):
+    """Fewest accesses first, least recent among equals."""
+    name = "lfu"
+    order_by = None
+
+    def score(self, mem, now):
+        return (mem.access_count or 0, mem.last_accessed_turn or 0, mem.id)
+
+
+class FrequencySketch:
+    """Count-min sketch of (user_id, key) popularity with periodic halving (TinyLFU aging)."""
+
+    def __init__(self, width=1 << 16, depth=4, sample_size=None):
+        self.mask = width - 1
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint16)
+        self.sample_size = sample_size or 10 * width
+        self.additions = 0
+        self.lock = threading.Lock()
+
+    def _slots(self, item):
+        return [hash((i, item)) & self.mask for i in range(self.depth)]
+
+    def add(self, item):
+        slots = self._slots(item)
+        with self.lock:
+            for row, col in enumerate(slots):
+                if self.table[row, col] < 0xFFFF:
+                    self.table[row, col] += 1
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self.table >>= 1
+                self.additions //= 2
+
+    def estimate(self, item):
+        return int(min(self.table[row, col] for row, col in enumerate(self._slots(item))))
+
+
+class TinyLFUPolicy:
+    """TinyLFU: facts whose (user, key) is rarely read or written lose to popular ones.
+
+    Frequency comes from an aged count-min sketch fed by every access and
+    write, so a fresh fact for a key nobody asks about is not admitted over a
+    frequently used one; recency only breaks ties.
+    """
+    name = "tinylfu"
+    order_by = None
+
+    def __init__(self):
+        self.sketch = FrequencySketch()
+
+    def record(self, user_id, key):
+        self.sketch.add((user_id, key))
+
+    def score(self, mem, now):
+        return (self.sketch.estimate((mem.user_id, mem.key)), mem.last_accessed_turn or 0, mem.id)
+
+
+class DecayedUtilityPolicy:
+    """Expected usefulness per stored byte.
+
+    Blends confidence, log access count, a half-life decay on the last access
+    and a bonus for facts that revised an earlier value (root_id chain), then
+    divides by value size so long low-value rows go before short useful ones.
+    """
+    name = "utility"
+    order_by = None
+
+    def record(self, user_id, key):
+        pass
+
+    def score(self, mem, now):
+        try:
+            age = max(0, now - (mem.last_accessed_turn or mem.origin_turn or now))
+        except TypeError:
+            age = 0
+        recency = math.exp(-math.log(2) * age / RECENCY_HALF_LIFE)
+        freq = min(1.0, math.log1p(mem.access_count or 0) / math.log1p(16))
+        revised = 1.0 if mem.root_id and mem.root_id != mem.id else 0.0
+        utility = 0.35 * (mem.confidence or 0.5) + 0.25 * freq + 0.30 * recency + 0.10 * revised
+        return (utility / (1.0 + len(mem.value or "") / 512.0), mem.id)
+
+
+POLICIES = {p.name: p for p in (LRUPolicy, LFUPolicy, TinyLFUPolicy, DecayedUtilityPolicy)}
+
+
+def make_policy(name: str):
+    if name not in POLICIES:
+        raise ValueError(f"unknown eviction policy: {name!r} (expected one of {list(POLICIES)})")
+    return POLICIES[name]()
+
+
+_policy = None
+
+def get_eviction_policy():
+    global _policy
+    if _policy is None:
+        _policy = make_policy(EVICTION_POLICY)
+    return _policy
+
+
+def limit_for(scope: str):
+    """Active-fact cap for a scope (GLOBAL or a user_id); 0 means uncapped."""
+    if scope == GLOBAL:
+        return ACTIVE_MEMORY_LIMIT
+    return ACTIVE_MEMORY_USER_LIMITS.get(scope, ACTIVE_MEMORY_LIMIT_PER_USER)
+
+
+def over_limit(db, user_id: str, counts=None):
+    """Scopes whose tracked active count is above their cap (no DB query once counts are loaded)."""
+    counts = counts or get_active_counts()
+    scopes = []
+    for scope in (GLOBAL, user_id):
+        if scope is None:
+            continue
+        limit = limit_for(scope)
+        if limit and counts.get(db, scope) > limit:
+            scopes.append(scope)
+    return scopes
+
+
+def fair_shares(per_user, excess):
+    """Water-fill `excess` evictions over {user_id: active}: the largest users shrink first,
+    toward a common level, so one chatty user cannot push out everyone else's facts."""
+    if excess <= 0 or not per_user:
+        return {}
+    lo, hi = 0, max(per_user.values())
+    # highest level L that still frees enough rows
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sum(max(0, c - mid) for c in per_user.values()) >= excess:
+            lo = mid
+        else:
+            hi = mid - 1
+    take = {u: c - lo for u, c in per_user.items() if c > lo}
+    surplus = sum(take.values()) - excess
+    # rows above `excess` come back from the smallest of the trimmed users
+    for u in sorted(take, key=per_user.get):
+        if surplus <= 0:
+            break
+        give = min(surplus, take[u])
+        take[u] -= give
+        surplus -= give
+    return {u: n for u, n in take.items() if n > 0}
+
+
+def _candidates(db, user_id=None):
+    q = db.query(MemoryFact).filter(MemoryFact.is_active == True)
+    if user_id is not None:
+        q = q.filter(MemoryFact.user_id == user_id)
+    return q
+
+
+def select_victims(db, user_id, n, policy, now):
+    """The n lowest-scoring facts of one user (or of everyone if user_id is None)."""
+    q = _candidates(db, user_id)
+    if policy.order_by is not None:
+        return q.order_by(*policy.order_by).limit(n).all()
+    # bounded heap over a streamed scan instead of sorting every row
+    return heapq.nsmallest(n, q.yield_per(1000), key=lambda m: policy.score(m, now))
+
+
+def evict(db, vector_store, scope: str, stats=None, cache=None, counts=None, policy=None,
+          batch_size=EVICTION_BATCH_SIZE):
+    """Deactivate the lowest-value facts of `scope` down to its cap, in batches."""
+    stats = stats or get_access_stats()
+    cache = cache or get_fact_cache()
+    counts = counts or get_active_counts()
+    policy = policy or get_eviction_policy()
+    limit = limit_for(scope)
+    if not limit:
+        return 0
+    q = db.query(MemoryFact).filter(MemoryFact.is_active == True)
+    if scope != GLOBAL:
+        q = q.filter(MemoryFact.user_id == scope)
+    # exact recount: the tracked count only decides whether to get here
+    actual = q.with_entities(func.count(MemoryFact.id)).scalar()
+    counts.correct(db, scope, actual)
+    db.commit()
+    excess = actual - limit
+    if excess <= 0:
+        return 0
+    # policies read last_accessed_turn / access_count, so buffered access stats must land first
+    stats.flush(db)
+    now = q.with_entities(func.max(MemoryFact.last_accessed_turn)).scalar() or 0
+    if scope != GLOBAL:
+        plan = {scope: excess}
+    elif EVICTION_FAIR_SHARE:
+        per_user = dict(_candidates(db).with_entities(MemoryFact.user_id, func.count(MemoryFact.id))
+                        .group_by(MemoryFact.user_id).all())
+        plan = fair_shares(per_user, excess)
+    else:
+        plan = {None: excess}
+    victims = []
+    for user_id, n in plan.items():
+        victims.extend(select_victims(db, user_id, n, policy, now))
+
+    evicted = 0
+    for i in range(0, len(victims), batch_size):
+        by_user = {}
+        for v in victims[i:i + batch_size]:
+            v.is_active = False
+            db.add(v)
+            by_user.setdefault(v.user_id, []).append(v.id)
+        counts.adjust(db, {u: -len(ids) for u, ids in by_user.items()})
+        db.commit()
+        # keep the vector index and the fact cache in step with is_active; index first,
+        # since cache.apply moves the user's memory version on (see HotFactCache.version)
+        for user_id, ids in by_user.items():
+            try:
+                vector_store.remove_memories(ids, user_id=user_id)
+            except Exception:
+                pass
+            cache.apply(user_id, removed=ids)
+            evicted += len(ids)
+    return evicted
+
+
+class EvictionWorker:
+    """Runs evict() off the request path.
+
+    Writers call request() with the scopes over their cap; a daemon thread
+    coalesces them and evicts with its own session, one batch per transaction.
+    """
+
+    def __init__(self, vector_store, session_factory=None, batch_size=EVICTION_BATCH_SIZE):
+        self.vector_store = vector_store
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.runs = 0
+        self.evicted = 0
+        self._runner = BackgroundRunner(self.drain)
+
+    def request(self, scopes):
+        with self.lock:
+            self.pending.update(scopes)
+        self._runner.wake()
+
+    def drain(self):
+        """Evict everything requested so far, on the calling thread."""
+        with self.lock:
+            scopes, self.pending = self.pending, set()
+        if not scopes:
+            return 0
+        if self.session_factory is None:
+            from src.database import get_session
+            self.session_factory = get_session
+        db = self.session_factory()
+        try:
+            # global first: it may bring users back under their own caps
+            n = 0
+            for scope in sorted(scopes, key=lambda s: s != GLOBAL):
+                n += evict(db, self.vector_store, scope, batch_size=self.batch_size)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.runs += 1
+        self.evicted += n
+        return n
@@ -1,100 +1,157 @@
 # src/extractor.py
-import re
-from datetime import datetime
+import time
+import threading
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from src.rule_packs import AhoCorasick, get_rule_packs
+from src.config import EXTRACT_POOL_MIN_BATCH, EXTRACT_POOL_CHUNK
+
+
+# the only non-ASCII letters re.I matches against ASCII ones (U+0130, U+0131, U+017F, U+212A);
+# folded before the trigger scan so a trigger is found wherever a case-insensitive pattern could match
+_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+class Extractor:
+    """One key's rule: `fn(text, tl)` gives a value or None.
+
+    `triggers` are lowercase substrings at least one of which every match
+    contains; messages with none of them skip the rule. None means always run.
+    """
+    __slots__ = ("key", "fn", "confidence", "triggers", "calls", "hits", "ns", "since")
+
+    def __init__(self, key, fn, confidence, triggers=None, since=0):
+        self.key = key
+        self.fn = fn
+        self.confidence = confidence
+        self.triggers = tuple(triggers) if triggers else None
+        self.calls = self.hits = self.ns = 0
+        self.since = since              # engine message count when the rule was added
+
+
+class ExtractionEngine:
+    """Registry of extractors run over a message in registration order.
+
+    One Aho-Corasick pass over the lowercased message finds which rules can
+    match at all (trigger words), at a cost that does not grow with the number
+    of rules; only those run their precompiled patterns. Per-rule calls,
+    hits, skips and time are kept for stats(). Rules usually come from the
+    rule packs (src/rule_packs.py).
+    """
+
+    def __init__(self, extractors=()):
+        self.lock = threading.Lock()
+        self.extractors = []
+        self.messages = 0
+        self._plan = ([], None, 0)      # (rules, trigger automaton, always-run mask), swapped whole
+        self.load(extractors)
+
+    def load(self, extractors):
+        """Replace every rule at once (rule-pack reload); counters carry over by key."""
+        with self.lock:
+            old = {r.key: r for r in self.extractors}
+            rules = []
+            for spec in extractors:
+                rule = Extractor(*spec, since=self.messages)
+                prev = old.get(rule.key)
+                if prev is not None:
+                    rule.calls, rule.hits, rule.ns, rule.since = prev.calls, prev.hits, prev.ns, prev.since
+                rules.append(rule)
+            self._rebuild(rules)
+
+    def register(self, key, fn, confidence, triggers=None):
+        """Add a rule (or replace the one for `key`) and rebuild the trigger scanner."""
+        with self.lock:
+            rule = Extractor(key, fn, confidence, triggers, since=self.messages)
+            rules = [r for r in self.extractors if r.key != key]
+            pos = next((i for i, r in enumerate(self.extractors) if r.key == key), len(rules))
+            rules.insert(pos, rule)
+            self._rebuild(rules)
+
+    def unregister(self, key):
+        with self.lock:
+            self._rebuild([r for r in self.extractors if r.key != key])
+
+    def _rebuild(self, rules):
+        masks, always = {}, 0           # trigger -> bitmask of rule indexes
+        for i, r in enumerate(rules):
+            if r.triggers is None:
+                always |= 1 << i
+            for t in r.triggers or ():
+                masks[t] = masks.get(t, 0) | (1 << i)
+        scanner = AhoCorasick(masks, values=masks.values()) if masks else None
+        self.extractors = rules
+        self._plan = (rules, scanner, always)
+
+    def extract(self, text: str) -> List[Tuple[str, str, float]]:
+        rules, scanner, live = self._plan
+        tl = text.lower()
+        if scanner is not None:
+            live |= scanner.find(tl if text.isascii() else text.translate(_FOLD).lower())
+        out = []
+        # only the live rules, in registration order: cost follows matches, not rule count
+        while live:
+            low = live & -live
+            live ^= low
+            rule = rules[low.bit_length() - 1]
+            t0 = time.perf_counter_ns()
+            value = rule.fn(text, tl)
+            rule.ns += time.perf_counter_ns() - t0
+            rule.calls += 1
+            if value:
+                rule.hits += 1
+                out.append((rule.key, value, rule.confidence))
+        self.messages += 1
+        return out
+
+    def extract_batch(self, texts, processes: int = 0):
+        """extract() over a list; large lists go to a process pool when `processes` > 0
+        (worker-side counters stay in the workers)."""
+        texts = list(texts)
+        if processes and len(texts) >= EXTRACT_POOL_MIN_BATCH:
+            chunks = [texts[i:i + EXTRACT_POOL_CHUNK] for i in range(0, len(texts), EXTRACT_POOL_CHUNK)]
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                return [out for part in pool.map(_extract_chunk, chunks) for out in part]
+        return [self.extract(t) for t in texts]
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "extractors": {
+                r.key: {
+                    "calls": r.calls,
+                    "hits": r.hits,
+                    "skipped": self.messages - r.since - r.calls,
+                    "total_ms": round(r.ns / 1e6, 3),
+                    "avg_us": round(r.ns / r.calls / 1e3, 2) if r.calls else 0.0
+                } for r in self.extractors
+            }
+        }
+
+    def reset_stats(self):
+        self.messages = 0
+        for r in self.extractors:
+            r.calls = r.hits = r.ns = r.since = 0
+
+
+_default = None
+
+def get_extraction_engine():
+    global _default
+    if _default is None:
+        packs = get_rule_packs()
+        engine = ExtractionEngine(packs.current().extractors.values())
+        packs.on_reload(lambda rules: engine.load(rules.extractors.values()))
+        _default = engine
+    return _default
+
+def _extract_chunk(texts):
+    return [get_extraction_engine().extract(t) for t in texts]
 
-MONTHS = "|".join(["January","February","March","April","May","June","July","August","September","October","November","December"])
-STOP_NAMES = {"incorrect", "wrong", "false", "unknown", "error", "test"}
-
-def _extract_language(text: str):
-    m = re.search(r'(preferred language is|from now on,? please use|speak in|speak)\s+([A-Za-z]+)', text, re.I)
-    return m.group(2).strip().capitalize() if m else None
-
-def _extract_name(text: str):
-    m = re.search(r'\b(Mr|Ms|Mrs|Dr)\.?\s+([A-Z][a-z]+)\b', text)
-    if m and m.group(2).lower() not in STOP_NAMES:
-        return m.group(2)
-    m = re.search(r'\b(my name is|i am|this is)\s+([A-Z][a-z]+)\b', text, re.I)
-    if m and m.group(2).lower() not in STOP_NAMES:
-        return m.group(2)
-    return None
-
-def _extract_amount(text: str):
-    m = re.search(r'\$\s?([0-9]+(?:\.[0-9]{1,2})?)', text)
-    if m:
-        return f"${m.group(1)}"
-    m = re.search(r'([0-9]+(?:\.[0-9]{1,2})?)\s?(dollars|usd|inr|rs|rupees)', text, re.I)
-    if m:
-        return f"${m.group(1)}"
-    return None
-
-def _extract_due_date(text: str):
-    m = re.search(r'\b(' + MONTHS + r')\s+(\d{1,2})(?:st|nd|rd|th)?\b', text, re.I)
-    if m:
-        return f"{m.group(1).capitalize()} {int(m.group(2))}"
-    m = re.search(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+(of\s+)?(' + MONTHS + r')\b', text, re.I)
-    if m:
-        return f"{m.group(3).capitalize()} {int(m.group(1))}"
-    m = re.search(r'\b(\d{4}-\d{2}-\d{2})\b', text)
-    if m:
-        try:
-            d = datetime.fromisoformat(m.group(1))
-            return d.strftime("%B %d")
-        except:
-            return m.group(1)
-    return None
-
-def _extract_payment_status(text: str):
-    tl = text.lower()
-    if "already paid" in tl or "i paid" in tl or "payment processed" in tl:
-        return "paid"
-    if "dispute" in tl or "incorrect charge" in tl or "don't recognize" in tl:
-        return "disputed"
-    if "extension" in tl or "more time" in tl or "pay next week" in tl:
-        return "extension_requested"
-    return None
-
-def _extract_call_time(text: str):
-    m = re.search(r'(call me|call)\s+(after|at)?\s*(\d{1,2})(:\d{2})?\s*(am|pm)?', text, re.I)
-    if m:
-        hour = m.group(3)
-        ampm = m.group(5) or ''
-        return f"{hour}{ampm}".upper()
-    return None
-
-def _extract_account_info(text: str):
-    m = re.search(r'account (?:ending in|no|number)[\s]*(\d{2,4})', text, re.I)
-    if m:
-        return f"account ending in {m.group(1)}"
-    return None
 
 def extract_memory_candidates(text: str, turn_id: int) -> List[Tuple[str, str, float]]:
-    out = []
-    lang = _extract_language(text)
-    if lang:
-        out.append(("language", lang, 0.98))
-    name = _extract_name(text)
-    if name:
-        out.append(("customer_name", name, 0.95))
-    amt = _extract_amount(text)
-    if amt:
-        out.append(("amount_due", amt, 0.97))
-    due = _extract_due_date(text)
-    if due:
-        out.append(("due_date", due, 0.90))
-    status = _extract_payment_status(text)
-    if status:
-        out.append(("payment_status", status, 0.95))
-    ctime = _extract_call_time(text)
-    if ctime:
-        out.append(("call_time", ctime, 0.90))
-    acct = _extract_account_info(text)
-    if acct:
-        out.append(("account_info", acct, 0.85))
-    email = re.search(r'(\w+@\w+\.\w+)', text)
-    if email:
-        out.append(("email", email.group(1), 0.88))
-    pref = re.search(r'\b(i like|i prefer|i love)\s+([a-zA-Z\s]{2,30})', text, re.I)
-    if pref:
-        out.append(("preference", pref.group(2).strip(), 0.70))
-    return out
\ No newline at end of file
+    return get_extraction_engine().extract(text)
+
+def extract_batch(texts, processes: int = 0):
+    """Candidates for each message in `texts`, same tuples as extract_memory_candidates."""
+    return get_extraction_engine().extract_batch(texts, processes)
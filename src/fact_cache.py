@@ -0,0 +1,255 @@
+# src/fact_cache.py
+import re
+import time
+import threading
+from collections import OrderedDict
+from src.models import MemoryFact
+from src.fuzzy_keys import KeyVocabulary
+from src.config import FACT_CACHE_MAX_USERS, FACT_CACHE_MAX_FACTS, FACT_CACHE_TTL
+
+_COLUMNS = tuple(c.name for c in MemoryFact.__table__.columns)
+
+
+class FactSnapshot:
+    """Detached, plain-attribute copy of a MemoryFact row (same fields, same to_dict)."""
+    __slots__ = _COLUMNS
+
+    to_dict = MemoryFact.to_dict
+
+    @classmethod
+    def from_row(cls, row):
+        snap = cls()
+        for name in _COLUMNS:
+            setattr(snap, name, getattr(row, name))
+        return snap
+
+    @classmethod
+    def from_mapping(cls, values):
+        snap = cls()
+        for name in _COLUMNS:
+            setattr(snap, name, values.get(name))
+        return snap
+
+
+def _like_pattern(ql: str):
+    # case-insensitive LIKE '%ql%' semantics: '%' and '_' in the query stay wildcards
+    body = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in ql)
+    return re.compile(body, re.S)
+
+def _recency_order(m):
+    # ORDER BY last_accessed_turn DESC (NULLs last), id ASC
+    return (m.last_accessed_turn is None, -(m.last_accessed_turn or 0), m.id)
+
+def most_recent(found):
+    # cached rows are touched in place, so recency order is decided at lookup time
+    if len(found) > 1:
+        try:
+            found = sorted(found, key=_recency_order)
+        except TypeError:
+            pass
+    return found[0] if found else None
+
+def _set_access(mem, turn_id, count):
+    # snapshots only: the buffer owns the DB write
+    mem.last_accessed_turn = turn_id
+    mem.access_count = count
+
+
+class UserFacts:
+    """A user's active facts, loaded with one query and shared by every retrieval tier."""
+
+    def __init__(self, rows):
+        # rows arrive newest-access first, so the first row seen per key is the latest
+        self.rows = rows
+        self.by_key = {}
+        self.by_id = {}
+        first_id = {}
+        for m in rows:
+            self.by_key.setdefault(m.key, m)
+            self.by_id[m.id] = m
+            first_id[m.key] = min(m.id, first_id.get(m.key, m.id))
+        # DISTINCT order of the old per-tier query (first row by id), kept for fuzzy tie-breaks
+        self.keys = sorted(first_id, key=first_id.get)
+        self._vocabulary = None
+
+    @classmethod
+    def load(cls, db, user_id: str, stats=None):
+        rows = (db.query(MemoryFact)
+                .filter(MemoryFact.user_id == user_id, MemoryFact.is_active == True)
+                .order_by(MemoryFact.last_accessed_turn.desc(), MemoryFact.id.asc())
+                .populate_existing()
+                .all())
+        rows = [FactSnapshot.from_row(m) for m in rows]
+        # overlay access stats that are still waiting in the write-behind buffer
+        pending = stats.snapshot() if stats is not None else {}
+        overlaid = False
+        for m in rows:
+            hit = pending.get(m.id)
+            if hit:
+                _set_access(m, hit[0], (m.access_count or 0) + hit[1])
+                overlaid = True
+        if overlaid:
+            try:
+                rows.sort(key=_recency_order)
+            except TypeError:
+                pass
+        return cls(rows)
+
+    @property
+    def vocabulary(self):
+        # built on first fuzzy lookup; a write replaces the whole view, so it never goes stale
+        if self._vocabulary is None:
+            self._vocabulary = KeyVocabulary(self.keys)
+        return self._vocabulary
+
+    def latest(self, key: str):
+        return self.by_key.get(key)
+
+    def keys_like(self, ql: str):
+        pattern = _like_pattern(ql)
+        return [m for m in self.rows if pattern.search(m.key.lower())]
+
+    def first_key_like(self, ql: str):
+        return most_recent(self.keys_like(ql))
+
+    def replaced(self, added=(), removed=()):
+        """New view with `added` rows (newest first) in front and `removed` ids dropped."""
+        drop = set(removed) | {m.id for m in added}
+        view = UserFacts(list(added) + [m for m in self.rows if m.id not in drop])
+        if self._vocabulary is not None and view.keys == self.keys:
+            view._vocabulary = self._vocabulary     # same key set and order: nothing to rebuild
+        return view
+
+
+class HotFactCache:
+    """In-process LRU/TTL cache of each user's active facts.
+
+    One entry holds a user's whole UserFacts view, so `(user_id, key)` lookups
+    are dict hits on `UserFacts.by_key`. Writers that go through MemoryEngine
+    update cached views in place (write-through); the TTL bounds staleness
+    from writes made by anything else (other processes, raw SQL).
+    Bounded by number of users and by total cached facts.
+
+    version(user_id) is the user's memory version: it moves on with every
+    write-through (add, supersede, evict), invalidation and TTL expiry, so
+    anything derived from a user's facts can be cached under it.
+    """
+
+    def __init__(self, max_users=FACT_CACHE_MAX_USERS, max_facts=FACT_CACHE_MAX_FACTS, ttl=FACT_CACHE_TTL):
+        self.max_users = max_users
+        self.max_facts = max_facts
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.users = OrderedDict()     # user_id -> [UserFacts, loaded_at]
+        self.versions = {}             # user_id -> memory version; also guards fills racing a write
+        self.n_facts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def peek(self, user_id: str):
+        """Cached view for user_id, or None (never loads)."""
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                self._drop(user_id)
+                self.expirations += 1
+                # the reload may see writes that bypassed the engine
+                self.versions[user_id] = self.versions.get(user_id, 0) + 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.users.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def version(self, user_id: str) -> int:
+        return self.versions.get(user_id, 0)
+
+    def get_or_load(self, db, user_id: str, stats=None):
+        facts = self.peek(user_id)
+        if facts is not None:
+            return facts
+        with self.lock:
+            version = self.versions.get(user_id, 0)
+        facts = UserFacts.load(db, user_id, stats)
+        with self.lock:
+            # listed even if never written, so clear() moves its version on too
+            self.versions.setdefault(user_id, 0)
+            # a write landed while we were loading: serve this view once, don't cache it
+            if self.versions[user_id] == version and user_id not in self.users:
+                self.users[user_id] = [facts, time.monotonic()]
+                self.n_facts += len(facts.rows)
+                self._shrink()
+        return facts
+
+    def apply(self, user_id: str, added=(), removed=()):
+        """Write-through: put committed rows into the cached view and drop removed ids."""
+        added = [m if isinstance(m, FactSnapshot) else FactSnapshot.from_row(m) for m in added]
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            entry = self.users.get(user_id)
+            if entry is None:
+                return
+            old = entry[0]
+            entry[0] = old.replaced(added, removed)
+            self.n_facts += len(entry[0].rows) - len(old.rows)
+            self._shrink()
+
+    def touch(self, user_id: str, mem_id: int, turn_id: int):
+        """Mirror a committed last_accessed_turn update into the cached view."""
+        with self.lock:
+            entry = self.users.get(user_id)
+            mem = entry[0].by_id.get(mem_id) if entry is not None else None
+            if mem is not None:
+                mem.last_accessed_turn = turn_id
+
+    def invalidate(self, user_id: str):
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            if user_id in self.users:
+                self._drop(user_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            for user_id in self.versions:
+                self.versions[user_id] += 1
+            self.users.clear()
+            self.n_facts = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self.users),
+                "facts": self.n_facts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _drop(self, user_id):
+        facts, _ = self.users.pop(user_id)
+        self.n_facts -= len(facts.rows)
+
+    def _shrink(self):
+        # keep the most recently used entry even if it alone exceeds max_facts
+        while len(self.users) > 1 and (len(self.users) > self.max_users or self.n_facts > self.max_facts):
+            self._drop(next(iter(self.users)))
+            self.evictions += 1
+
+
+_default = None
+
+def get_fact_cache():
+    global _default
+    if _default is None:
+        _default = HotFactCache()
+    return _default
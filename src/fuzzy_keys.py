@@ -0,0 +1,70 @@
+# src/fuzzy_keys.py
+import numpy as np
+from rapidfuzz import fuzz, process
+from src.config import FUZZY_THRESHOLD, FUZZY_TOP_KEYS, FUZZY_PREFILTER_MIN_KEYS
+
+# rapidfuzz scores are 0..100; a hair under the cutoff so the exact `score / 100 >= threshold`
+# test below decides the boundary, as the per-key loop did
+_EPS = 1e-6
+
+
+class KeyVocabulary:
+    """A user's distinct keys, lowercased once, scored against a query in one rapidfuzz call.
+
+    Lives on the cached UserFacts view, so it is rebuilt with the view whenever
+    the user's keys change (write-through adds, supersedes, evictions) and
+    costs nothing per query. Keys keep the view's order, which breaks score ties.
+
+    Large vocabularies are prefiltered with a character-count bound: an
+    alignment can match at most `ov` characters, the multiset overlap of key
+    and query, so partial_ratio <= 200 * ov / (min(len) + ov). Keys below the
+    cutoff on that bound are never scored; the result is unchanged.
+    """
+    __slots__ = ("keys", "lowered", "alphabet", "counts", "lengths")
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.lowered = [k.lower() for k in self.keys]
+        self.alphabet = None
+        if len(self.keys) >= FUZZY_PREFILTER_MIN_KEYS:
+            # characters outside the keys' alphabet can't be matched, so they are not counted
+            self.alphabet = sorted(set("".join(self.lowered)))
+            self.counts = np.array([[k.count(ch) for ch in self.alphabet] for k in self.lowered], dtype=np.int32)
+            self.lengths = np.array([len(k) for k in self.lowered], dtype=np.int32)
+
+    def _candidates(self, ql: str, cutoff: float):
+        q = np.array([ql.count(ch) for ch in self.alphabet], dtype=np.int32)
+        ov = np.minimum(self.counts, q).sum(axis=1)
+        return np.flatnonzero(200.0 * ov >= cutoff * (np.minimum(self.lengths, len(ql)) + ov))
+
+    def match(self, ql: str, limit: int = FUZZY_TOP_KEYS, threshold: float = FUZZY_THRESHOLD):
+        """[(key, similarity 0..1)] for the best `limit` keys at or above threshold, best first."""
+        if not self.keys:
+            return []
+        cutoff = threshold * 100.0 - _EPS
+        cols = None
+        if self.alphabet is not None:
+            cols = self._candidates(ql, cutoff)
+            if not len(cols):
+                return []
+        choices = self.lowered if cols is None else [self.lowered[i] for i in cols]
+        hits = process.extract(ql, choices, scorer=fuzz.partial_ratio, score_cutoff=cutoff, limit=limit)
+        # extract orders by score, then choice index (choices are in key order)
+        return [(self.keys[i if cols is None else cols[i]], s / 100.0) for _, s, i in hits if s / 100.0 >= threshold]
+
+    def match_many(self, queries, limit: int = FUZZY_TOP_KEYS, threshold: float = FUZZY_THRESHOLD):
+        """match() for several lowercased queries; one queries x keys cdist when there is no prefilter."""
+        queries = list(queries)
+        if not self.keys or not queries:
+            return [[] for _ in queries]
+        if self.alphabet is not None:
+            # each query scores only its own candidates, which one shared matrix would not
+            return [self.match(q, limit, threshold) for q in queries]
+        scores = process.cdist(queries, self.lowered, scorer=fuzz.partial_ratio,
+                               score_cutoff=threshold * 100.0 - _EPS, dtype=np.float64) / 100.0
+        out = []
+        for row in scores:
+            idx = np.flatnonzero(row >= threshold)
+            idx = idx[np.argsort(-row[idx], kind="stable")][:limit]
+            out.append([(self.keys[i], float(row[i])) for i in idx])
+        return out
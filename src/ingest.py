@@ -0,0 +1,219 @@
+# src/ingest.py
+import time
+import queue
+import threading
+import traceback
+from collections import Counter, deque
+from src.memory_engine import MemoryEngine
+from src.config import (INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE, INGEST_SUBMIT_TIMEOUT,
+                        INGEST_READ_BARRIER_TIMEOUT, INGEST_RETRIES, INGEST_RETRY_BACKOFF,
+                        INGEST_DEAD_LETTER_SIZE)
+
+
+class PendingFact:
+    """A fact extracted this turn that the ingestion queue has not written yet."""
+    __slots__ = ("id", "user_id", "key", "value", "confidence", "origin_turn", "last_accessed_turn")
+
+    def __init__(self, user_id, key, value, confidence, turn_id):
+        self.id = None
+        self.user_id = user_id
+        self.key = key
+        self.value = value
+        self.confidence = confidence
+        self.origin_turn = turn_id
+        self.last_accessed_turn = turn_id
+
+    def to_dict(self):
+        return {
+            "memory_id": "pending",
+            "content": f"{self.key}: {self.value}",
+            "origin_turn": self.origin_turn,
+            "last_used_turn": self.last_accessed_turn,
+            "confidence": self.confidence
+        }
+
+
+def overlay_pending(retrieved, pending, k):
+    """This turn's extracted facts go first and shadow stored facts with the same key."""
+    if not pending:
+        return retrieved
+    keys = {p.key for p in pending}
+    # a repeat of a stored value keeps the stored row (and its id)
+    stored = {(r["memory"].key, r["memory"].value): r["memory"] for r in retrieved}
+    merged = [{"memory": stored.get((p.key, p.value), p), "score": 100.0} for p in pending]
+    merged += [r for r in retrieved if r["memory"].key not in keys]
+    return merged[:max(k, len(pending))]
+
+
+class IngestionQueue:
+    """Bounded write queue between /chat and the database.
+
+    Each message's extracted candidates are queued and applied by worker
+    threads, up to `batch_size` messages per transaction. Users are pinned to
+    one worker so their writes stay ordered. submit() blocks up to `timeout`
+    when that worker's queue is full (backpressure) and then raises queue.Full.
+    wait_for_user() is the read barrier: a user's next retrieval waits until
+    their earlier writes have landed.
+
+    /chat has already answered with a message's facts by the time they are
+    written, so a failed batch is not dropped: its messages are retried one
+    by one (`retries` times, with backoff), and any that still fail go to
+    `dead_letters` and are counted as lost in stats().
+    """
+
+    def __init__(self, vector_store, evictor=None, session_factory=None, workers=INGEST_WORKERS,
+                 maxsize=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE, retries=INGEST_RETRIES,
+                 backoff=INGEST_RETRY_BACKOFF, dead_letter_size=INGEST_DEAD_LETTER_SIZE):
+        self.vector_store = vector_store
+        self.evictor = evictor
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.dead_letters = deque(maxlen=dead_letter_size)   # (user_id, turn_id, candidates, error)
+        self.queues = [queue.Queue(maxsize=max(1, maxsize // workers)) for _ in range(workers)]
+        self.cond = threading.Condition()
+        self.in_flight = Counter()        # user_id -> queued or running messages
+        self.enqueued = 0
+        self.processed = 0
+        self.batches = 0
+        self.errors = 0
+        self.retried = 0
+        self.lost = 0
+        self.lost_facts = 0
+        self.rejected = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._run, args=(self.queues[i],), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _queue_for(self, user_id):
+        return self.queues[hash(user_id) % len(self.queues)]
+
+    def _enqueue(self, user_id, turn_id, candidates, block, timeout=None):
+        item = (user_id, turn_id, list(candidates), time.monotonic())
+        with self.cond:
+            self.in_flight[user_id] += 1
+        try:
+            self._queue_for(user_id).put(item, block=block, timeout=timeout)
+        except queue.Full:
+            self._done(user_id)
+            return False
+        self.enqueued += 1
+        return True
+
+    def submit(self, user_id: str, turn_id: int, candidates, timeout=INGEST_SUBMIT_TIMEOUT):
+        if candidates and not self._enqueue(user_id, turn_id, candidates, True, timeout):
+            self.rejected += 1
+            raise queue.Full
+
+    def try_submit(self, user_id: str, turn_id: int, candidates):
+        """Non-blocking submit for the event loop; False if the caller has to wait."""
+        return not candidates or self._enqueue(user_id, turn_id, candidates, False)
+
+    def wait_for_user(self, user_id: str, timeout=INGEST_READ_BARRIER_TIMEOUT):
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.in_flight[user_id], timeout)
+
+    def drain(self, timeout=None):
+        """Block until everything queued so far is written."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.in_flight, timeout)
+
+    def stats(self):
+        now = time.monotonic()
+        oldest = None
+        for q in self.queues:
+            with q.mutex:
+                if q.queue:
+                    t = q.queue[0][3]
+                    oldest = t if oldest is None else min(oldest, t)
+        return {
+            "depth": sum(q.qsize() for q in self.queues),
+            "capacity": sum(q.maxsize for q in self.queues),
+            "workers": len(self.queues),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "retried": self.retried,
+            "lost": self.lost,
+            "lost_facts": self.lost_facts,
+            "dead_letters": len(self.dead_letters),
+            "rejected": self.rejected,
+            "oldest_wait_ms": round((now - oldest) * 1000.0, 2) if oldest is not None else 0.0,
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2)
+        }
+
+    def _done(self, user_id, n=1):
+        with self.cond:
+            self.in_flight[user_id] -= n
+            if self.in_flight[user_id] <= 0:
+                del self.in_flight[user_id]
+            self.cond.notify_all()
+
+    def _run(self, q):
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception:
+                self.errors += 1
+                traceback.print_exc()
+                self._retry(batch)
+            finally:
+                now = time.monotonic()
+                for user_id, _turn, _cands, t0 in batch:
+                    lag = (now - t0) * 1000.0
+                    self.last_lag_ms = lag
+                    self.max_lag_ms = max(self.max_lag_ms, lag)
+                    self._done(user_id)
+                    q.task_done()
+                self.processed += len(batch)
+                self.batches += 1
+
+    def _retry(self, batch):
+        # one message per transaction, so one bad record (or a locked DB) costs only itself
+        for item in batch:
+            delay, error = self.backoff, "batch failed"
+            for attempt in range(self.retries):
+                time.sleep(delay)
+                delay *= 2
+                self.retried += 1
+                try:
+                    self._apply([item])
+                    break
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            else:
+                user_id, turn_id, candidates, _t0 = item
+                self.lost += 1
+                self.lost_facts += len(candidates)
+                self.dead_letters.append((user_id, turn_id, candidates, error))
+                print(f"ingest: dropped turn {turn_id} of {user_id} ({len(candidates)} facts) after {self.retries} retries: {error}")
+
+    def _apply(self, batch):
+        if self.session_factory is None:
+            from src.database import get_session
+            self.session_factory = get_session
+        db = self.session_factory()
+        try:
+            engine = MemoryEngine(db, self.vector_store, evictor=self.evictor)
+            # one transaction for the whole batch; repeats of a known value only mark it used
+            engine.add_memories_bulk([(user_id, key, value, turn_id, confidence, "extracted")
+                                      for user_id, turn_id, candidates, _t0 in batch
+                                      for key, value, confidence in candidates], dedupe=True)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
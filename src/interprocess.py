@@ -0,0 +1,95 @@
+# src/interprocess.py
+import os
+import mmap
+import struct
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; shared mode needs it
+    fcntl = None
+
+
+class SharedGeneration:
+    """Generation counter shared by every process that opens the same file.
+
+    The 8-byte counter is memory-mapped, so checking it is a plain memory read
+    with no system call. The file doubles as the writers' lock: exclusive()
+    and shared() flock a fresh descriptor, so threads of one process exclude
+    each other as well as other processes. Writers bump() while holding
+    exclusive(); readers compare value() with the last value they caught up to.
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("shared vector stores need fcntl (POSIX)")
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def value(self) -> int:
+        return struct.unpack_from("<Q", self._map)[0]
+
+    def bump(self) -> int:
+        # callers hold exclusive()
+        value = self.value() + 1
+        struct.pack_into("<Q", self._map, 0, value)
+        return value
+
+    @contextmanager
+    def _locked(self, op):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, op)
+            yield
+        finally:
+            os.close(fd)     # closing the descriptor releases the lock
+
+    def exclusive(self):
+        return self._locked(fcntl.LOCK_EX)
+
+    def shared(self):
+        return self._locked(fcntl.LOCK_SH)
+
+    def close(self):
+        self._map.close()
+
+
+@contextmanager
+def exclusive(path: str):
+    """Hold an exclusive lock on `path`, waiting for other processes. A no-op without fcntl."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def try_exclusive(path: str):
+    """Yield True while holding an exclusive lock on `path`, or False at once if
+    another process (or thread) holds it. Without fcntl every caller gets True."""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)
@@ -0,0 +1,168 @@
+# src/journal.py
+import os
+import glob
+import pickle
+import threading
+
+
+class Journal:
+    """Append-only log of (seq, payload) records next to a snapshot file.
+
+    The active segment lives at `<base>.journal`. `seal()` renames it to
+    `<base>.journal.<seq>` so a snapshot can be written in the background while
+    new records keep going into a fresh active segment. Records whose seq is
+    already covered by the snapshot are skipped on replay, so a crash between
+    sealing and dropping a segment is harmless. A torn record at the tail (crash
+    mid-write) ends the replay; everything before it is recovered.
+
+    With shared=True other processes may seal or reset the active segment
+    under us (callers serialise appends with a file lock), so the open handle
+    is checked against `<base>.journal` before every append and reopened if
+    the file was moved or removed.
+    """
+
+    def __init__(self, base: str, fsync: bool = False, shared: bool = False):
+        self.base = base
+        self.path = f"{base}.journal"
+        self.fsync = fsync
+        self.shared = shared
+        self.lock = threading.Lock()
+        self._fh = None
+        self._follow = None               # (first seq, end offset, last seq) of the active segment
+
+    def _moved(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._fh.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _handle(self):
+        if self._fh is not None and self.shared and self._moved():
+            self._fh.close()
+            self._fh = None
+        if self._fh is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._fh = open(self.path, "ab")
+        return self._fh
+
+    def append(self, seq: int, payload):
+        with self.lock:
+            fh = self._handle()
+            pickle.dump((seq, payload), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            fh.flush()
+            if self.fsync:
+                os.fsync(fh.fileno())
+
+    def seal(self, seq: int):
+        """Close the active segment under the name of the last seq it holds."""
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.{seq:012d}")
+
+    def sealed_segments(self):
+        return sorted(glob.glob(glob.escape(self.path) + ".*"))
+
+    def drop_sealed(self, upto_seq: int):
+        for seg in self.sealed_segments():
+            try:
+                seg_seq = int(seg.rsplit(".", 1)[1])
+            except ValueError:
+                continue
+            if seg_seq <= upto_seq:
+                os.remove(seg)
+
+    def replay(self, after_seq: int = 0):
+        """Yield (seq, payload) for every durable record newer than after_seq."""
+        for seg in self.sealed_segments() + [self.path]:
+            if not os.path.exists(seg):
+                continue
+            torn_at = None
+            with open(seg, "rb") as f:
+                while True:
+                    good = f.tell()
+                    try:
+                        seq, payload = pickle.load(f)
+                    except EOFError:
+                        break
+                    except Exception:
+                        # torn tail record -> stop at the last complete one
+                        torn_at = good
+                        break
+                    if seq > after_seq:
+                        yield seq, payload
+            if torn_at is not None:
+                # cut the torn bytes so later appends stay readable
+                with open(seg, "r+b") as f:
+                    f.truncate(torn_at)
+                break
+
+    def follow(self, after_seq: int):
+        """replay() for a reader that keeps up: sealed segments ending at or before
+        after_seq are skipped, and the active segment is read on from where the
+        previous call stopped (if it is still the same file: same first record)."""
+        out = []
+        for seg in self.sealed_segments():
+            try:
+                last = int(seg.rsplit(".", 1)[1])
+            except ValueError:
+                continue
+            if last > after_seq:
+                out.extend(self._read(seg, after_seq, 0)[0])
+        if not os.path.exists(self.path):
+            self._follow = None
+            return out
+        start = 0
+        if self._follow is not None and self._follow[2] <= after_seq:
+            start = self._follow
+        records, self._follow = self._read(self.path, after_seq, start)
+        out.extend(records)
+        return out
+
+    def _read(self, seg, after_seq, start):
+        # records newer than after_seq, and where this read stopped
+        records, first, end, last = [], None, 0, 0
+        with open(seg, "rb") as f:
+            if start:
+                try:
+                    first = pickle.load(f)[0]
+                except Exception:
+                    first = None
+                if first == start[0]:
+                    f.seek(start[1])
+                    end, last = start[1], start[2]
+                else:
+                    f.seek(0)
+                    first = None
+            while True:
+                try:
+                    seq, payload = pickle.load(f)
+                except Exception:
+                    # end of file, or a torn tail (which replay() will cut)
+                    break
+                end, last = f.tell(), seq
+                if first is None:
+                    first = seq
+                if seq > after_seq:
+                    records.append((seq, payload))
+        return records, ((first, end, last) if first is not None else None)
+
+    def reset(self):
+        """Drop every segment; used after a full synchronous snapshot."""
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            for seg in self.sealed_segments() + [self.path]:
+                if os.path.exists(seg):
+                    os.remove(seg)
+
+    def close(self):
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
@@ -1,49 +1,53 @@
 # src/memory_engine.py
+import re
 import math
+from sqlalchemy import select, insert, update, bindparam
 from sqlalchemy.orm import Session
-from rapidfuzz import fuzz
 from src.models import MemoryFact
-from src.config import RETRIEVE_K, ACTIVE_MEMORY_LIMIT, FUZZY_THRESHOLD, RECENCY_HALF_LIFE
-from src.utils import recency_weight
-
-# Intent and mapping
-INTENT_MAP = {
-    "call": ["language", "call_time", "timezone"],
-    "remind": ["due_date", "amount_due"],
-    "payment": ["amount_due", "payment_status", "due_date"],
-    "dispute": ["payment_status", "account_info"]
-}
-
-QUERY_TO_KEY_MAP = {
-    "language": "language",
-    "preferred language": "language",
-    "name": "customer_name",
-    "customer": "customer_name",
-    "amount": "amount_due",
-    "amount due": "amount_due",
-    "due": "due_date",
-    "due date": "due_date",
-    "payment": "payment_status",
-    "dispute": "payment_status",
-    "call": "call_time",
-    "account": "account_info",
-    "email": "email",
-    "preference": "preference"
-}
-
-def _query_to_key_candidate(ql: str):
-    for phrase, key in QUERY_TO_KEY_MAP.items():
-        if phrase in ql:
-            return key
-    return None
+from src.access_stats import get_access_stats
+from src.fact_cache import UserFacts, FactSnapshot, get_fact_cache, most_recent, _set_access
+from src.active_counts import get_active_counts
+from src.eviction import over_limit, evict, get_eviction_policy
+from src.rule_packs import get_rule_packs
+from src.result_cache import get_retrieval_cache
+from src.config import RETRIEVE_K, RECENCY_HALF_LIFE
+
+_FACTS = MemoryFact.__table__
+_ROW_COLUMNS = tuple(c.name for c in _FACTS.columns)
+# plain DB-API executemany for SQLite: skips SQLAlchemy's per-row parameter processing
+_SQLITE_INSERT = (f"INSERT INTO {_FACTS.name} ({', '.join(_ROW_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(_ROW_COLUMNS))})")
+_INSERT_RETURNING = insert(_FACTS).returning(_FACTS.c.id, sort_by_parameter_order=True)
+_LINK = (update(_FACTS).where(_FACTS.c.id == bindparam("b_id"))
+         .values(root_id=bindparam("b_root"), superseded_by=bindparam("b_next"), is_active=bindparam("b_active")))
+_TOUCH = (update(_FACTS).where(_FACTS.c.id == bindparam("b_id"))
+          .values(last_accessed_turn=bindparam("b_turn")))
+_BULK_FIELDS = ("user_id", "key", "value", "turn_id", "confidence", "category")
+
+_WHAT_IS_MY = re.compile(r"what(?:'s| is)? my\s+(.+?)[\?\.\!]?$")
+_FILLER_WORDS = re.compile(r'\b(please|now|today)\b')
 
 def _words_for_key(key: str):
     return set(key.replace("_", " ").split())
 
+def _plan_valid(plan, facts: UserFacts):
+    # same memory version means same facts; checked anyway, a plan must never name a missing fact
+    ids = plan[1] if plan[0] == "like" else [i for i, _ in plan[1]]
+    return all(i in facts.by_id for i in ids)
+
 class MemoryEngine:
-    def __init__(self, db: Session, vector_store):
+    def __init__(self, db: Session, vector_store, access_stats=None, fact_cache=None, evictor=None):
         self.db = db
         self.vs = vector_store
+        self.stats = access_stats or get_access_stats()
+        self.cache = fact_cache or get_fact_cache()
+        self.results = get_retrieval_cache()
+        self.counts = get_active_counts()
+        self.policy = get_eviction_policy()
+        # query synonyms and intents come from the rule packs (hot-reloadable)
+        self.rules = get_rule_packs()
+        # EvictionWorker for async eviction; without one, eviction runs inline
+        self.evictor = evictor
 
     def add_memory(self, user_id: str, key: str, value: str, turn_id: int,
                    confidence: float = 0.9, category: str = "fact", old_mem=None):
@@ -67,10 +71,13 @@ class MemoryEngine:
             is_active=True
         )
         self.db.add(new)
+        self.counts.adjust(self.db, {user_id: 1})
         self.db.commit()
         self.db.refresh(new)
 
         if old_mem:
+            if old_mem.is_active:
+                self.counts.adjust(self.db, {old_mem.user_id: -1})
             old_mem.is_active = False
             old_mem.superseded_by = new.id
             new.root_id = old_mem.root_id or old_mem.id
@@ -82,29 +89,153 @@ class MemoryEngine:
                 new.root_id = new.id
                 self.db.add(new)
                 self.db.commit()
-
         try:
-            self.vs.add_memory(new.id, f"{new.key}: {new.value}")
+            self.vs.add_memory(new.id, f"{new.key}: {new.value}", user_id=user_id)
+            if old_mem:
+                self.vs.remove_memories([old_mem.id], user_id=user_id)
         except Exception:
             pass
+        # after the index: this moves the user's memory version on
+        self.cache.apply(user_id, added=[new], removed=[old_mem.id] if old_mem else ())
 
-        self._maybe_evict()
+        self.policy.record(user_id, key)
+        self._maybe_evict(user_id)
         return new
 
-    def _maybe_evict(self):
-        active_count = self.db.query(MemoryFact).filter(MemoryFact.is_active == True).count()
-        if active_count <= ACTIVE_MEMORY_LIMIT:
-            return
-        to_remove = active_count - ACTIVE_MEMORY_LIMIT
-        victims = (self.db.query(MemoryFact)
-                   .filter(MemoryFact.is_active == True)
-                   .order_by(MemoryFact.last_accessed_turn.asc())
-                   .limit(to_remove).all())
-        for v in victims:
-            v.is_active = False
-            self.db.add(v)
+    def add_memories_bulk(self, records, dedupe: bool = False):
+        """
+        Insert many facts in one transaction. `records` are dicts (or tuples in
+        _BULK_FIELDS order) with user_id, key, value, turn_id and optional
+        confidence / category, in chronological order. Supersession chains per
+        (user_id, key) are resolved in memory: only the last fact of each chain
+        stays active and only those reach the vector index. With `dedupe`, a
+        record repeating the current value just marks that fact as used.
+        Returns the ids of the inserted rows.
+        """
+        recs = []
+        for r in records:
+            r = dict(zip(_BULK_FIELDS, r)) if not isinstance(r, dict) else r
+            recs.append((r["user_id"], r["key"], r["value"], r["turn_id"],
+                         r.get("confidence", 0.9), r.get("category", "fact")))
+        if not recs:
+            return []
+
+        # current head of every chain the batch touches
+        pairs = {(u, k) for u, k, *_ in recs}
+        users = sorted({u for u, _ in pairs})
+        keys = list({k for _, k in pairs})
+        heads = {}
+        for i in range(0, len(users), 500):
+            rows = self.db.execute(
+                select(_FACTS.c.id, _FACTS.c.user_id, _FACTS.c.key, _FACTS.c.value, _FACTS.c.root_id)
+                .where(_FACTS.c.is_active == True, _FACTS.c.user_id.in_(users[i:i + 500]), _FACTS.c.key.in_(keys))
+                .order_by(_FACTS.c.last_accessed_turn.asc(), _FACTS.c.id.asc()))
+            for row in rows:
+                if (row.user_id, row.key) in pairs:
+                    heads[(row.user_id, row.key)] = ("db", row)    # ascending: the latest wins
+
+        new_rows, prev_of, touched = [], [], {}
+        for user_id, key, value, turn_id, confidence, category in recs:
+            head = heads.get((user_id, key))
+            if dedupe and head is not None:
+                same = head[1].value == value if head[0] == "db" else new_rows[head[1]]["value"] == value
+                if same:
+                    if head[0] == "db":
+                        touched[head[1].id] = (user_id, turn_id)
+                    else:
+                        new_rows[head[1]]["last_accessed_turn"] = turn_id
+                    continue
+            prev_of.append(head)
+            heads[(user_id, key)] = ("new", len(new_rows))
+            new_rows.append({"user_id": user_id, "key": key, "value": value, "category": category,
+                             "origin_turn": turn_id, "last_accessed_turn": turn_id, "access_count": 0,
+                             "confidence": confidence, "is_active": False})
+
+        ids, placed = [], 0
+        if new_rows and self.db.get_bind().dialect.name == "sqlite":
+            # the first insert takes SQLite's write lock, so the ids after it stay free until
+            # commit: the other rows are written once, with their final links
+            ids = [self.db.execute(_INSERT_RETURNING, new_rows[:1]).scalar_one()]
+            ids += range(ids[0] + 1, ids[0] + len(new_rows))
+            placed = 1
+        elif new_rows:
+            ids = [row.id for row in self.db.execute(_INSERT_RETURNING, new_rows)]
+            placed = len(new_rows)
+        final = {idx for kind, idx in heads.values() if kind == "new"}
+        superseded = {}                    # old db id -> (row, id of its successor)
+        for i, head in enumerate(prev_of):
+            row = new_rows[i]
+            row["id"] = ids[i]
+            row["superseded_by"] = None
+            row["is_active"] = i in final
+            if head is None:
+                row["root_id"] = ids[i]
+            elif head[0] == "db":
+                superseded[head[1].id] = (head[1], ids[i])
+                row["root_id"] = head[1].root_id or head[1].id
+            else:
+                prev = new_rows[head[1]]
+                prev["superseded_by"] = ids[i]
+                row["root_id"] = prev["root_id"]
+        if placed < len(new_rows):
+            self.db.connection().exec_driver_sql(
+                _SQLITE_INSERT, [tuple(row[c] for c in _ROW_COLUMNS) for row in new_rows[placed:]])
+        # rows inserted before their ids were known, and the old heads they supersede
+        links = [{"b_id": row["id"], "b_root": row["root_id"], "b_next": row["superseded_by"],
+                  "b_active": row["is_active"]} for row in new_rows[:placed]]
+        deltas, removed = {}, {}
+        for i in final:
+            user_id = new_rows[i]["user_id"]
+            deltas[user_id] = deltas.get(user_id, 0) + 1
+        for old_id, (old, new_id) in superseded.items():
+            links.append({"b_id": old_id, "b_root": old.root_id or old.id, "b_next": new_id, "b_active": False})
+            deltas[old.user_id] = deltas.get(old.user_id, 0) - 1
+            removed.setdefault(old.user_id, []).append(old_id)
+        if links:
+            self.db.execute(_LINK, links)
+        if touched:
+            self.db.execute(_TOUCH, [{"b_id": mid, "b_turn": turn} for mid, (_u, turn) in touched.items()])
+        self.counts.adjust(self.db, deltas)
         self.db.commit()
 
+        # after commit: vector index (one add per user), cache, eviction
+        added = {}
+        for i in sorted(final):
+            added.setdefault(new_rows[i]["user_id"], []).append(new_rows[i])
+        for mid, (user_id, turn_id) in touched.items():
+            self.cache.touch(user_id, mid, turn_id)
+        for user_id in set(added) | set(removed):
+            rows = added.get(user_id, [])
+            try:
+                if rows:
+                    self.vs.add_memories([(r["id"], f"{r['key']}: {r['value']}") for r in rows], user_id=user_id)
+                if removed.get(user_id):
+                    self.vs.remove_memories(removed[user_id], user_id=user_id)
+            except Exception:
+                pass
+            self.cache.apply(user_id, added=[FactSnapshot.from_mapping(r) for r in reversed(rows)],
+                             removed=removed.get(user_id, ()))
+        for row in new_rows:
+            self.policy.record(row["user_id"], row["key"])
+        scopes = set()
+        for user_id in added:
+            scopes.update(over_limit(self.db, user_id, self.counts))
+        self._evict_scopes(scopes)
+        return ids
+
+    def _maybe_evict(self, user_id: str = None):
+        # tracked counts: no COUNT(*) on the write path
+        self._evict_scopes(over_limit(self.db, user_id, self.counts))
+
+    def _evict_scopes(self, scopes):
+        if not scopes:
+            return
+        if self.evictor is not None:
+            self.evictor.request(scopes)
+            return
+        for scope in scopes:
+            evict(self.db, self.vs, scope, self.stats, self.cache, self.counts, self.policy)
+
     def retrieve_relevant(self, user_id: str, query: str, turn_id: int,
                           k: int = RETRIEVE_K, state=None):
         """
@@ -112,167 +243,187 @@ class MemoryEngine:
          - explicit query pattern and exact key substring (fast)
          - query->key map (dominant)
          - intent map
-         - fuzzy over distinct keys (small set)
+         - fuzzy over the user's cached key vocabulary (one rapidfuzz call)
          - vector fallback: batch fetch MemoryFact rows
+        The tiers' outcome is memoized per user memory version, so a repeated
+        query only re-ranks and records access stats.
         """
-        results = []
         ql = query.lower().strip()
+        self._sync_shared(user_id)
+        # read before the facts: a write during this call moves it on and retires what we cache
+        key = (user_id, ql, k, self.cache.version(user_id), self.rules.version)
+        # cached (or one round trip): every tier below runs against this in-memory view
+        facts = self.cache.get_or_load(self.db, user_id, self.stats)
+        plan = self.results.get(key)
+        if plan is None or not _plan_valid(plan, facts):
+            plan = self._fast_path(facts, ql) or self._key_plan(facts, ql)
+            if plan[0] == "vector":
+                # Tier 4: vector fallback, hits resolved against the prefetched facts
+                try:
+                    plan = ("vector", plan[1], self.vs.search(query, k * 5, user_id=user_id))
+                except Exception:
+                    pass
+            self._remember(key, plan)
+        return self._replay(plan, facts, ql, turn_id, k)
+
+    def retrieve_relevant_batch(self, user_id: str, queries, turn_id: int,
+                                k: int = RETRIEVE_K, state=None):
+        """
+        retrieve_relevant for many queries of one user. Queries that reach the
+        vector tier are vectorized and searched in one batch; all tiers share
+        one prefetch of the user's facts. Returns one result list per query.
+        """
+        queries = list(queries)
+        self._sync_shared(user_id)
+        version = self.cache.version(user_id)
+        facts = self.cache.get_or_load(self.db, user_id, self.stats)
+        # pass 1: memoized plans, then the fast path for the rest (reads only)
+        keys, plans = [], []
+        for query in queries:
+            ql = query.lower().strip()
+            keys.append((user_id, ql, k, version, self.rules.version))
+            plan = self.results.get(keys[-1])
+            if plan is None or not _plan_valid(plan, facts):
+                plan = self._fast_path(facts, ql)
+                if plan is not None:
+                    self._remember(keys[-1], plan)
+            plans.append(plan)
+        # key tiers for the rest, their fuzzy tier scored as one queries x keys matrix
+        slow = [i for i, plan in enumerate(plans) if plan is None]
+        fuzzy = facts.vocabulary.match_many([keys[i][1] for i in slow])
+        for i, matches in zip(slow, fuzzy):
+            plans[i] = self._key_plan(facts, keys[i][1], matches)
+            if plans[i][0] == "keys":
+                self._remember(keys[i], plans[i])
+
+        # pass 2: one vectorize + search for all vector-tier queries still to search
+        todo = [i for i, plan in enumerate(plans) if plan[0] == "vector" and plan[2] is None]
+        if todo:
+            try:
+                hits = self.vs.search_batch([queries[i] for i in todo], k * 5, user_id=user_id)
+                for i, h in zip(todo, hits):
+                    plans[i] = ("vector", plans[i][1], h)
+                    self._remember(keys[i], plans[i])
+            except Exception:
+                pass
+
+        # pass 3: rank and touch in query order, so each query sees the earlier ones' access stats
+        return [self._replay(plan, facts, key[1], turn_id, k) for key, plan in zip(keys, plans)]
+
+    def _sync_shared(self, user_id: str):
+        # shared vector store (worker processes): other workers' writes retire our cached view
+        sync = getattr(self.vs, "sync", None)
+        if sync is not None and sync(user_id):
+            self.cache.invalidate(user_id)
+
+    def _remember(self, key, plan):
+        # a vector-tier plan whose search failed is not kept
+        if plan[0] != "vector" or plan[2] is not None:
+            self.results.put(key, plan)
 
+    def _replay(self, plan, facts: UserFacts, ql: str, turn_id: int, k: int):
+        """Ranked results from a plan (fresh or memoized) against the current view."""
+        tier, items = plan[0], plan[1]
+        by_id = facts.by_id
+        if tier == "fast":
+            mem_id, score = items[0]
+            self._touch(by_id[mem_id], turn_id)
+            return [{"memory": by_id[mem_id], "score": score}]
+        if tier == "like":
+            mem = most_recent([by_id[i] for i in items])
+            self._touch(mem, turn_id)
+            return [{"memory": mem, "score": 80.0}]
+        results = [{"memory": by_id[i], "score": score} for i, score in items]
+        if tier == "keys":
+            return self._finalize(results, ql, turn_id, k, penalty=0.9)
+        results.extend(self._score_vector_hits(plan[2] or (), by_id, turn_id))
+        return self._finalize(results, ql, turn_id, k, penalty=0.80)
+
+    def _touch(self, mem, turn_id: int):
+        # no write on the read path: update the cached snapshot and queue the DB update
+        _set_access(mem, turn_id, (mem.access_count or 0) + 1)
+        self.stats.record(mem.id, turn_id)
+        self.policy.record(mem.user_id, mem.key)
+
+    def _fast_path(self, facts: UserFacts, ql: str):
         # Tier 0a: explicit-pattern "what is my X" -> attempt canonical mapping
-        import re
-        m = re.search(r"what(?:'s| is)? my\s+(.+?)[\?\.\!]?$", ql)
+        m = _WHAT_IS_MY.search(ql)
         if m:
             target = m.group(1).strip()
-            target = re.sub(r'\b(please|now|today)\b', '', target).strip()
+            target = _FILLER_WORDS.sub('', target).strip()
             # direct mapping
             cand = None
-            for phrase, key in QUERY_TO_KEY_MAP.items():
+            for phrase, key in self.rules.current().synonym_list:
                 if phrase == target or phrase in target or target in phrase:
                     cand = key
                     break
-            if not cand:
-                candidate_key = target.replace(" ", "_")
-                mem = (self.db.query(MemoryFact)
-                       .filter(MemoryFact.user_id == user_id,
-                               MemoryFact.key == candidate_key,
-                               MemoryFact.is_active == True)
-                       .order_by(MemoryFact.last_accessed_turn.desc()).first())
-                if mem:
-                    mem.last_accessed_turn = turn_id
-                    mem.access_count = (mem.access_count or 0) + 1
-                    self.db.add(mem)
-                    self.db.commit()
-                    return [{"memory": mem, "score": 100.0}]
-            else:
-                mem = (self.db.query(MemoryFact)
-                       .filter(MemoryFact.user_id == user_id,
-                               MemoryFact.key == cand,
-                               MemoryFact.is_active == True)
-                       .order_by(MemoryFact.last_accessed_turn.desc()).first())
-                if mem:
-                    mem.last_accessed_turn = turn_id
-                    mem.access_count = (mem.access_count or 0) + 1
-                    self.db.add(mem)
-                    self.db.commit()
-                    return [{"memory": mem, "score": 100.0}]
-
-        # Tier 0b: exact key substring using SQL filter (avoids full table scan)
-        mem = (self.db.query(MemoryFact)
-               .filter(MemoryFact.user_id == user_id,
-                       MemoryFact.is_active == True,
-                       MemoryFact.key.ilike(f"%{ql}%"))
-               .order_by(MemoryFact.last_accessed_turn.desc()).first())
-        if mem:
-            mem.last_accessed_turn = turn_id
-            mem.access_count = (mem.access_count or 0) + 1
-            self.db.add(mem)
-            self.db.commit()
-            return [{"memory": mem, "score": 80.0}]
+            mem = facts.latest(cand or target.replace(" ", "_"))
+            if mem:
+                return ("fast", [(mem.id, 100.0)])
 
-        # Tier 1: query->key mapping (single lookup)
-        q_map_key = _query_to_key_candidate(ql)
+        # Tier 0b: exact key substring; the most recently used match is picked at replay
+        found = facts.keys_like(ql)
+        if found:
+            return ("like", [m.id for m in found])
+        return None
+
+    def _key_plan(self, facts: UserFacts, ql: str, fuzzy=None):
+        results = [(r["memory"].id, r["score"]) for r in self._key_tiers(facts, ql, fuzzy)]
+        # strong key results answer on their own; otherwise the vector tier adds hits
+        if any(score >= 30.0 for _, score in results):
+            return ("keys", results)
+        return ("vector", results, None)
+
+    def _key_tiers(self, facts: UserFacts, ql: str, fuzzy=None):
+        results = []
+        rules = self.rules.current()
+        # Tier 1: query->key mapping (one automaton pass over the query)
+        q_map_key = rules.query_key(ql)
         if q_map_key:
-            mem = (self.db.query(MemoryFact)
-                   .filter(MemoryFact.user_id == user_id,
-                           MemoryFact.key == q_map_key,
-                           MemoryFact.is_active == True)
-                   .order_by(MemoryFact.last_accessed_turn.desc()).first())
+            mem = facts.latest(q_map_key)
             if mem:
                 results.append({"memory": mem, "score": 50.0})
 
-        # Tier 2: intent mapping (single queries per intended key)
-        for intent, keys in INTENT_MAP.items():
-            if intent in ql:
-                for key in keys:
-                    mem = (self.db.query(MemoryFact)
-                           .filter(MemoryFact.user_id == user_id,
-                                   MemoryFact.key == key,
-                                   MemoryFact.is_active == True)
-                           .order_by(MemoryFact.last_accessed_turn.desc()).first())
-                    if mem:
-                        results.append({"memory": mem, "score": 40.0})
-
-        # Tier 3: fuzzy key match over DISTINCT keys (much smaller set)
-        key_rows = (self.db.query(MemoryFact.key)
-                    .filter(MemoryFact.user_id == user_id, MemoryFact.is_active == True)
-                    .distinct().all())
-        key_list = [kr[0] for kr in key_rows]
-        fuzzy_candidates = []
-        for key in key_list:
-            sim = fuzz.partial_ratio(key.lower(), ql) / 100.0
-            if sim >= FUZZY_THRESHOLD:
-                fuzzy_candidates.append((key, sim))
-        # take top few fuzzy keys
-        fuzzy_candidates.sort(key=lambda x: x[1], reverse=True)
-        for key, sim in fuzzy_candidates[:5]:
-            mem = (self.db.query(MemoryFact)
-                   .filter(MemoryFact.user_id == user_id,
-                           MemoryFact.key == key,
-                           MemoryFact.is_active == True)
-                   .order_by(MemoryFact.last_accessed_turn.desc()).first())
+        # Tier 2: intent mapping
+        for intent, keys in rules.intent_keys(ql):
+            for key in keys:
+                mem = facts.latest(key)
+                if mem:
+                    results.append({"memory": mem, "score": 40.0})
+
+        # Tier 3: fuzzy key match, all of the user's keys scored in one rapidfuzz call
+        if fuzzy is None:
+            fuzzy = facts.vocabulary.match(ql)
+        for key, sim in fuzzy:
+            mem = facts.latest(key)
             if mem:
                 results.append({"memory": mem, "score": 30.0 + sim * 5.0})
+        return results
 
-        # If we already have strong results, dedupe and return
-        if any(r["score"] >= 30.0 for r in results):
-            best = {}
-            for r in results:
-                mid = r["memory"].id
-                key_words = _words_for_key(r["memory"].key)
-                if not any(w in ql for w in key_words):
-                    r["score"] *= 0.9
-                if mid not in best or r["score"] > best[mid]["score"]:
-                    best[mid] = r
-            final = list(best.values())
-            final.sort(key=lambda x: x["score"], reverse=True)
-            # update access stats in batch
-            for r in final[:k]:
-                m = r["memory"]
-                m.last_accessed_turn = turn_id
-                m.access_count = (m.access_count or 0) + 1
-                self.db.add(m)
-            self.db.commit()
-            return final[:k]
-
-        # Tier 4: vector fallback (batch fetch MemoryFact rows)
-        try:
-            vec_hits = self.vs.search(query, k * 5)
-            if vec_hits:
-                ids = [vid for vid, _ in vec_hits]
-                # fetch all mems in one query and build a map
-                mem_rows = (self.db.query(MemoryFact)
-                            .filter(MemoryFact.id.in_(ids), MemoryFact.user_id == user_id,
-                                    MemoryFact.is_active == True).all())
-                mem_map = {m.id: m for m in mem_rows}
-                for mem_id, sim in vec_hits:
-                    mem = mem_map.get(mem_id)
-                    if not mem:
-                        continue
-                    recency = math.exp(-(turn_id - (mem.last_accessed_turn or mem.origin_turn)) / max(1.0, RECENCY_HALF_LIFE/2))
-                    score = 0.45 * sim + 0.35 * recency + 0.20 * (mem.confidence or 0.5)
-                    results.append({"memory": mem, "score": score})
-        except Exception:
-            pass
+    def _score_vector_hits(self, vec_hits, mem_map, turn_id: int):
+        results = []
+        for mem_id, sim in vec_hits:
+            mem = mem_map.get(mem_id)
+            if not mem:
+                continue
+            recency = math.exp(-(turn_id - (mem.last_accessed_turn or mem.origin_turn)) / max(1.0, RECENCY_HALF_LIFE/2))
+            score = 0.45 * sim + 0.35 * recency + 0.20 * (mem.confidence or 0.5)
+            results.append({"memory": mem, "score": score})
+        return results
 
-        # Final dedup & penalty for unrelated keys
+    def _finalize(self, results, ql: str, turn_id: int, k: int, penalty: float):
+        # dedup & penalty for unrelated keys
         best = {}
         for r in results:
             mid = r["memory"].id
             key_words = _words_for_key(r["memory"].key)
             if not any(w in ql for w in key_words):
-                r["score"] *= 0.80
+                r["score"] *= penalty
             if mid not in best or r["score"] > best[mid]["score"]:
                 best[mid] = r
-
         final = list(best.values())
         final.sort(key=lambda x: x["score"], reverse=True)
-
-        # Update access stats in batch
+        # update access stats in batch
         for r in final[:k]:
-            m = r["memory"]
-            m.last_accessed_turn = turn_id
-            m.access_count = (m.access_count or 0) + 1
-            self.db.add(m)
-        self.db.commit()
-
+            self._touch(r["memory"], turn_id)
         return final[:k]
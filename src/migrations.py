@@ -0,0 +1,75 @@
+# src/migrations.py
+import time
+from sqlalchemy import select, func, literal, update
+from src.models import Base, MemoryFact, MemoryCounter, ConversationStateRow, SchemaMigration
+from src.active_counts import GLOBAL
+
+
+# single-column indexes the partial ones replace; the planner picked the
+# low-selectivity is_active index over them, and nothing filters on key alone
+LEGACY_INDEXES = ("ix_memory_facts_key", "ix_memory_facts_is_active")
+
+
+def _memory_fact_indexes(conn):
+    # create_all() skips indexes of tables that already exist
+    for index in MemoryFact.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    for name in LEGACY_INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def _seed_active_counters(conn):
+    active = MemoryFact.is_active == True
+    counters = MemoryCounter.__table__
+    conn.execute(counters.delete())
+    conn.execute(counters.insert().from_select(
+        ["scope", "active"],
+        select(MemoryFact.user_id, func.count()).where(active).group_by(MemoryFact.user_id)))
+    conn.execute(counters.insert().from_select(
+        ["scope", "active"],
+        select(literal(GLOBAL), func.count()).select_from(MemoryFact.__table__).where(active)))
+
+
+def _move_conversation_state(conn):
+    legacy_key = "__conv_state__"
+    rows = conn.execute(
+        select(MemoryFact.user_id, MemoryFact.value, MemoryFact.last_accessed_turn)
+        .where(MemoryFact.key == legacy_key, MemoryFact.is_active == True)
+        .order_by(MemoryFact.user_id, MemoryFact.last_accessed_turn.desc(), MemoryFact.id.desc())).all()
+    latest = {}
+    for user_id, value, turn in rows:
+        latest.setdefault(user_id, {"user_id": user_id, "data": value, "turn_id": turn, "updated_at": time.time()})
+    existing = set(conn.execute(select(ConversationStateRow.user_id)).scalars())
+    fresh = [r for u, r in latest.items() if u not in existing]
+    if fresh:
+        conn.execute(ConversationStateRow.__table__.insert(), fresh)
+    # legacy rows no longer count as active facts
+    conn.execute(update(MemoryFact.__table__)
+                 .where(MemoryFact.key == legacy_key, MemoryFact.is_active == True)
+                 .values(is_active=False))
+    _seed_active_counters(conn)
+
+
+# (version, name, fn(conn)); append only, never renumber
+MIGRATIONS = [
+    (1, "composite partial indexes on memory_facts", _memory_fact_indexes),
+    (2, "seed memory_counters from memory_facts", _seed_active_counters),
+    (3, "move __conv_state__ facts to conversation_state", _move_conversation_state),
+]
+
+
+def upgrade(engine):
+    """Apply pending migrations in order; each one runs in its own transaction."""
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+    done = []
+    for version, name, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, name=name, applied_at=time.time()))
+        done.append(version)
+    return done
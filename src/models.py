@@ -9,17 +9,31 @@ class MemoryFact(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True, nullable=False)
-    key = Column(String, index=True, nullable=False)
+    key = Column(String, nullable=False)
     value = Column(Text, nullable=False)
     category = Column(String, nullable=True)
     origin_turn = Column(Integer, nullable=False)
     last_accessed_turn = Column(Integer, nullable=True)
     access_count = Column(Integer, default=0)
     confidence = Column(Float, default=0.9)
-    is_active = Column(Boolean, default=True, index=True)  # speed
+    is_active = Column(Boolean, default=True)  # indexed through the partial indexes below
     superseded_by = Column(Integer, nullable=True)
     root_id = Column(Integer, nullable=True)
 
+    # partial indexes over active rows, shaped for the engine's access patterns
+    # (created on existing databases by src/migrations.py)
+    __table_args__ = (
+        # latest active fact per (user, key): ORDER BY last_accessed_turn DESC LIMIT 1
+        Index("ix_memory_facts_user_key_recent", "user_id", "key", "last_accessed_turn",
+              sqlite_where=is_active == True, postgresql_where=is_active == True),
+        # a user's active facts, newest access first (UserFacts.load)
+        Index("ix_memory_facts_user_recent", "user_id", last_accessed_turn.desc(), "id",
+              sqlite_where=is_active == True, postgresql_where=is_active == True),
+        # global active count + eviction scan ordered by last_accessed_turn
+        Index("ix_memory_facts_active_recent", "last_accessed_turn",
+              sqlite_where=is_active == True, postgresql_where=is_active == True),
+    )
+
     def to_dict(self):
         return {
             "memory_id": f"mem_{self.id:04d}",
@@ -27,4 +41,27 @@ class MemoryFact(Base):
             "origin_turn": self.origin_turn,
             "last_used_turn": self.last_accessed_turn or self.origin_turn,
             "confidence": self.confidence
-        }
\ No newline at end of file
+        }
+
+class MemoryCounter(Base):
+    """Active-fact counts per user_id, plus the global total under scope '__all__'."""
+    __tablename__ = "memory_counters"
+
+    scope = Column(String, primary_key=True)
+    active = Column(Integer, nullable=False, default=0)
+
+class ConversationStateRow(Base):
+    """One row per user, upserted in place (src/state.py)."""
+    __tablename__ = "conversation_state"
+
+    user_id = Column(String, primary_key=True)
+    data = Column(Text, nullable=False)
+    turn_id = Column(Integer, nullable=True)
+    updated_at = Column(Float, nullable=True)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(Float, nullable=False)
\ No newline at end of file
@@ -0,0 +1,67 @@
+# src/result_cache.py
+import threading
+from collections import OrderedDict
+from src.config import RETRIEVAL_CACHE_SIZE
+
+
+class RetrievalCache:
+    """LRU of retrieval plans: (user_id, query, k, memory version, rules version) -> plan.
+
+    A plan is what retrieve_relevant computed before ranking: the tier that
+    answered and the fact ids with their tier scores (vector hits keep the raw
+    similarity). Ranking, recency and access stats are redone from the plan on
+    every call, so a hit returns what a full run would; the versions in the
+    key retire an entry as soon as the user's facts or the rule packs change.
+    """
+
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            plan = self.entries.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key, plan):
+        if not self.max_entries:
+            return
+        with self.lock:
+            self.entries[key] = plan
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+
+_default = None
+
+def get_retrieval_cache():
+    global _default
+    if _default is None:
+        _default = RetrievalCache()
+    return _default
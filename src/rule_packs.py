@@ -0,0 +1,342 @@
+# src/rule_packs.py
+import os
+import re
+import glob
+import json
+import time
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+from src.config import RULE_PACK_DIR, RULE_PACK_RELOAD_INTERVAL
+
+
+class AhoCorasick:
+    """Multi-substring matcher: one pass over the text whatever the number of words.
+
+    Built as a DFA (goto + failure links folded into per-state dicts), so a
+    scan is one dict lookup per character. find() ORs together the value of
+    every word that occurs (by default 1 << word index).
+    """
+
+    def __init__(self, words, values=None):
+        self.words = list(words)
+        values = list(values) if values is not None else [1 << i for i in range(len(self.words))]
+        goto = [{}]               # trie: state -> {char: child}
+        out = [0]                 # state -> bitmask of words ending here (failure chain folded in)
+        for i, word in enumerate(self.words):
+            s = 0
+            for ch in word:
+                if ch not in goto[s]:
+                    goto[s][ch] = len(goto)
+                    goto.append({})
+                    out.append(0)
+                s = goto[s][ch]
+            out[s] |= values[i]
+        # breadth first, so a state's failure target (shallower) is finished before it
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        order = deque(goto[0].values())
+        while order:
+            r = order.popleft()
+            delta[r] = dict(delta[fail[r]])
+            delta[r].update(goto[r])
+            for ch, s in goto[r].items():
+                fail[s] = delta[fail[r]].get(ch, 0) if r else 0
+                out[s] |= out[fail[s]]
+                order.append(s)
+        self.delta = delta
+        self.out = out
+
+    def find(self, text: str) -> int:
+        delta, out = self.delta, self.out
+        s, found = 0, 0
+        for ch in text:
+            s = delta[s].get(ch, 0)
+            if out[s]:
+                found |= out[s]
+        return found
+
+    # with the default values:
+
+    def first(self, text: str):
+        """Lowest-index word that occurs in text, or None."""
+        found = self.find(text)
+        return (found & -found).bit_length() - 1 if found else None
+
+    def all(self, text: str):
+        """Indexes of the words that occur, ascending."""
+        found, idx = self.find(text), []
+        while found:
+            low = found & -found
+            idx.append(low.bit_length() - 1)
+            found ^= low
+        return idx
+
+
+# --- value templates: "{2|strip|capitalize}", "${1}", "account ending in {1}" ---
+
+def _iso_date(v):
+    try:
+        return datetime.fromisoformat(v).strftime("%B %d")
+    except Exception:
+        return v
+
+FILTERS = {
+    "strip": str.strip,
+    "lower": str.lower,
+    "upper": str.upper,
+    "capitalize": str.capitalize,
+    "int": lambda v: str(int(v)),
+    "iso_date": _iso_date,
+}
+
+_FIELD = re.compile(r'\{(\d+)((?:\|\w+)*)\}')
+_DEFINE = re.compile(r'\{\{(\w+)\}\}')
+
+
+def _compile_template(template: str, where: str):
+    parts, pos = [], 0
+    for m in _FIELD.finditer(template):
+        if m.start() > pos:
+            parts.append(template[pos:m.start()])
+        names = [n for n in m.group(2).split("|") if n]
+        unknown = [n for n in names if n not in FILTERS]
+        if unknown:
+            raise ValueError(f"{where}: unknown filter(s) {unknown} (known: {sorted(FILTERS)})")
+        parts.append((int(m.group(1)), tuple(FILTERS[n] for n in names)))
+        pos = m.end()
+    if pos < len(template):
+        parts.append(template[pos:])
+    return parts
+
+
+def _render(parts, m):
+    out = []
+    for p in parts:
+        if isinstance(p, str):
+            out.append(p)
+            continue
+        v = m.group(p[0]) or ""
+        for f in p[1]:
+            v = f(v)
+        out.append(v)
+    return "".join(out)
+
+
+def _regex_step(spec, defines, where):
+    pattern = _DEFINE.sub(lambda d: defines[d.group(1)], spec["regex"])
+    flags = re.I if "i" in spec.get("flags", "") else 0
+    rx = re.compile(pattern, flags)
+    parts = _compile_template(spec.get("value", "{0}"), where)
+    groups = [p[0] for p in parts if not isinstance(p, str)]
+    if groups and max(groups) > rx.groups:
+        raise ValueError(f"{where}: template uses group {max(groups)}, regex has {rx.groups}")
+    reject = {v.lower() for v in spec.get("reject", ())}     # values that discard the match
+
+    def step(text, tl):
+        m = rx.search(text)
+        if m is None:
+            return None
+        value = _render(parts, m)
+        return None if value.lower() in reject else value
+    return step
+
+
+def _contains_step(spec):
+    words = [w.lower() for w in spec["contains"]]
+    value = spec["value"]
+    if len(words) > 16:
+        ac = AhoCorasick(words)
+        return lambda text, tl: value if ac.find(tl) else None
+    # a few words: C-level substring checks beat a Python-level automaton pass
+    return lambda text, tl: value if any(w in tl for w in words) else None
+
+
+def compile_extractor(spec, defines, where):
+    """(key, fn, confidence, triggers) for ExtractionEngine.register from one pack entry."""
+    key = spec["key"]
+    where = f"{where} extractor {key!r}"
+    steps = []
+    contains_only = True
+    for i, p in enumerate(spec.get("patterns", ())):
+        if "contains" in p:
+            steps.append(_contains_step(p))
+        elif "regex" in p:
+            contains_only = False
+            steps.append(_regex_step(p, defines, f"{where} pattern {i}"))
+        else:
+            raise ValueError(f"{where} pattern {i}: needs 'regex' or 'contains'")
+    if not steps:
+        raise ValueError(f"{where}: no patterns")
+    triggers = spec.get("triggers")
+    if triggers is None and contains_only:
+        # a 'contains' rule can only match where one of its words occurs
+        triggers = [w.lower() for p in spec["patterns"] for w in p["contains"]]
+    if triggers is not None and any(t != t.lower() or not t.isascii() for t in triggers):
+        raise ValueError(f"{where}: triggers must be lowercase ASCII")
+
+    def fn(text, tl):
+        # first pattern that yields a value wins
+        for step in steps:
+            value = step(text, tl)
+            if value:
+                return value
+        return None
+    fn.__name__ = f"extract_{key}"
+    return key, fn, float(spec.get("confidence", 0.9)), triggers
+
+
+def read_pack(path: str):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            # imported lazily: YAML packs are optional, JSON needs nothing extra
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class RuleSet:
+    """Everything compiled from the loaded packs; replaced whole on reload, never mutated."""
+
+    def __init__(self, packs):
+        self.packs = []
+        self.extractors = {}          # key -> compiled spec; a later pack overrides an earlier key
+        self.synonyms = {}            # query phrase -> key, first match in this order wins
+        self.intents = {}             # intent word -> keys
+        for path, pack in packs:
+            name = pack.get("name") or os.path.basename(path)
+            defines = pack.get("define", {})
+            for spec in pack.get("extractors", ()):
+                try:
+                    self.extractors[spec["key"]] = compile_extractor(spec, defines, name)
+                except Exception as e:
+                    raise ValueError(f"{path}: {type(e).__name__}: {e}") from e
+            self.synonyms.update(pack.get("query_synonyms", {}))
+            self.intents.update(pack.get("intents", {}))
+            self.packs.append({"name": name, "path": path, "extractors": len(pack.get("extractors", ())),
+                               "query_synonyms": len(pack.get("query_synonyms", {})),
+                               "intents": len(pack.get("intents", {}))})
+        self.synonym_list = list(self.synonyms.items())
+        self.intent_list = list(self.intents.items())
+        self._synonym_ac = AhoCorasick(p for p, _ in self.synonym_list)
+        self._intent_ac = AhoCorasick(i for i, _ in self.intent_list)
+
+    def query_key(self, ql: str):
+        """Key of the first synonym (pack order) contained in the query."""
+        i = self._synonym_ac.first(ql)
+        return self.synonym_list[i][1] if i is not None else None
+
+    def intent_keys(self, ql: str):
+        """(intent, keys) for each intent word in the query, pack order."""
+        return [self.intent_list[i] for i in self._intent_ac.all(ql)]
+
+
+class RulePacks:
+    """Loads every *.json / *.yaml pack in `directory` (filename order) into a RuleSet.
+
+    reload() compiles the packs off to the side and swaps the RuleSet in one
+    assignment, so readers see either the old rules or the new ones; a pack
+    that fails to load or compile (or an empty directory) leaves the current
+    rules in place and the error in stats(); on the first load it raises.
+    watch() polls the directory's mtimes in a daemon thread.
+    """
+
+    def __init__(self, directory=RULE_PACK_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.rules = None
+        self.version = 0
+        self.loaded_at = None
+        self.last_error = None
+        self._listeners = []
+        self._signature = None
+        self._thread = None
+
+    def _paths(self):
+        paths = []
+        for ext in ("*.json", "*.yaml", "*.yml"):
+            paths.extend(glob.glob(os.path.join(self.directory, ext)))
+        return sorted(paths)
+
+    def _stat(self):
+        sig = []
+        for p in self._paths():
+            try:
+                st = os.stat(p)
+                sig.append((p, st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+        return tuple(sig)
+
+    def current(self):
+        if self.rules is None:
+            self.reload(raise_errors=True)
+        return self.rules
+
+    def on_reload(self, fn):
+        """Call fn(rule_set) after every successful reload."""
+        self._listeners.append(fn)
+
+    def reload(self, raise_errors=False):
+        with self.lock:
+            signature = self._stat()
+            try:
+                if not signature:
+                    # no packs means no extractors at all: fail loudly rather than extract nothing
+                    raise FileNotFoundError(f"no rule packs (*.json, *.yaml) in {os.path.abspath(self.directory)}")
+                rules = RuleSet([(p, read_pack(p)) for p, _, _ in signature])
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if raise_errors or self.rules is None:
+                    raise
+                return False
+            self.rules = rules
+            self._signature = signature
+            self.version += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+            for fn in self._listeners:
+                fn(rules)
+            return True
+
+    def maybe_reload(self):
+        """Reload if any pack file was added, removed or changed since the last load."""
+        if self._stat() != self._signature:
+            return self.reload()
+        return False
+
+    def watch(self, interval=RULE_PACK_RELOAD_INTERVAL):
+        if not interval or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.maybe_reload()
+            except Exception:
+                traceback.print_exc()
+
+    def stats(self):
+        rules = self.rules
+        return {
+            "directory": self.directory,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+            "packs": rules.packs if rules else [],
+            "extractors": list(rules.extractors) if rules else [],
+        }
+
+
+_default = None
+
+def get_rule_packs():
+    global _default
+    if _default is None:
+        _default = RulePacks()
+    return _default
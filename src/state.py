@@ -1,8 +1,21 @@
 # src/state.py
 import json
-from src.models import MemoryFact
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import text
+from src.models import ConversationStateRow
+from src.background import BackgroundRunner
+from src.config import STATE_FLUSH_INTERVAL, STATE_CACHE_SIZE, STATE_REVALIDATE
 
-STATE_KEY = "__conv_state__"
+# updated_at is when the state was saved, not flushed: a worker flushing an older save never wins
+_UPSERT = text(
+    "INSERT INTO conversation_state (user_id, data, turn_id, updated_at) "
+    "VALUES (:user_id, :data, :turn_id, :updated_at) "
+    "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, turn_id = excluded.turn_id, "
+    "updated_at = excluded.updated_at "
+    "WHERE conversation_state.updated_at IS NULL OR excluded.updated_at >= conversation_state.updated_at"
+)
 
 class ConversationState:
     def __init__(self, user_id: str):
@@ -49,38 +62,139 @@ class ConversationState:
         state.turn_count = d.get("turn_count", 0)
         return state
 
+class StateStore:
+    """Process-level cache of ConversationState with write-behind upserts.
+
+    load() is served from memory after a user's first turn; save() only
+    updates the cache and marks the user dirty. A background thread upserts
+    dirty states into conversation_state every `interval` seconds (and at
+    exit), so neither DB operation sits on the /chat critical path. Clean
+    entries are LRU-bounded by `max_users`; dirty ones stay until their upsert
+    commits.
+
+    Rows carry the time they were saved and an upsert never replaces a newer
+    one. With several workers (`revalidate`, on with VECTOR_SHARED) load()
+    also reads the row and takes it over the cached entry when another worker
+    saved the user since, so a state is at most one flush interval behind.
+    """
+
+    def __init__(self, session_factory=None, interval=STATE_FLUSH_INTERVAL, max_users=STATE_CACHE_SIZE,
+                 revalidate=STATE_REVALIDATE):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_users = max_users
+        self.revalidate = revalidate
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()     # user_id -> (state dict, turn_id, saved_at)
+        self.dirty = set()
+        self.writing = set()           # users in the upsert being committed; pinned in the cache
+        self.flush_lock = threading.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+        self._runner = BackgroundRunner(self.flush, interval)
+
+    def load(self, db, user_id: str):
+        with self.lock:
+            entry = self.cache.get(user_id)
+            if entry is not None:
+                self.cache.move_to_end(user_id)
+        if entry is None or self.revalidate:
+            row = self._read(db, user_id)
+            with self.lock:
+                entry = self.cache.get(user_id)
+                if entry is None or row[2] > entry[2]:
+                    # first load, or another worker saved this user after our copy (which is then stale)
+                    entry = self.cache[user_id] = row
+                    self.dirty.discard(user_id)
+                self._shrink()
+        if entry[0] is None:
+            return ConversationState(user_id)
+        # callers mutate the state they get back; hand out a copy
+        return ConversationState.from_dict(entry[0])
+
+    def save(self, user_id: str, state: ConversationState, turn_id: int):
+        with self.lock:
+            self.cache[user_id] = (state.to_dict(), turn_id, time.time())
+            self.cache.move_to_end(user_id)
+            self.dirty.add(user_id)
+            self._shrink()
+        self._runner.start()
+        return state
+
+    def _read(self, db, user_id):
+        row = db.get(ConversationStateRow, user_id)
+        if row is None:
+            return (None, None, 0.0)
+        try:
+            data = json.loads(row.data)
+        except Exception:
+            data = None
+        return (data, row.turn_id, row.updated_at or 0.0)
+
+    def flush(self, db=None):
+        """Upsert every dirty state; uses `db` if given (and commits it), else a fresh session."""
+        with self.flush_lock:
+            return self._flush(db)
+
+    def _flush(self, db):
+        with self.lock:
+            # a dirty user without a cache entry has nothing left to write
+            users = [u for u in self.dirty if u in self.cache]
+            batch = [{"user_id": u, "data": json.dumps(self.cache[u][0]), "turn_id": self.cache[u][1],
+                      "updated_at": self.cache[u][2]} for u in users]
+            self.dirty = set()
+            # until the commit lands the cache holds the only copy: _shrink must keep it
+            self.writing = set(users)
+        if not batch:
+            return 0
+        own = db is None
+        try:
+            if own:
+                if self.session_factory is None:
+                    from src.database import get_session
+                    self.session_factory = get_session
+                db = self.session_factory()
+            try:
+                db.execute(_UPSERT, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                if own:
+                    db.close()
+        except Exception:
+            # retry next round (newer saves meanwhile are already dirty)
+            with self.lock:
+                self.dirty.update(users)
+            raise
+        finally:
+            with self.lock:
+                self.writing = set()
+                self._shrink()
+        self.flushes += 1
+        self.rows_written += len(batch)
+        return len(batch)
+
+    def _shrink(self):
+        if len(self.cache) <= self.max_users:
+            return
+        for user_id in list(self.cache):
+            if len(self.cache) <= self.max_users:
+                break
+            if user_id not in self.dirty and user_id not in self.writing:
+                del self.cache[user_id]
+
+_default = None
+
+def get_state_store():
+    global _default
+    if _default is None:
+        _default = StateStore()
+    return _default
+
 def load_state_for_user(db, user_id: str):
-    mem = db.query(MemoryFact).filter(
-        MemoryFact.user_id == user_id,
-        MemoryFact.key == STATE_KEY,
-        MemoryFact.is_active == True
-    ).order_by(MemoryFact.last_accessed_turn.desc()).first()
-    if not mem:
-        return ConversationState(user_id)
-    try:
-        return ConversationState.from_dict(json.loads(mem.value))
-    except:
-        return ConversationState(user_id)
+    return get_state_store().load(db, user_id)
 
 def save_state_for_user(db, user_id: str, state: ConversationState, turn_id: int):
-    old_list = db.query(MemoryFact).filter(
-        MemoryFact.user_id == user_id,
-        MemoryFact.key == STATE_KEY,
-        MemoryFact.is_active == True
-    ).all()
-    for o in old_list:
-        o.is_active = False
-        db.add(o)
-    mem = MemoryFact(
-        user_id=user_id,
-        key=STATE_KEY,
-        value=json.dumps(state.to_dict()),
-        category="state",
-        origin_turn=turn_id,
-        last_accessed_turn=turn_id,
-        confidence=0.99,
-        is_active=True
-    )
-    db.add(mem)
-    db.commit()
-    return mem
\ No newline at end of file
+    return get_state_store().save(user_id, state, turn_id)
\ No newline at end of file
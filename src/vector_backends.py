@@ -0,0 +1,362 @@
+# src/vector_backends.py
+from array import array
+import numpy as np
+import faiss
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from src.config import (VECTOR_ANN_TRAIN_THRESHOLD, VECTOR_IVF_NLIST, VECTOR_IVF_NPROBE, VECTOR_PQ_M,
+                        VECTOR_HNSW_M, VECTOR_HNSW_EF_SEARCH, VECTOR_HNSW_EF_CONSTRUCTION)
+
+# Every backend takes L2-normalised scipy CSR rows from the vectorizer and
+# answers inner-product top-n queries with faiss-style (D, I) arrays.
+# export() returns plain numpy arrays for a snapshot; load() accepts the same
+# arrays back, possibly as read-only memory maps, and must not copy them.
+# copy() gives an independent index that add() can grow while the original
+# keeps serving searches.
+
+
+class FlatIndex:
+    """Dense brute-force inner product (faiss IndexFlatIP).
+
+    Vectors restored from a snapshot stay in a memory-mapped base matrix and
+    are scanned in place; vectors added afterwards go to an in-memory faiss
+    index and the two result sets are merged.
+    """
+    name = "flat"
+
+    def __init__(self, dim: int, base=None):
+        self.d = dim
+        self.base = base
+        self.tail = faiss.IndexFlatIP(dim)
+
+    @property
+    def ntotal(self):
+        nb = self.base.shape[0] if self.base is not None else 0
+        return nb + self.tail.ntotal
+
+    def add(self, X):
+        X = X.toarray().astype(np.float32) if sparse.issparse(X) else np.asarray(X, dtype=np.float32)
+        faiss.normalize_L2(X)
+        self.tail.add(X)
+
+    def search(self, Q, n):
+        Q = Q.toarray().astype(np.float32) if sparse.issparse(Q) else np.asarray(Q, dtype=np.float32)
+        faiss.normalize_L2(Q)
+        if self.base is None or self.base.shape[0] == 0:
+            return self.tail.search(Q, n)
+        nb = self.base.shape[0]
+        D = np.full((Q.shape[0], n), -np.inf, dtype=np.float32)
+        I = np.full((Q.shape[0], n), -1, dtype=np.int64)
+        base_scores = Q @ self.base.T
+        tD, tI = self.tail.search(Q, min(n, self.tail.ntotal)) if self.tail.ntotal else (None, None)
+        for qi in range(Q.shape[0]):
+            scores = base_scores[qi]
+            rows = np.argpartition(-scores, n - 1)[:n] if nb > n else np.arange(nb)
+            cand = list(zip(scores[rows].tolist(), rows.tolist()))
+            if tD is not None:
+                cand += [(float(d), int(i) + nb) for d, i in zip(tD[qi], tI[qi]) if i >= 0]
+            cand.sort(key=lambda c: (-c[0], c[1]))
+            for j, (score, row) in enumerate(cand[:n]):
+                D[qi, j] = score
+                I[qi, j] = row
+        return D, I
+
+    def export(self):
+        tail = (self.tail.reconstruct_n(0, self.tail.ntotal) if self.tail.ntotal
+                else np.zeros((0, self.d), np.float32))
+        if self.base is None:
+            return {"vectors": tail}
+        return {"vectors": np.vstack([np.asarray(self.base), tail])}
+
+    def copy(self):
+        """Independent index over the same rows; the read-only base is shared."""
+        out = FlatIndex(self.d, base=self.base)
+        if self.tail.ntotal:
+            out.tail = faiss.clone_index(self.tail)
+        return out
+
+    def take(self, rows):
+        """New in-memory index holding only `rows`, renumbered 0..len(rows)-1."""
+        out = FlatIndex(self.d)
+        if len(rows):
+            out.tail.add(np.ascontiguousarray(self.export()["vectors"][rows]))
+        return out
+
+    @classmethod
+    def load(cls, dim: int, arrays):
+        return cls(dim, base=arrays["vectors"])
+
+
+class SparseIndex:
+    """Inverted index over term ids; never densifies a TF-IDF row.
+
+    The snapshot keeps postings in CSC layout (column = term), so a restored
+    index scores straight from the memory-mapped arrays. Rows added later live
+    in per-term posting arrays. Scoring touches only the postings of the query's
+    terms, so cost follows the number of matching memories, not `dim`.
+    """
+    name = "sparse"
+
+    def __init__(self, dim: int, base=None, n_base: int = 0):
+        self.d = dim
+        self.base = base              # (data, indices, indptr) CSC arrays or None
+        self.n_base = n_base
+        self.n_tail = 0
+        self.tail = {}                # term id -> (array rows, array weights)
+
+    @property
+    def ntotal(self):
+        return self.n_base + self.n_tail
+
+    def add(self, X):
+        X = normalize(sparse.csr_matrix(X, dtype=np.float32))
+        for r in range(X.shape[0]):
+            row = self.n_base + self.n_tail
+            start, end = X.indptr[r], X.indptr[r + 1]
+            for term, w in zip(X.indices[start:end].tolist(), X.data[start:end].tolist()):
+                rows, weights = self.tail.setdefault(term, (array("q"), array("f")))
+                rows.append(row)
+                weights.append(w)
+            self.n_tail += 1
+
+    def _postings(self, term: int):
+        parts = []
+        if self.base is not None and term < len(self.base[2]) - 1:
+            data, indices, indptr = self.base
+            s, e = indptr[term], indptr[term + 1]
+            if e > s:
+                parts.append((indices[s:e], data[s:e]))
+        if term in self.tail:
+            rows, weights = self.tail[term]
+            # copy: a live buffer view would stop the array from growing on the next add
+            parts.append((np.array(rows, dtype=np.int64), np.array(weights, dtype=np.float32)))
+        return parts
+
+    def search(self, Q, n):
+        Q = normalize(sparse.csr_matrix(Q, dtype=np.float32))
+        D = np.zeros((Q.shape[0], n), dtype=np.float32)
+        I = np.full((Q.shape[0], n), -1, dtype=np.int64)
+        for qi in range(Q.shape[0]):
+            s, e = Q.indptr[qi], Q.indptr[qi + 1]
+            rows_l, weights_l = [], []
+            for term, qw in zip(Q.indices[s:e].tolist(), Q.data[s:e].tolist()):
+                for rows, weights in self._postings(term):
+                    rows_l.append(rows)
+                    weights_l.append(weights * qw)
+            ranked = []
+            if rows_l:
+                uniq, inv = np.unique(np.concatenate(rows_l), return_inverse=True)
+                scores = np.bincount(inv, weights=np.concatenate(weights_l))
+                order = np.lexsort((uniq, -scores))[:n]
+                ranked = list(zip(uniq[order].tolist(), scores[order].tolist()))
+            # pad with zero-score rows like a dense scan would
+            if len(ranked) < n:
+                seen = {row for row, _ in ranked}
+                row = 0
+                while len(ranked) < n and row < self.ntotal:
+                    if row not in seen:
+                        ranked.append((row, 0.0))
+                    row += 1
+            for j, (row, score) in enumerate(ranked):
+                D[qi, j] = score
+                I[qi, j] = row
+        return D, I
+
+    def _matrix(self):
+        mats = []
+        if self.base is not None:
+            data, indices, indptr = self.base
+            mats.append(sparse.csc_matrix((np.asarray(data), np.asarray(indices), np.asarray(indptr)),
+                                          shape=(self.n_base, self.d)))
+        if self.n_tail:
+            rows, cols, vals = [], [], []
+            for term, (r, w) in self.tail.items():
+                rows.append(np.array(r, dtype=np.int64) - self.n_base)
+                cols.append(np.full(len(r), term, dtype=np.int64))
+                vals.append(np.array(w, dtype=np.float32))
+            mats.append(sparse.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                          shape=(self.n_tail, self.d)))
+        if not mats:
+            return sparse.csc_matrix((0, self.d), dtype=np.float32)
+        return sparse.vstack(mats).tocsc()
+
+    def copy(self):
+        out = SparseIndex(self.d, base=self.base, n_base=self.n_base)
+        out.n_tail = self.n_tail
+        out.tail = {term: (rows[:], weights[:]) for term, (rows, weights) in self.tail.items()}
+        return out
+
+    def take(self, rows):
+        out = SparseIndex(self.d)
+        if len(rows):
+            out.add(self._matrix().tocsr()[rows])
+        return out
+
+    def export(self):
+        m = self._matrix()
+        return {
+            "data": m.data.astype(np.float32),
+            "indices": m.indices.astype(np.int64),
+            "indptr": m.indptr.astype(np.int64),
+            "shape": np.asarray(m.shape, dtype=np.int64)
+        }
+
+    @classmethod
+    def load(cls, dim: int, arrays):
+        n_base = int(arrays["shape"][0])
+        return cls(dim, base=(arrays["data"], arrays["indices"], arrays["indptr"]), n_base=n_base)
+
+
+class AnnIndex:
+    """Approximate search on top of an exact FlatIndex.
+
+    Below VECTOR_ANN_TRAIN_THRESHOLD rows every query is an exact flat scan.
+    Once the threshold is crossed the ANN structure is built from the flat
+    vectors (training where the index type needs it) and rebuilt whenever the
+    store has doubled since the last build, so IVF centroids follow the data.
+    The flat copy stays as training data and as the source for take().
+    """
+    name = None
+
+    def __init__(self, dim: int, flat=None):
+        self.d = dim
+        self.flat = flat if flat is not None else FlatIndex(dim)
+        self.ann = None
+        self.trained_at = 0
+        self.nprobe = VECTOR_IVF_NPROBE
+        self.ef_search = VECTOR_HNSW_EF_SEARCH
+        self._maybe_build()
+
+    @property
+    def ntotal(self):
+        return self.flat.ntotal
+
+    def _build(self, n: int):
+        raise NotImplementedError
+
+    def _maybe_build(self):
+        n = self.flat.ntotal
+        if n < VECTOR_ANN_TRAIN_THRESHOLD or (self.ann is not None and n < 2 * self.trained_at):
+            return
+        X = np.ascontiguousarray(self.flat.export()["vectors"], dtype=np.float32)
+        ann = self._build(n)
+        if not ann.is_trained:
+            ann.train(X)
+        ann.add(X)
+        self.ann = ann
+        self.trained_at = n
+        self.set_search_params()
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if self.ann is None:
+            return
+        if hasattr(self.ann, "nprobe"):
+            self.ann.nprobe = self.nprobe
+        if hasattr(self.ann, "hnsw"):
+            self.ann.hnsw.efSearch = self.ef_search
+
+    def add(self, X):
+        X = X.toarray().astype(np.float32) if sparse.issparse(X) else np.array(X, dtype=np.float32)
+        faiss.normalize_L2(X)
+        self.flat.add(X)
+        if self.ann is None or self.flat.ntotal >= 2 * self.trained_at:
+            self._maybe_build()
+        else:
+            self.ann.add(X)
+
+    def search(self, Q, n):
+        if self.ann is None:
+            return self.flat.search(Q, n)
+        Q = Q.toarray().astype(np.float32) if sparse.issparse(Q) else np.asarray(Q, dtype=np.float32)
+        faiss.normalize_L2(Q)
+        return self.ann.search(Q, n)
+
+    def copy(self):
+        # the built structure is cloned, not retrained
+        out = type(self).__new__(type(self))
+        out.d = self.d
+        out.flat = self.flat.copy()
+        out.ann = faiss.clone_index(self.ann) if self.ann is not None else None
+        out.trained_at = self.trained_at
+        out.nprobe, out.ef_search = self.nprobe, self.ef_search
+        out.set_search_params()
+        return out
+
+    def take(self, rows):
+        return type(self)(self.d, flat=self.flat.take(rows))
+
+    def export(self):
+        arrays = dict(self.flat.export())
+        if self.ann is not None:
+            # the built structure rides along so a restart skips training
+            arrays["ann"] = faiss.serialize_index(self.ann)
+            arrays["trained_at"] = np.asarray([self.trained_at], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def load(cls, dim: int, arrays):
+        out = cls.__new__(cls)
+        out.d = dim
+        out.flat = FlatIndex.load(dim, arrays)
+        out.nprobe = VECTOR_IVF_NPROBE
+        out.ef_search = VECTOR_HNSW_EF_SEARCH
+        out.ann, out.trained_at = None, 0
+        if "ann" in arrays:
+            out.ann = faiss.deserialize_index(np.asarray(arrays["ann"]))
+            out.trained_at = int(arrays["trained_at"][0])
+            out.set_search_params()
+        else:
+            out._maybe_build()
+        return out
+
+
+def _nlist(n: int):
+    # faiss wants ~39 training points per centroid
+    return max(1, min(VECTOR_IVF_NLIST, n // 39))
+
+
+class IVFFlatIndex(AnnIndex):
+    name = "ivf"
+
+    def _build(self, n: int):
+        return faiss.IndexIVFFlat(faiss.IndexFlatIP(self.d), self.d, _nlist(n), faiss.METRIC_INNER_PRODUCT)
+
+
+class IVFPQIndex(AnnIndex):
+    name = "ivfpq"
+
+    def _build(self, n: int):
+        # PQ needs the sub-quantizer count to divide the dimension
+        m = max(x for x in range(1, VECTOR_PQ_M + 1) if self.d % x == 0)
+        nbits = 8 if n >= 39 * 256 else 4
+        return faiss.IndexIVFPQ(faiss.IndexFlatIP(self.d), self.d, _nlist(n), m, nbits,
+                                faiss.METRIC_INNER_PRODUCT)
+
+
+class HNSWIndex(AnnIndex):
+    name = "hnsw"
+
+    def _build(self, n: int):
+        index = faiss.IndexHNSWFlat(self.d, VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = VECTOR_HNSW_EF_CONSTRUCTION
+        return index
+
+
+BACKENDS = {
+    FlatIndex.name: FlatIndex,
+    SparseIndex.name: SparseIndex,
+    IVFFlatIndex.name: IVFFlatIndex,
+    IVFPQIndex.name: IVFPQIndex,
+    HNSWIndex.name: HNSWIndex,
+}
+
+
+def make_index(name: str, dim: int):
+    try:
+        return BACKENDS[name](dim)
+    except KeyError:
+        raise ValueError(f"unknown vector backend: {name!r} (expected one of {sorted(BACKENDS)})")
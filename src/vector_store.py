@@ -1,128 +1,789 @@
 # src/vector_store.py
 import os
-import pickle
+import json
+import glob
+import hashlib
+import time
 import threading
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict, Counter, deque
 import numpy as np
-import faiss
-from sklearn.feature_extraction.text import TfidfVectorizer
-from src.config import EMBED_DIM, VECTOR_STORE_PATH
+from scipy import sparse
+from src.config import (EMBED_DIM, VECTOR_STORE_PATH, VECTOR_SHARD_DIR, VECTOR_SHARD_CACHE_SIZE,
+                        VECTOR_JOURNAL_COMPACT_EVERY, VECTOR_JOURNAL_FSYNC, VECTOR_BACKEND,
+                        VECTOR_EMBEDDING, VECTOR_TOMBSTONE_RATIO, VECTOR_TOMBSTONE_MIN,
+                        VECTOR_DELTA_RATIO, VECTOR_DELTA_MIN, VECTOR_QUERY_CACHE_SIZE, VECTOR_SHARED,
+                        VECTOR_SEARCH_THREADS)
+from src.embedding import make_vectorizer, vectorizer_state, restore_vectorizer, unseen_terms
+from src.journal import Journal
+from src.interprocess import SharedGeneration
+from src.vector_backends import BACKENDS, make_index
+
+class _FairSlots:
+    """Counting semaphore that admits waiters in arrival order.
+
+    threading.Semaphore lets a thread that just released take the slot again
+    ahead of the ones already waiting, which starves readers under a busy loop;
+    here a release hands the slot straight to the oldest waiter.
+    """
+
+    def __init__(self, n):
+        self.lock = threading.Lock()
+        self.free = n
+        self.waiters = deque()
+
+    def __enter__(self):
+        with self.lock:
+            if self.free and not self.waiters:
+                self.free -= 1
+                return
+            ready = threading.Event()
+            self.waiters.append(ready)
+        ready.wait()
+
+    def __exit__(self, *exc):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.free += 1
+
+
+# searches running at once in this process; more than there are cores only time-slice the GIL
+_search_slots = _FairSlots(VECTOR_SEARCH_THREADS or os.cpu_count() or 1)
+
+def _store_exists(path: str) -> bool:
+    journal = Journal(path)
+    return (os.path.exists(f"{path}.meta.json") or os.path.exists(journal.path)
+            or bool(journal.sealed_segments()))
+
+
+def _unit_rows(X):
+    # L2-normalised float32 CSR rows, as the faiss backends normalise what they store
+    X = sparse.csr_matrix(X, dtype=np.float32, copy=True)
+    rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    norms = np.sqrt(np.bincount(rows, weights=X.data.astype(np.float64) ** 2, minlength=X.shape[0]))
+    X.data /= norms[rows].astype(np.float32)
+    return X
+
+
+def _append_block(blocks, rows):
+    # binary-counter merging: a block joins the one before it while that one is no bigger,
+    # so a delta is O(log n) blocks and each row is copied O(log n) times, not on every add
+    blocks = list(blocks or ()) + [rows]
+    while len(blocks) > 1 and blocks[-2].shape[0] <= blocks[-1].shape[0]:
+        top = blocks.pop()
+        blocks[-1] = sparse.vstack([blocks[-1], top], format="csr")
+    return tuple(blocks)
+
+
+def _stack(blocks):
+    return blocks[0] if len(blocks) == 1 else sparse.vstack(blocks, format="csr")
+
+
+class _Embedder:
+    """A vectorizer plus the query vectors it has produced (normalized text -> row).
+
+    Shared by every snapshot that uses the same vectorizer; a refit or an
+    online IDF update makes a new one, so cached query vectors never outlive
+    the weights they were computed with.
+    """
+    __slots__ = ("vectorizer", "cache", "lock")
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()      # cache bookkeeping only, never held while embedding
+
+    def matrix(self, queries):
+        # repeated queries skip the vectorizer; the vectorizers lowercase, and their
+        # tokens ignore whitespace runs, so the normalized text embeds the same
+        texts = [" ".join(q.lower().split()) for q in queries]
+        with self.lock:
+            rows = {t: self.cache.get(t) for t in texts}
+        missing = [t for t, row in rows.items() if row is None]
+        if missing:
+            X = self.vectorizer.transform(missing)
+            for i, t in enumerate(missing):
+                rows[t] = X[i:i + 1]
+        with self.lock:
+            for t, row in rows.items():
+                self.cache[t] = row
+                self.cache.move_to_end(t)
+            while len(self.cache) > VECTOR_QUERY_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        out = [rows[t] for t in texts]
+        return out[0] if len(out) == 1 else sparse.vstack(out, format="csr")
+
+
+class _Snapshot:
+    """Everything a search reads, published whole and never modified afterwards.
+
+    `index` holds rows 0..n_base-1. Rows added since are kept in `delta`, a
+    tuple of L2-normalised CSR blocks, and scored exactly until the writer
+    folds them into a copy of the index. `id_map` and `texts` are append-only lists shared with
+    later snapshots, so only their first `n` entries belong to this one.
+    """
+    __slots__ = ("index", "n_base", "delta", "n", "id_map", "texts", "deleted", "embedder", "current_dim")
+
+    def __init__(self, index=None, n_base=0, delta=None, n=0, id_map=None, texts=None,
+                 deleted=frozenset(), embedder=None, current_dim=None):
+        self.index = index
+        self.n_base = n_base
+        self.delta = delta
+        self.n = n
+        self.id_map = id_map if id_map is not None else []
+        self.texts = texts if texts is not None else []
+        self.deleted = deleted
+        self.embedder = embedder          # None until a vectorizer is fitted
+        self.current_dim = current_dim
+
+    def replace(self, **changes):
+        snap = _Snapshot.__new__(_Snapshot)
+        for name in _Snapshot.__slots__:
+            setattr(snap, name, changes[name] if name in changes else getattr(self, name))
+        return snap
+
+    def merged_index(self):
+        """One index over all n rows; a copy when there is a delta, the base is never grown."""
+        if self.delta is None:
+            return self.index
+        index = self.index.copy()
+        index.add(_stack(self.delta))
+        return index
+
+    def search(self, Q, k: int):
+        # over-fetch by the tombstone count so k live hits survive the filter
+        n = min(k + len(self.deleted), self.n)
+        if n == 0:
+            return [[] for _ in range(Q.shape[0])]
+        cands = [[] for _ in range(Q.shape[0])]
+        if self.n_base:
+            D, I = self.index.search(Q, min(n, self.n_base))
+            for qi in range(Q.shape[0]):
+                cands[qi] = [(float(d), int(i)) for d, i in zip(D[qi], I[qi]) if 0 <= i < self.n_base]
+        if self.delta is not None:
+            Qt = _unit_rows(Q).T.tocsc()
+            S = np.vstack([(block @ Qt).toarray() for block in self.delta])
+            for qi in range(Q.shape[0]):
+                col = S[:, qi]
+                top = np.argpartition(-col, n - 1)[:n] if len(col) > n else np.arange(len(col))
+                top = top[np.lexsort((top, -col[top]))]
+                # stable: on equal scores base rows (in the index's order) stay ahead of newer rows
+                cands[qi] = sorted(cands[qi] + [(float(col[j]), self.n_base + int(j)) for j in top],
+                                   key=lambda c: -c[0])
+        out = []
+        for cand in cands:
+            results = []
+            for score, row in cand[:n]:
+                if self.id_map[row] not in self.deleted:
+                    results.append((self.id_map[row], score))
+            out.append(results[:k])
+        return out
+
 
 class VectorStore:
-    def __init__(self, dim=EMBED_DIM, path=VECTOR_STORE_PATH):
+    """TF-IDF vectors of one store's memories, searchable while they are being written.
+
+    Searches read `self.snap`, an immutable _Snapshot, without taking a lock.
+    Writers (serialised by `self.lock`) never modify a published snapshot: an
+    add appends to the delta rows, a removal makes a new tombstone set, and a
+    fold, purge, refit or rebuild builds a new index; each then publishes the
+    result with one attribute assignment. rebuild() builds outside the lock
+    altogether, so even a full re-embed only delays writers at the swap.
+
+    With shared=True several processes (uvicorn workers) open the same files.
+    Writes also take the `<path>.gen` file lock, first catch up on what other
+    processes journaled, then bump the generation counter in that file. A
+    search that sees the counter move replays the journal tail (or reloads a
+    newer snapshot) before it reads, so every process answers from the same data.
+    """
+
+    def __init__(self, dim=EMBED_DIM, path=VECTOR_STORE_PATH, load=True, backend=VECTOR_BACKEND,
+                 embedding=VECTOR_EMBEDDING, shared=VECTOR_SHARED):
         self.lock = threading.Lock()
         self.dim = dim
         self.path = path
-        self.texts = []
-        self.id_map = []
-        self.vectorizer = TfidfVectorizer(
-            max_features=dim,
-            stop_words='english',
-            lowercase=True,
-            analyzer='word'
-        )
-        self.index = None
-        self.is_fitted = False
-        self.current_dim = None
-
-        if os.path.exists(self.path):
-            try:
-                self._load()
-            except Exception:
-                # corrupted file -> reset cleanly
-                self.texts = []
-                self.id_map = []
-                self.index = None
-                self.is_fitted = False
-                self.current_dim = None
-
-    def _ensure_index(self):
-        if not self.texts:
-            self.index = None
-            self.is_fitted = False
-            self.current_dim = None
+        self.backend = backend
+        self.embedding = embedding
+        self.snap = _Snapshot()
+        # journal: every add is one O(1) append; snapshots are compacted in the background
+        self.journal = Journal(self.path, fsync=VECTOR_JOURNAL_FSYNC, shared=shared)
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._compacting = False
+        self._snapshot_lock = threading.Lock()
+        self._written_seq = -1
+        self._rebuild_lock = threading.Lock()
+        self._pending = None              # journal payloads logged while rebuild() builds
+        self.gen = None                   # shared mode: cross-process generation counter + lock
+        self._seen_gen = 0
+        if shared:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.gen = SharedGeneration(f"{self.path}.gen")
+
+        with self._file_lock(shared=True):
+            if self.gen is not None:
+                self._seen_gen = self.gen.value()
+            if load and _store_exists(self.path):
+                try:
+                    self._load()
+                except Exception:
+                    # corrupted file -> reset cleanly
+                    self.snap = _Snapshot()
+                    self.seq = 0
+                    self.snapshot_seq = 0
+
+    def _file_lock(self, shared=False):
+        if self.gen is None:
+            return nullcontext()
+        return self.gen.shared() if shared else self.gen.exclusive()
+
+    @contextmanager
+    def _writing(self):
+        # one writer per process (self.lock) and, in shared mode, one across processes;
+        # most of the catching up is done first under the shared lock, alongside readers
+        if self.gen is not None:
+            self.sync()
+        with self.lock, self._file_lock():
+            if self.gen is not None:
+                self._catch_up()
+            yield
+
+    def _new_vectorizer(self):
+        return make_vectorizer(self.embedding, self.dim)
+
+    def _build(self, ids, texts, embedder=None):
+        """A fresh snapshot over (ids, texts), fitting a vectorizer unless one is given.
+        Touches no shared state, so rebuild() runs it without the lock."""
+        if not texts:
+            return _Snapshot()
+        if embedder is None:
+            vectorizer = self._new_vectorizer()
+            vectorizer.fit(texts)
+            embedder = _Embedder(vectorizer)
+        # transform texts once; the backend decides whether rows get densified
+        X = embedder.vectorizer.transform(texts)
+        index = make_index(self.backend, X.shape[1])
+        index.add(X)
+        return _Snapshot(index=index, n_base=len(ids), n=len(ids), id_map=list(ids), texts=list(texts),
+                         embedder=embedder, current_dim=X.shape[1])
+
+    def _apply_many(self, items):
+        s = self.snap
+        ids = [mem_id for mem_id, _ in items]
+        texts = [text for _, text in items]
+        if s.embedder is None:
+            # nothing fitted yet: fit on everything at once
+            self.snap = self._build(s.id_map[:s.n] + ids, s.texts[:s.n] + texts).replace(deleted=s.deleted)
             return
-        if not self.is_fitted:
-            # fit vectorizer once on texts
-            self.vectorizer.fit(self.texts)
-            self.is_fitted = True
-        # transform texts once
-        X = self.vectorizer.transform(self.texts).toarray().astype(np.float32)
-        faiss.normalize_L2(X)
-        self.current_dim = X.shape[1]
-        self.index = faiss.IndexFlatIP(self.current_dim)
-        self.index.add(X)
-
-    def add_memory(self, mem_id: int, text: str):
-        with self.lock:
-            if not self.is_fitted and self.texts:
-                self._ensure_index()
-            if not self.is_fitted:
-                # first element: append then ensure index
-                self.texts.append(text)
-                self.id_map.append(mem_id)
-                self._ensure_index()
-            else:
-                vec = self.vectorizer.transform([text]).toarray().astype(np.float32)
-                # if new vector dim doesn't match current_dim, rebuild from texts
-                if vec.shape[1] != self.current_dim:
-                    self.texts.append(text)
-                    self.id_map.append(mem_id)
-                    self._ensure_index()
-                else:
-                    faiss.normalize_L2(vec)
-                    self.texts.append(text)
-                    self.id_map.append(mem_id)
-                    # add vector to existing index efficiently
-                    self.index.add(vec)
-            # Save only metadata (vectorizer + texts + id_map)
-            self._save()
+        embedder = s.embedder
+        if unseen_terms(self.embedding, embedder.vectorizer, texts):
+            # the vocabulary predates these terms and would embed them as zeros: refit on everything
+            self.snap = self._build(s.id_map[:s.n] + ids, s.texts[:s.n] + texts).replace(deleted=s.deleted)
+            return
+        if self.embedding == "hashing":
+            # fixed hashed space: df moves online (on a copy), never refit
+            embedder = _Embedder(embedder.vectorizer.updated(texts))
+        X = embedder.vectorizer.transform(texts)
+        if X.shape[1] != s.current_dim:
+            # if new vector dim doesn't match current_dim, rebuild from texts
+            self.snap = self._build(s.id_map[:s.n] + ids, s.texts[:s.n] + texts, embedder).replace(deleted=s.deleted)
+            return
+        if len(s.id_map) > s.n:
+            # rows of a write that failed before publishing
+            del s.id_map[s.n:]
+            del s.texts[s.n:]
+        s.id_map.extend(ids)
+        s.texts.extend(texts)
+        n = s.n + len(ids)
+        self.snap = s.replace(delta=_append_block(s.delta, _unit_rows(X)), n=n, embedder=embedder)
+        if n - s.n_base >= max(VECTOR_DELTA_MIN, VECTOR_DELTA_RATIO * s.n_base):
+            self._fold()
+
+    def _fold(self):
+        # the delta joins a copy of the index; searches in flight keep the old one
+        s = self.snap
+        self.snap = s.replace(index=s.merged_index(), n_base=s.n, delta=None)
+
+    def _apply_remove(self, mem_ids):
+        s = self.snap
+        self.snap = s.replace(deleted=s.deleted.union(mem_ids))
+        if s.n and len(self.snap.deleted) >= max(VECTOR_TOMBSTONE_MIN, VECTOR_TOMBSTONE_RATIO * s.n):
+            self._purge()
+
+    def _purge(self):
+        # drop tombstoned rows from the index; rows are renumbered, ids are not
+        s = self.snap
+        live = [row for row in range(s.n) if s.id_map[row] not in s.deleted]
+        base = [row for row in live if row < s.n_base]
+        tail = [row - s.n_base for row in live if row >= s.n_base]
+        self.snap = s.replace(index=s.index.take(base), n_base=len(base),
+                              delta=(_stack(s.delta)[tail],) if tail else None, n=len(live),
+                              id_map=[s.id_map[row] for row in live], texts=[s.texts[row] for row in live],
+                              deleted=frozenset())
+
+    def _replay(self, payload):
+        if payload[0] == "del":
+            self._apply_remove(payload[1])
+        elif payload[0] == "add":
+            self._apply_many([(payload[1], payload[2])])
+        elif payload[0] == "addmany":
+            self._apply_many(payload[1])
+        else:
+            # pre-tombstone journals logged bare (mem_id, text) adds
+            self._apply_many([(payload[0], payload[1])])
+
+    def _log(self, payload):
+        self.seq += 1
+        self.journal.append(self.seq, payload)
+        if self._pending is not None:
+            self._pending.append(payload)
+        if self.gen is not None:
+            self._seen_gen = self.gen.bump()
+        if self.seq - self.snapshot_seq >= VECTOR_JOURNAL_COMPACT_EVERY and not self._compacting:
+            self._start_compaction()
+
+    def add_memory(self, mem_id: int, text: str, user_id: str = None):
+        # user_id is accepted for parity with ShardedVectorStore; this store is global
+        with self._writing():
+            self._apply_many([(mem_id, text)])
+            self._log(("add", mem_id, text))
+
+    def add_memories(self, items, user_id: str = None):
+        """Add many (mem_id, text) pairs: one transform, one publish, one journal record."""
+        items = list(items)
+        if not items:
+            return
+        with self._writing():
+            self._apply_many(items)
+            self._log(("addmany", items))
+
+    def remove_memories(self, mem_ids, user_id: str = None):
+        """Tombstone superseded/evicted ids; the index is compacted once enough pile up."""
+        with self._writing():
+            self._apply_remove(list(mem_ids))
+            self._log(("del", list(mem_ids)))
 
     def rebuild_from_db(self, session):
         from src.models import MemoryFact
+        self.begin_rebuild()
+        active = session.query(MemoryFact).filter(MemoryFact.is_active == True).all()
+        self.rebuild([(m.id, f"{m.key}: {m.value}") for m in active])
+
+    def begin_rebuild(self):
+        """Start recording writes for a rebuild() whose items are read after this call."""
         with self.lock:
-            active = session.query(MemoryFact).filter(MemoryFact.is_active == True).all()
-            self.texts = [f"{m.key}: {m.value}" for m in active]
-            self.id_map = [m.id for m in active]
-            self.is_fitted = False
-            self._ensure_index()
-            self._save()
-
-    def search(self, query: str, k: int = 5):
+            if self._pending is None:
+                self._pending = []
+
+    def end_rebuild(self):
+        # a begun rebuild that is not going to happen: stop recording
         with self.lock:
-            if not self.texts or not self.is_fitted or self.index is None:
-                return []
-            qv = self.vectorizer.transform([query]).toarray().astype(np.float32)
-            if qv.shape[1] != self.current_dim:
+            self._pending = None
+
+    def rebuild(self, items):
+        """Re-embed and re-index `items` from scratch, then swap the result in.
+
+        The build runs without the writer lock: searches keep the old snapshot
+        and writes keep landing on it. Writes logged meanwhile (or since
+        begin_rebuild()) are re-applied to the new snapshot at the swap, adds
+        of ids it already has skipped.
+        """
+        items = list(items)
+        with self._rebuild_lock:
+            self.begin_rebuild()
+            try:
+                snap = self._build([mem_id for mem_id, _ in items], [text for _, text in items])
+            except BaseException:
+                with self.lock:
+                    self._pending = None
+                raise
+            with self._writing():
+                pending, self._pending = self._pending, None
+                if any(payload[0] == "reload" for payload in pending):
+                    # we reloaded a newer snapshot from another process meanwhile, so the recorded
+                    # writes no longer line up with this build: keep what is on disk
+                    return
+                self.snap = snap
+                present = set(snap.id_map)
+                for payload in pending:
+                    if payload[0] == "add" and payload[1] in present:
+                        continue
+                    if payload[0] == "addmany":
+                        payload = ("addmany", [it for it in payload[1] if it[0] not in present])
+                        if not payload[1]:
+                            continue
+                    self._replay(payload)
+                self.seq += 1
+                self._write_snapshot(self._snapshot_state())
+                self.snapshot_seq = self.seq
+                self.journal.reset()
+                if self.gen is not None:
+                    self._seen_gen = self.gen.bump()
+
+    def sync(self, user_id: str = None):
+        """Catch up with what other processes wrote (shared mode); True if anything changed."""
+        if self.gen is None or self.gen.value() == self._seen_gen:
+            return False
+        with self.lock, self._file_lock(shared=True):
+            return self._catch_up()
+
+    def _catch_up(self):
+        # called with self.lock and the file lock held
+        value = self.gen.value()
+        if value == self._seen_gen:
+            return False
+        meta_seq = self._meta_seq()
+        if meta_seq > self.seq:
+            # a newer snapshot (another process compacted past us, or rebuilt): start from it
+            self._load()
+            if self._pending is not None:
+                self._pending.append(("reload",))
+        else:
+            for seq, payload in self.journal.follow(self.seq):
+                self._replay(payload)
+                self.seq = seq
+                if self._pending is not None:
+                    self._pending.append(payload)
+            self.snapshot_seq = max(self.snapshot_seq, meta_seq)
+        self._seen_gen = value
+        return True
+
+    def _meta_seq(self):
+        try:
+            with open(f"{self.path}.meta.json") as f:
+                return json.load(f).get("seq", 0)
+        except (OSError, ValueError):
+            return 0
+
+    def search(self, query: str, k: int = 5, user_id: str = None):
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k: int = 5, user_id: str = None):
+        """Vectorize all queries in one transform and run one index search (no lock taken)."""
+        if self.gen is not None:
+            self.sync()
+        s = self.snap
+        if not queries or not s.n or s.embedder is None:
+            return [[] for _ in queries]
+        with _search_slots:
+            qv = s.embedder.matrix(queries)
+            if qv.shape[1] != s.current_dim:
                 # dimension mismatch unlikely; fallback empty
-                return []
-            faiss.normalize_L2(qv)
-            n = min(k, self.index.ntotal)
-            if n == 0:
-                return []
-            D, I = self.index.search(qv, n)
-            results = []
-            for score, idx in zip(D[0], I[0]):
-                if idx < len(self.id_map):
-                    results.append((self.id_map[idx], float(score)))
-            return results
-
-    def _save(self):
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "wb") as f:
-            pickle.dump({
-                "texts": self.texts,
-                "id_map": self.id_map,
-                "vectorizer": self.vectorizer,
-                "is_fitted": self.is_fitted,
-                "current_dim": self.current_dim
-            }, f)
+                return [[] for _ in queries]
+            return s.search(qv, k)
+
+    def clear_query_cache(self):
+        s = self.snap
+        if s.embedder is not None:
+            with s.embedder.lock:
+                s.embedder.cache.clear()
+
+    def _snapshot_state(self):
+        # the published snapshot is immutable, so it can be written without the lock
+        return {"snap": self.snap, "seq": self.seq}
+
+    def _generation_prefix(self, seq: int):
+        return f"{self.path}.{seq:012d}"
+
+    def _write_snapshot(self, state):
+        """Write one immutable generation, then atomically repoint <path>.meta.json at it."""
+        with self._snapshot_lock:
+            # a slow background compaction must never overwrite a newer snapshot
+            if state["seq"] <= self._written_seq or (self.gen is not None and state["seq"] <= self._meta_seq()):
+                return
+            s = state["snap"]
+            index = s.merged_index() if s.n else None
+            arrays = index.export() if index is not None and index.ntotal else None
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            prefix = self._generation_prefix(state["seq"])
+            if arrays is not None:
+                # index arrays + ids are raw .npy so a reader can mmap them
+                for name, arr in arrays.items():
+                    np.save(f"{prefix}.{name}.npy", np.ascontiguousarray(arr))
+                np.save(f"{prefix}.ids.npy", np.asarray(s.id_map[:s.n], dtype=np.int64))
+                with open(f"{prefix}.texts.json", "w") as f:
+                    json.dump(s.texts[:s.n], f)
+            meta = {
+                "format": 3,
+                "seq": state["seq"],
+                "generation": state["seq"] if arrays is not None else None,
+                "backend": self.backend,
+                "arrays": sorted(arrays) if arrays is not None else [],
+                "tombstones": sorted(s.deleted),
+                "is_fitted": s.embedder is not None,
+                "current_dim": s.current_dim,
+                "embedding": self.embedding,
+                "vectorizer": vectorizer_state(self.embedding, s.embedder.vectorizer) if s.embedder else None
+            }
+            tmp = f"{self.path}.meta.json.tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, f"{self.path}.meta.json")
+            self._written_seq = state["seq"]
+            # older generations are unreachable now (open mmaps stay valid after unlink)
+            keep = self._generation_prefix(state["seq"]) + "."
+            for old in glob.glob(glob.escape(self.path) + ".[0-9]*.*"):
+                if not old.startswith(keep):
+                    os.remove(old)
+
+    def _start_compaction(self):
+        # called with self.lock held: seal the journal and hand the snapshot to a thread
+        state = self._snapshot_state()
+        self.journal.seal(state["seq"])
+        self._compacting = True
+        threading.Thread(target=self._compact, args=(state,), daemon=True).start()
+
+    def _compact(self, state):
+        try:
+            with self._file_lock():
+                self._write_snapshot(state)
+                self.journal.drop_sealed(state["seq"])
+            with self.lock:
+                self.snapshot_seq = max(self.snapshot_seq, state["seq"])
+        finally:
+            self._compacting = False
+
+    def flush(self):
+        """Write a snapshot synchronously and truncate the journal (e.g. on shutdown)."""
+        with self._writing():
+            self._write_snapshot(self._snapshot_state())
+            self.snapshot_seq = self.seq
+            self.journal.reset()
+
+    def close(self):
+        self.journal.close()
 
     def _load(self):
-        with open(self.path, "rb") as f:
-            data = pickle.load(f)
-        self.texts = data.get("texts", [])
-        self.id_map = data.get("id_map", [])
-        self.vectorizer = data.get("vectorizer", self.vectorizer)
-        # Force refit/ensure to maintain consistency
-        self.is_fitted = False
-        self._ensure_index()
+        self.snap = _Snapshot()
+        self.seq = self.snapshot_seq = 0
+        meta_path = f"{self.path}.meta.json"
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.seq = self.snapshot_seq = self._written_seq = meta.get("seq", 0)
+            if meta.get("generation") is not None:
+                prefix = self._generation_prefix(meta["generation"])
+                id_map = np.load(f"{prefix}.ids.npy").tolist()
+                deleted = frozenset(meta.get("tombstones", []))
+                with open(f"{prefix}.texts.json") as f:
+                    texts = json.load(f)
+                if meta.get("is_fitted") and meta.get("embedding") == self.embedding and meta.get("vectorizer"):
+                    embedder = _Embedder(restore_vectorizer(self.embedding, self.dim, meta["vectorizer"]))
+                    if meta.get("backend") == self.backend:
+                        # index arrays stay on disk and are paged in by searches; no refit, no re-transform
+                        arrays = {name: np.load(f"{prefix}.{name}.npy", mmap_mode="r") for name in meta["arrays"]}
+                        index = BACKENDS[self.backend].load(meta["current_dim"], arrays)
+                        self.snap = _Snapshot(index=index, n_base=len(id_map), n=len(id_map), id_map=id_map,
+                                              texts=texts, deleted=deleted, embedder=embedder,
+                                              current_dim=meta["current_dim"])
+                    else:
+                        # backend switched in config: re-transform once with the saved vectorizer state
+                        self.snap = self._build(id_map, texts, embedder).replace(deleted=deleted)
+                else:
+                    # no usable vectorizer state (or embedding switched in config): refit once
+                    self.snap = self._build(id_map, texts).replace(deleted=deleted)
+        # replay the journal tail written after the snapshot
+        for seq, payload in self.journal.replay(after_seq=self.seq):
+            self._replay(payload)
+            self.seq = seq
+
+
+class ShardedVectorStore:
+    """One VectorStore per user_id, so a search only scans that user's memories.
+
+    Shards are loaded lazily from disk on first use and the least recently used
+    ones are dropped once more than `max_loaded` are resident. Every shard
+    persists itself on add, so unloading never loses data. Writes pin their
+    shard: one dropped while pinned is closed only when the last writer is
+    done, and is picked up again (never loaded twice) if asked for meanwhile.
+    Searches don't pin; a dropped shard still answers from its snapshot.
+    With shared=True each shard is shared with other processes (see VectorStore).
+    """
+
+    def __init__(self, dim=EMBED_DIM, root=VECTOR_SHARD_DIR, max_loaded=VECTOR_SHARD_CACHE_SIZE,
+                 backend=VECTOR_BACKEND, embedding=VECTOR_EMBEDDING, shared=VECTOR_SHARED):
+        self.lock = threading.Lock()
+        self.dim = dim
+        self.backend = backend
+        self.embedding = embedding
+        self.shared = shared
+        self.root = root
+        self.max_loaded = max_loaded
+        self.shards = OrderedDict()
+        self.pins = Counter()             # user_id -> writes in progress on the shard
+        self.unloading = {}               # user_id -> shard dropped from the LRU while pinned
+        self._rebuilding = False
+
+    def _shard_path(self, user_id: str):
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest)
+
+    def _shard(self, user_id: str, create: bool = True):
+        # resident shards are found without the lock (single dict operations)
+        shard = self.shards.get(user_id)
+        if shard is not None:
+            try:
+                self.shards.move_to_end(user_id)
+            except KeyError:
+                pass                      # unloaded meanwhile; the object still answers
+            return shard
+        with self.lock:
+            return self._resolve(user_id, create)
+
+    def _resolve(self, user_id, create):
+        # callers hold self.lock
+        shard = self.shards.get(user_id)
+        if shard is not None:
+            self.shards.move_to_end(user_id)
+            return shard
+        shard = self.unloading.pop(user_id, None)
+        if shard is None:
+            path = self._shard_path(user_id)
+            if not create and not _store_exists(path):
+                return None
+            shard = VectorStore(dim=self.dim, path=path, backend=self.backend, embedding=self.embedding,
+                                shared=self.shared)
+            if self._rebuilding:
+                shard.begin_rebuild()
+        self.shards[user_id] = shard
+        while len(self.shards) > self.max_loaded:
+            cold_id, cold = self.shards.popitem(last=False)
+            if self.pins[cold_id]:
+                self.unloading[cold_id] = cold   # closed by its last writer
+            else:
+                cold.close()
+        return shard
+
+    @contextmanager
+    def _pinned(self, user_id: str, create: bool = True):
+        """The user's shard for a write; it stays open (and the only copy) until the block exits."""
+        with self.lock:
+            shard = self._resolve(user_id, create)
+            if shard is not None:
+                self.pins[user_id] += 1
+        try:
+            yield shard
+        finally:
+            if shard is not None:
+                self._unpin(user_id)
+
+    def _unpin(self, user_id):
+        with self.lock:
+            self.pins[user_id] -= 1
+            cold = None
+            if not self.pins[user_id]:
+                del self.pins[user_id]
+                cold = self.unloading.pop(user_id, None)
+        if cold is not None:
+            cold.close()
+
+    def add_memory(self, mem_id: int, text: str, user_id: str = None):
+        if user_id is None:
+            raise ValueError("ShardedVectorStore.add_memory requires a user_id")
+        with self._pinned(user_id) as shard:
+            shard.add_memory(mem_id, text)
+
+    def add_memories(self, items, user_id: str = None):
+        if user_id is None:
+            raise ValueError("ShardedVectorStore.add_memories requires a user_id")
+        with self._pinned(user_id) as shard:
+            shard.add_memories(items)
+
+    def remove_memories(self, mem_ids, user_id: str = None):
+        if user_id is None:
+            raise ValueError("ShardedVectorStore.remove_memories requires a user_id")
+        with self._pinned(user_id, create=False) as shard:
+            if shard is not None:
+                shard.remove_memories(mem_ids)
+
+    def search(self, query: str, k: int = 5, user_id: str = None):
+        if user_id is None:
+            raise ValueError("ShardedVectorStore.search requires a user_id")
+        shard = self._shard(user_id, create=False)
+        if shard is None:
+            return []
+        return shard.search(query, k)
+
+    def search_batch(self, queries, k: int = 5, user_id: str = None):
+        if user_id is None:
+            raise ValueError("ShardedVectorStore.search_batch requires a user_id")
+        shard = self._shard(user_id, create=False)
+        if shard is None:
+            return [[] for _ in queries]
+        return shard.search_batch(queries, k)
+
+    def sync(self, user_id: str = None):
+        """Catch the user's shard up with other processes' writes; True if it may have changed."""
+        if not self.shared or user_id is None:
+            return False
+        resident = user_id in self.shards
+        shard = self._shard(user_id, create=False)
+        if shard is None:
+            return False
+        # a shard (re)loaded just now may hold writes this process never saw
+        return shard.sync() or not resident
+
+    def rebuild_from_db(self, session):
+        """Re-index every user's active facts. Each shard is rebuilt in place and swapped in
+        when done (see VectorStore.rebuild), so searches keep being served throughout."""
+        from src.models import MemoryFact
+        started = time.time()
+        # shards record their writes from before the query on, so none falls between the two
+        with self.lock:
+            self._rebuilding = True
+            stale = list(self.shards)
+            for shard in self.shards.values():
+                shard.begin_rebuild()
+        try:
+            active = (session.query(MemoryFact)
+                      .filter(MemoryFact.is_active == True)
+                      .order_by(MemoryFact.id.asc()).all())
+            by_user = {}
+            for m in active:
+                by_user.setdefault(m.user_id, []).append((m.id, f"{m.key}: {m.value}"))
+            os.makedirs(self.root, exist_ok=True)
+            for user_id, items in by_user.items():
+                with self._pinned(user_id) as shard:
+                    shard.rebuild(items)
+            # shards loaded before the query but with nothing active are emptied; ones opened
+            # since belong to users whose first writes landed after it, and are kept as they are
+            for user_id in stale:
+                if user_id not in by_user:
+                    with self._pinned(user_id, create=False) as shard:
+                        if shard is not None:
+                            shard.rebuild([])
+        finally:
+            with self.lock:
+                self._rebuilding = False
+                shards = list(self.shards.values())
+            for shard in shards:
+                shard.end_rebuild()
+        keep = {os.path.basename(self._shard_path(user_id)) for user_id in by_user}
+        keep.update(os.path.basename(shard.path) for shard in shards)
+        # drop shards (snapshot + journal segments) of users with no active memories; generation
+        # files stay (other processes map them), as do shards another process created meanwhile
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.split(".")[0] in keep or name.endswith(".gen"):
+                continue
+            try:
+                if os.path.getmtime(path) < started:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def is_empty(self):
+        return not os.path.isdir(self.root) or all(name.endswith(".gen") for name in os.listdir(self.root))
+
+    def flush(self):
+        with self.lock:
+            shards = list(self.shards.items()) + list(self.unloading.items())
+            for user_id, _shard in shards:
+                self.pins[user_id] += 1
+        for user_id, shard in shards:
+            try:
+                shard.flush()
+            finally:
+                self._unpin(user_id)
@@ -4,13 +4,13 @@ import time
 import statistics
 import math
 from src.database import init_db, get_session
-from src.vector_store import VectorStore
+from src.vector_store import ShardedVectorStore
 from src.memory_engine import MemoryEngine
 from src.models import MemoryFact
 
 init_db()
 db = get_session()
-vs = VectorStore()
+vs = ShardedVectorStore()
 engine = MemoryEngine(db, vs)
 
 random.seed(42)
@@ -167,10 +167,10 @@ print("=" * 70)
 
 # Persistence test: reload vector store and check retrieval
 print("\nPersistence test: reloading vector store...")
-vs2 = VectorStore()
+vs2 = ShardedVectorStore()
 session2 = get_session()
 vs2.rebuild_from_db(session2)
-sample = vs2.search("language", k=3)
+sample = vs2.search("language", k=3, user_id=USER)
 print("Vector search after reload (first few):", sample[:3])
 session2.close()
 db.close()
\ No newline at end of file
@@ -1,7 +1,8 @@
 from src.database import init_db, get_db
-from src.vector_store import VectorStore
+from src.vector_store import VectorStore, ShardedVectorStore
 from src.memory_engine import MemoryEngine
 import os
+import shutil
 
 if __name__ == "__main__":
     if os.path.exists("data/memory.db"):
@@ -19,3 +20,16 @@ if __name__ == "__main__":
     assert results and "Hate" in results[0]["memory"].value
     print("Core validation passed: retrieved", results[0]["memory"].value)
 
+    # terms first seen after a shard's vocabulary was fitted must still be searchable
+    shutil.rmtree("data/test_shards", ignore_errors=True)
+    shards = ShardedVectorStore(root="data/test_shards")
+    for i, text in enumerate(["language: Hindi", "call_time: 5PM", "amount_due: $450", "due_date: March 10"]):
+        shards.add_memory(i, text, user_id=user)
+    shards.add_memory(10, "food_preference: spicy food", user_id=user)
+    hits = shards.search("spicy food", k=1, user_id=user)
+    assert hits and hits[0][0] == 10 and hits[0][1] > 0, hits
+    shards.flush()
+    hits = ShardedVectorStore(root="data/test_shards").search("spicy food", k=1, user_id=user)
+    assert hits and hits[0][0] == 10 and hits[0][1] > 0, hits
+    shutil.rmtree("data/test_shards", ignore_errors=True)
+    print("New-term validation passed: score", round(hits[0][1], 3))
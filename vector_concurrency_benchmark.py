@@ -0,0 +1,114 @@
+# vector_concurrency_benchmark.py
+"""
+Read latency of one VectorStore while it is being written to.
+
+Loads a store with VCONC_N memories, then runs reader threads that search it
+in a loop through three phases: reads alone, reads under a sustained
+add/remove load (VCONC_WRITE_RATE batches per second), and reads while a full rebuild() runs alongside the writer.
+Each phase is run twice: "snapshot" is the store as it is (searches read the
+published snapshot, no lock), "locked" puts every search, write and rebuild
+behind one shared lock, the way the store used to serialise them.
+
+    VCONC_N=5000 VCONC_READERS=4 VCONC_SECONDS=3 VCONC_WRITE_RATE=50 python vector_concurrency_benchmark.py
+"""
+import os
+import time
+import random
+import shutil
+import threading
+from contextlib import nullcontext
+from src.vector_store import VectorStore
+
+N = int(os.getenv("VCONC_N", "5000"))
+READERS = int(os.getenv("VCONC_READERS", "4"))
+SECONDS = float(os.getenv("VCONC_SECONDS", "3"))
+# writer batches (4 adds + 1 removal) per second; 0 writes as fast as it can
+WRITE_RATE = float(os.getenv("VCONC_WRITE_RATE", "50"))
+ROOT = "data/vconc_bench"
+
+KEYS = ["language", "city", "call_time", "amount_due", "email", "pet_name", "food_preference", "car_brand"]
+WORDS = ["hindi", "delhi", "evening", "payment", "pizza", "dog", "monday", "blue", "invoice", "train"]
+QUERIES = ["what is my language", "where do i live", "remind me about the payment", "when should you call",
+           "what's my email", "tell me about my pet", "food", "which car do i drive"]
+
+def make_items(start, n, rng):
+    return [(i, f"{rng.choice(KEYS)}: {rng.choice(WORDS)} {rng.choice(WORDS)} {i}") for i in range(start, start + n)]
+
+def pct(s, p):
+    return s[min(len(s) - 1, int(len(s) * p))] if s else 0.0
+
+def run_phase(store, guard, writes, rebuild, items):
+    stop = threading.Event()
+    lat = [[] for _ in range(READERS)]
+    counts = {"writes": 0, "rebuilds": 0}
+
+    def reader(out, seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            q = rng.choice(QUERIES)
+            t0 = time.perf_counter()
+            with guard:
+                store.search(q, k=5)
+            out.append((time.perf_counter() - t0) * 1000)
+
+    def writer():
+        rng = random.Random(1)
+        next_id = N
+        start = time.perf_counter()
+        while not stop.is_set():
+            if WRITE_RATE and counts["writes"] / 5 >= (time.perf_counter() - start) * WRITE_RATE:
+                time.sleep(0.001)
+                continue
+            batch = make_items(next_id, 4, rng)
+            next_id += 4
+            with guard:
+                store.add_memories(batch)
+            with guard:
+                store.remove_memories([rng.randrange(next_id)])
+            counts["writes"] += 5
+
+    def rebuilder():
+        while not stop.is_set():
+            with guard:
+                store.rebuild(items)
+            counts["rebuilds"] += 1
+
+    threads = [threading.Thread(target=reader, args=(lat[i], i)) for i in range(READERS)]
+    if writes:
+        threads.append(threading.Thread(target=writer))
+    if rebuild:
+        threads.append(threading.Thread(target=rebuilder))
+    for t in threads:
+        t.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for t in threads:
+        t.join()
+    s = sorted(x for out in lat for x in out)
+    return {"reads": len(s), "p50": pct(s, 0.50), "p95": pct(s, 0.95), "p99": pct(s, 0.99),
+            "max": s[-1] if s else 0.0, "writes_s": counts["writes"] / SECONDS, "rebuilds": counts["rebuilds"]}
+
+shutil.rmtree(ROOT, ignore_errors=True)
+os.makedirs(ROOT, exist_ok=True)
+items = make_items(0, N, random.Random(42))
+rows = []
+for mode in ("snapshot", "locked"):
+    guard = nullcontext() if mode == "snapshot" else threading.Lock()
+    for phase, writes, rebuild in (("reads only", False, False), ("+ writes", True, False),
+                                   ("+ writes + rebuild", True, True)):
+        store = VectorStore(path=f"{ROOT}/{mode}", load=False)
+        store.rebuild(items)
+        rows.append((mode, phase, run_phase(store, guard, writes, rebuild, items)))
+        store.close()
+        shutil.rmtree(ROOT, ignore_errors=True)
+        os.makedirs(ROOT, exist_ok=True)
+
+print("=" * 96)
+print(f"VECTOR STORE READS UNDER WRITE LOAD (ms per search, {N} memories, {READERS} readers, {SECONDS:g}s per phase)")
+print("=" * 96)
+print(f"{'mode':<10} {'phase':<20} {'reads':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>9} {'writes/s':>10} {'rebuilds':>9}")
+for mode, phase, r in rows:
+    print(f"{mode:<10} {phase:<20} {r['reads']:>8} {r['p50']:>8.3f} {r['p95']:>8.3f} {r['p99']:>8.3f} "
+          f"{r['max']:>9.2f} {r['writes_s']:>10.0f} {r['rebuilds']:>9}")
+print("=" * 96)
+shutil.rmtree(ROOT, ignore_errors=True)